@@ -0,0 +1,384 @@
+"""Cold storage for old messages.
+
+Messages older than ``CHAT_ARCHIVE_AFTER_DAYS`` are moved out of the hot
+``messages`` table into gzip-compressed NDJSON segment files, one directory
+per channel, written once and never modified. Each channel is archived as a
+contiguous prefix of its seq range, so the hot table holds everything after
+the channel's last archived seq and a history read only needs the archive
+when it runs off the start of the hot rows.
+
+A segment file is fsynced and renamed into place before the transaction that
+records it in ``archive_segments`` and deletes its rows, so a crash at any
+point leaves every message readable from one side or the other. Archived
+messages stay in the search index, which is insert-only, and their ids stay
+in ``archived_message_ids`` so imports can still tell them apart from new
+messages.
+
+With several workers on one database, only the holder of the lease row in
+``archive_lease`` archives; the lease outlives two intervals, so another
+worker takes over if the holder stops renewing it. After a run the holder
+publishes the channels it archived on the broker's ``archive`` topic and the
+other workers reload those channels' segments from ``archive_segments``.
+They also reload the whole index every interval, in case they missed one.
+"""
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+from broker import Broker
+
+# Retention tuning (overridable via environment); 0 days disables archival
+ARCHIVE_AFTER_DAYS = float(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", "archive")
+ARCHIVE_INTERVAL = float(os.getenv("CHAT_ARCHIVE_INTERVAL_SECONDS", "86400"))
+ARCHIVE_SEGMENT_MESSAGES = int(os.getenv("CHAT_ARCHIVE_SEGMENT_MESSAGES", "10000"))
+ARCHIVE_CACHED_SEGMENTS = int(os.getenv("CHAT_ARCHIVE_CACHED_SEGMENTS", "16"))
+
+MESSAGE_FIELDS = ("id", "text", "sender_id", "sender_username", "channel_id", "timestamp", "message_type", "seq")
+
+
+def create_archive_tables(cursor: sqlite3.Cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_segments (
+            channel_id TEXT NOT NULL,
+            first_seq INTEGER NOT NULL,
+            last_seq INTEGER NOT NULL,
+            first_timestamp TIMESTAMP NOT NULL,
+            last_timestamp TIMESTAMP NOT NULL,
+            message_count INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (channel_id, first_seq)
+        )
+    ''')
+    # Ids of every archived message, recorded with its segment
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_message_ids (
+            id TEXT PRIMARY KEY
+        ) WITHOUT ROWID
+    ''')
+    # The one worker allowed to archive, until expires_at (epoch seconds)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_lease (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+
+
+class Segment:
+    __slots__ = ("first_seq", "last_seq", "path")
+
+    def __init__(self, first_seq: int, last_seq: int, path: str):
+        self.first_seq = first_seq
+        self.last_seq = last_seq
+        self.path = path
+
+
+class MessageArchive:
+    def __init__(self, db_path: str, broker: Optional[Broker] = None, directory: str = ARCHIVE_DIR,
+                 after_days: float = ARCHIVE_AFTER_DAYS, interval: float = ARCHIVE_INTERVAL,
+                 segment_messages: int = ARCHIVE_SEGMENT_MESSAGES, cached_segments: int = ARCHIVE_CACHED_SEGMENTS):
+        self.db_path = db_path
+        self.broker = broker
+        # Lease holder id; the broker's, so this worker's own events are recognised
+        self.node_id = broker.node_id if broker is not None else uuid.uuid4().hex
+        self.leader = False
+        self.directory = directory
+        self.after_days = after_days
+        self.interval = interval
+        self.segment_messages = segment_messages
+        self.cached_segments = cached_segments
+        self.messages_archived = 0
+        self.segments_written = 0
+        self.segment_reads = 0
+        self.last_run: Optional[datetime] = None
+
+        # channel_id -> segments in seq order; written by the archiver thread,
+        # read by history requests, so guarded by a lock
+        self._segments: Dict[str, List[Segment]] = {}
+        # path -> (seqs, messages) of recently read segments
+        self._decoded: "OrderedDict[str, Tuple[List[int], List[dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        if broker is not None:
+            broker.on("archive", self._on_remote_archive)
+
+    async def start(self):
+        await asyncio.to_thread(self._load_index)
+        if self.after_days > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.leader:
+            # Let another worker take over without waiting for the lease to expire
+            await asyncio.to_thread(self._release_lease)
+            self.leader = False
+
+    def segments(self, channel_id: str) -> List[Segment]:
+        """Snapshot of a channel's segments in seq order."""
+        with self._lock:
+            return list(self._segments.get(channel_id, ()))
+
+    def has_segments(self, channel_id: str) -> bool:
+        return channel_id in self._segments
+
+    def archived_upto(self, channel_id: str) -> int:
+        """Highest archived seq of a channel; hot rows all come after it."""
+        with self._lock:
+            segments = self._segments.get(channel_id)
+            return segments[-1].last_seq if segments else 0
+
+    async def run_once(self) -> int:
+        """One archive pass, then tell the other workers which channels it touched."""
+        archived = await asyncio.to_thread(self.archive_old_messages)
+        if archived and self.broker is not None:
+            await self.broker.publish("archive", {"channel_ids": list(archived)})
+        return sum(archived.values())
+
+    async def _run(self):
+        while True:
+            try:
+                self.leader = await asyncio.to_thread(self._acquire_lease)
+                if self.leader:
+                    archived = await self.run_once()
+                    if archived:
+                        print(f"🗄️ Archived {archived} messages older than {self.after_days:g} days")
+                else:
+                    await asyncio.to_thread(self._load_index)
+            except Exception as exc:
+                print(f"⚠️ Archive run failed: {exc}")
+            await asyncio.sleep(self.interval)
+
+    async def _on_remote_archive(self, data: dict, origin: str):
+        if origin == self.node_id:
+            return
+        await asyncio.to_thread(self._load_index, data["channel_ids"])
+
+    # The methods below do blocking I/O; call them off the event loop
+    def _acquire_lease(self) -> bool:
+        """Take or renew the archiver lease; False while another worker holds it."""
+        now = time.time()
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute('SELECT holder, expires_at FROM archive_lease WHERE id = 1').fetchone()
+            acquired = row is None or row[0] == self.node_id or row[1] < now
+            if acquired:
+                conn.execute('INSERT OR REPLACE INTO archive_lease (id, holder, expires_at) VALUES (1, ?, ?)',
+                             (self.node_id, now + 2 * self.interval))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return acquired
+
+    def _release_lease(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('DELETE FROM archive_lease WHERE holder = ?', (self.node_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _load_index(self, channel_ids: Optional[Iterable[str]] = None):
+        """Read the segment index from archive_segments: all of it, or just these channels'."""
+        channel_ids = None if channel_ids is None else list(channel_ids)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if channel_ids is None:
+                rows = conn.execute('''
+                    SELECT channel_id, first_seq, last_seq, path FROM archive_segments
+                    ORDER BY channel_id, first_seq
+                ''').fetchall()
+            else:
+                rows = conn.execute(f'''
+                    SELECT channel_id, first_seq, last_seq, path FROM archive_segments
+                    WHERE channel_id IN ({", ".join("?" * len(channel_ids))})
+                    ORDER BY channel_id, first_seq
+                ''', channel_ids).fetchall()
+            segments: Dict[str, List[Segment]] = {}
+            for channel_id, first_seq, last_seq, path in rows:
+                segments.setdefault(channel_id, []).append(Segment(first_seq, last_seq, path))
+            if rows and conn.execute('SELECT 1 FROM archived_message_ids LIMIT 1').fetchone() is None:
+                # One-time backfill for segments written before their ids were kept
+                for segment in (s for channel_segments in segments.values() for s in channel_segments):
+                    conn.executemany('INSERT OR IGNORE INTO archived_message_ids (id) VALUES (?)',
+                                     [(message["id"],) for message in self.read_segment(segment)])
+                conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            if channel_ids is None:
+                self._segments = segments
+            else:
+                for channel_id in channel_ids:
+                    if channel_id in segments:
+                        self._segments[channel_id] = segments[channel_id]
+
+    def archive_old_messages(self) -> Dict[str, int]:
+        """Move every channel's messages older than the cutoff into new segments.
+
+        Returns how many messages were archived per channel, for channels with any.
+        """
+        cutoff = (datetime.now() - timedelta(days=self.after_days)).isoformat()
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        archived: Dict[str, int] = {}
+        try:
+            channel_ids = [row[0] for row in conn.execute('SELECT channel_id FROM channel_stats')]
+            for channel_id in channel_ids:
+                while True:
+                    # Oldest first along the seq index; stop at the first message
+                    # still inside the retention window so the prefix stays contiguous
+                    rows = conn.execute(f'''
+                        SELECT {", ".join(MESSAGE_FIELDS)} FROM messages
+                        WHERE channel_id = ?
+                        ORDER BY seq
+                        LIMIT ?
+                    ''', (channel_id, self.segment_messages)).fetchall()
+                    expired = []
+                    for row in rows:
+                        if row[5] >= cutoff:
+                            break
+                        expired.append(row)
+                    if not expired:
+                        break
+                    self._write_segment(conn, channel_id, expired)
+                    archived[channel_id] = archived.get(channel_id, 0) + len(expired)
+                    if len(expired) < self.segment_messages:
+                        break
+        finally:
+            conn.close()
+        self.messages_archived += sum(archived.values())
+        self.last_run = datetime.now()
+        return archived
+
+    def _write_segment(self, conn: sqlite3.Connection, channel_id: str, rows: List[tuple]):
+        first_seq, last_seq = rows[0][7], rows[-1][7]
+        channel_dir = os.path.join(self.directory, quote(channel_id, safe=""))
+        os.makedirs(channel_dir, exist_ok=True)
+        path = os.path.join(channel_dir, f"{first_seq:012d}-{last_seq:012d}.ndjson.gz")
+
+        lines = "".join(
+            json.dumps(dict(zip(MESSAGE_FIELDS, row)), ensure_ascii=False, separators=(",", ":")) + "\n"
+            for row in rows
+        )
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as compressed:
+                compressed.write(lines.encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temp_path, path)
+
+        # Readable from the archive before the rows leave the hot table;
+        # history reads skip the overlap by seq
+        with self._lock:
+            self._segments.setdefault(channel_id, []).append(Segment(first_seq, last_seq, path))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute('''
+                INSERT INTO archive_segments
+                    (channel_id, first_seq, last_seq, first_timestamp, last_timestamp, message_count, path)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (channel_id, first_seq, last_seq, rows[0][5], rows[-1][5], len(rows), path))
+            conn.executemany('INSERT OR IGNORE INTO archived_message_ids (id) VALUES (?)', [(row[0],) for row in rows])
+            conn.execute('DELETE FROM messages WHERE channel_id = ? AND seq BETWEEN ? AND ?',
+                         (channel_id, first_seq, last_seq))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            with self._lock:
+                self._segments[channel_id].pop()
+            raise
+        self.segments_written += 1
+
+    def read_segment(self, segment: Segment) -> List[dict]:
+        """A whole segment, bypassing the decoded-segment cache (for one-off scans)."""
+        with gzip.open(segment.path, "rt", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def _decode(self, segment: Segment) -> Tuple[List[int], List[dict]]:
+        with self._lock:
+            decoded = self._decoded.get(segment.path)
+            if decoded is not None:
+                self._decoded.move_to_end(segment.path)
+                return decoded
+        messages = self.read_segment(segment)
+        decoded = ([message["seq"] for message in messages], messages)
+        with self._lock:
+            self.segment_reads += 1
+            self._decoded[segment.path] = decoded
+            while len(self._decoded) > self.cached_segments:
+                self._decoded.popitem(last=False)
+        return decoded
+
+    def read_before(self, channel_id: str, before: Optional[int], limit: int) -> List[dict]:
+        """Up to ``limit`` archived messages with seq < ``before``, newest first."""
+        with self._lock:
+            segments = list(self._segments.get(channel_id, ()))
+        result: List[dict] = []
+        for segment in reversed(segments):
+            if len(result) >= limit:
+                break
+            if before is not None and segment.first_seq >= before:
+                continue
+            seqs, messages = self._decode(segment)
+            end = bisect_left(seqs, before) if before is not None else len(seqs)
+            start = max(0, end - (limit - len(result)))
+            result.extend(reversed(messages[start:end]))
+        return result
+
+    def read_after(self, channel_id: str, after: int, limit: int) -> List[dict]:
+        """Up to ``limit`` archived messages with seq > ``after``, oldest first."""
+        with self._lock:
+            segments = list(self._segments.get(channel_id, ()))
+        result: List[dict] = []
+        for segment in segments:
+            if len(result) >= limit:
+                break
+            if segment.last_seq <= after:
+                continue
+            seqs, messages = self._decode(segment)
+            start = bisect_right(seqs, after)
+            result.extend(messages[start:start + limit - len(result)])
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            segments = sum(len(s) for s in self._segments.values())
+            channels = len(self._segments)
+            cached = len(self._decoded)
+        return {
+            "enabled": self.after_days > 0,
+            "leader": self.leader,
+            "after_days": self.after_days,
+            "channels": channels,
+            "segments": segments,
+            "segments_written": self.segments_written,
+            "messages_archived": self.messages_archived,
+            "segment_reads": self.segment_reads,
+            "cached_segments": cached,
+            "last_run": self.last_run,
+        }
+
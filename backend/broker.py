@@ -0,0 +1,178 @@
+"""Pub/sub broker behind channel fan-out.
+
+A broker delivers events published on a topic to every handler registered
+for it, on this process and (for cross-process backends) on every other
+process sharing the backend. The in-process broker is the default; with
+``CHAT_BROKER=redis`` several uvicorn workers or nodes share fan-out and
+presence over Redis pub/sub.
+"""
+import asyncio
+import json
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+BROKER_BACKEND = os.getenv("CHAT_BROKER", "memory")
+REDIS_URL = os.getenv("CHAT_REDIS_URL", "redis://localhost:6379/0")
+REDIS_CHANNEL_PREFIX = os.getenv("CHAT_REDIS_PREFIX", "chat:")
+# Resubscribe delays after a Redis error, doubling up to the maximum
+REDIS_RECONNECT_MIN_SECONDS = float(os.getenv("CHAT_REDIS_RECONNECT_MIN_SECONDS", "0.5"))
+REDIS_RECONNECT_MAX_SECONDS = float(os.getenv("CHAT_REDIS_RECONNECT_MAX_SECONDS", "30"))
+
+Handler = Callable[[dict, str], Optional[Awaitable[None]]]
+
+
+class Broker:
+    """Base broker; publish() always reaches this process's handlers first."""
+
+    def __init__(self):
+        # Identifies this process in cross-process envelopes
+        self.node_id = uuid.uuid4().hex
+        self.publish_failures = 0
+        self._handlers: Dict[str, List[Handler]] = {}
+
+    def on(self, topic: str, handler: Handler):
+        """Register ``handler(data, origin_node_id)`` for a topic; call before start()."""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, topic: str, data: dict):
+        # Local subscribers never wait on the network, nor fail with it
+        await self._dispatch(topic, data, self.node_id)
+        try:
+            await self._publish_remote(topic, data)
+        except Exception as exc:
+            self.publish_failures += 1
+            print(f"⚠️ Broker publish to {topic!r} failed, other workers missed it: {exc!r}")
+
+    async def _publish_remote(self, topic: str, data: dict):
+        pass
+
+    async def _dispatch(self, topic: str, data: dict, origin: str):
+        for handler in self._handlers.get(topic, ()):
+            try:
+                result = handler(data, origin)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as exc:
+                print(f"⚠️ Broker handler for {topic!r} failed: {exc}")
+
+
+class InProcessBroker(Broker):
+    """Single-process deployments: events never leave this process."""
+
+
+class RedisBroker(Broker):
+    """Relays every publish through Redis pub/sub to the other processes.
+
+    ``client`` may be any object with the ``redis.asyncio.Redis`` publish /
+    pubsub() interface, which lets tests swap in a local stand-in.
+
+    If the subscription fails (Redis restarts, the connection drops), the
+    listener logs it and resubscribes with backoff. Events published
+    elsewhere in the meantime are not replayed. Malformed envelopes are
+    skipped.
+    """
+
+    def __init__(self, url: str = REDIS_URL, client: Any = None, prefix: str = REDIS_CHANNEL_PREFIX):
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self.remote_published = 0
+        self.remote_received = 0
+        self.reconnects = 0
+        self.malformed = 0
+        self._client = client
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("CHAT_BROKER=redis requires the 'redis' package (pip install redis)")
+            self._client = redis.from_url(self.url)
+        await self._subscribe()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self._close_pubsub()
+
+    async def _subscribe(self):
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(*[self.prefix + topic for topic in self._handlers])
+
+    async def _close_pubsub(self):
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is None:
+            return
+        try:
+            await pubsub.unsubscribe()
+            close = getattr(pubsub, "aclose", None) or pubsub.close
+            await close()
+        except Exception:
+            pass  # Usually the connection that just failed
+
+    async def _publish_remote(self, topic: str, data: dict):
+        envelope = json.dumps({"origin": self.node_id, "data": data})
+        await self._client.publish(self.prefix + topic, envelope)
+        self.remote_published += 1
+
+    async def _listen(self):
+        delay = REDIS_RECONNECT_MIN_SECONDS
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                    print(f"🔌 Redis broker resubscribed after {self.reconnects} reconnect(s)")
+                async for message in self._pubsub.listen():
+                    delay = REDIS_RECONNECT_MIN_SECONDS
+                    await self._receive(message)
+                raise ConnectionError("pub/sub stream ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.reconnects += 1
+                print(f"⚠️ Redis broker listener failed: {exc!r}; resubscribing in {delay:.1f}s")
+                await self._close_pubsub()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, REDIS_RECONNECT_MAX_SECONDS)
+
+    async def _receive(self, message: dict):
+        if message.get("type") != "message":
+            return
+        try:
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            envelope = json.loads(message["data"])
+            origin, data = envelope["origin"], envelope["data"]
+        except (KeyError, TypeError, ValueError) as exc:
+            self.malformed += 1
+            print(f"⚠️ Redis broker skipped a malformed envelope: {exc!r}")
+            return
+        if origin == self.node_id:
+            return  # Already delivered locally in publish()
+        self.remote_received += 1
+        await self._dispatch(channel[len(self.prefix):], data, origin)
+
+
+def create_broker(backend: str = BROKER_BACKEND) -> Broker:
+    if backend == "redis":
+        return RedisBroker()
+    if backend == "memory":
+        return InProcessBroker()
+    raise ValueError(f"Unknown CHAT_BROKER backend: {backend!r}")
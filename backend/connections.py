@@ -0,0 +1,371 @@
+"""WebSocket connection management for the chat server.
+
+Every socket gets its own writer task fed by a bounded outbound queue, so a
+slow or stalled client only ever delays itself. Broadcasting is reduced to
+appending a frame to each subscriber's queue.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from broker import Broker, InProcessBroker
+from metrics import REGISTRY
+
+# Outbound queue tuning (overridable via environment)
+WS_QUEUE_MAX = int(os.getenv("WS_QUEUE_MAX", "1000"))
+WS_QUEUE_HIGH_WATER = int(os.getenv("WS_QUEUE_HIGH_WATER", "250"))
+WS_SLOW_CONSUMER_GRACE = float(os.getenv("WS_SLOW_CONSUMER_GRACE", "5"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+# Channel member counts are shared between workers: each publishes its own
+# when they change (checked every MEMBER_SYNC_SECONDS) and at least every
+# MEMBER_HEARTBEAT_SECONDS; a worker silent for three heartbeats stops counting
+MEMBER_SYNC_SECONDS = float(os.getenv("CHAT_MEMBER_SYNC_SECONDS", "1"))
+MEMBER_HEARTBEAT_SECONDS = float(os.getenv("CHAT_MEMBER_HEARTBEAT_SECONDS", "15"))
+
+# Close code sent to evicted slow consumers ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+FRAMES_QUEUED = REGISTRY.counter(
+    "chat_ws_frames_queued_total", "Broadcast frames queued to local subscribers", ["kind"]
+)
+FANOUT_SECONDS = REGISTRY.histogram(
+    "chat_ws_fanout_duration_seconds", "Time to queue one broadcast for all local subscribers", ["kind"],
+    buckets=(0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+
+class ClientConnection:
+    """A single WebSocket plus its outbound queue and writer task.
+
+    Frames are queued with a kind that decides the overflow policy:
+    ``typing`` frames are dropped once the client has a backlog (they are
+    stale by the time they would be delivered), everything else is kept until
+    the queue is full. A client that stays above the high-water mark for
+    longer than the grace period, hits the hard limit, or times out on a
+    single send is evicted.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str, manager: "ConnectionManager",
+                 max_queue: int = WS_QUEUE_MAX, high_water: int = WS_QUEUE_HIGH_WATER,
+                 grace: float = WS_SLOW_CONSUMER_GRACE, send_timeout: float = WS_SEND_TIMEOUT):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.manager = manager
+        self.max_queue = max_queue
+        self.high_water = high_water
+        self.low_water = high_water // 2
+        self.grace = grace
+        self.send_timeout = send_timeout
+
+        self.queue: Deque[Tuple[str, str]] = deque()
+        self.sent = 0
+        self.dropped = 0
+        self.peak_depth = 0
+        self.over_high_water_since: Optional[float] = None
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer_task = asyncio.create_task(self._writer())
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def enqueue(self, message: str, kind: str = "message") -> bool:
+        """Queue a frame for delivery. Returns False if it was not queued."""
+        if self.closed:
+            return False
+        depth = len(self.queue)
+
+        if kind == "typing" and depth >= self.low_water:
+            self.dropped += 1
+            return False
+
+        if depth >= self.max_queue:
+            self.evict("outbound queue full")
+            return False
+
+        if depth >= self.high_water:
+            now = time.monotonic()
+            if self.over_high_water_since is None:
+                self.over_high_water_since = now
+                self._drop_queued_typing()
+            elif now - self.over_high_water_since > self.grace:
+                self.evict("over high-water mark for %.1fs" % (now - self.over_high_water_since))
+                return False
+
+        self.queue.append((message, kind))
+        self.peak_depth = max(self.peak_depth, len(self.queue))
+        self._ready.set()
+        return True
+
+    def _drop_queued_typing(self):
+        kept = deque(item for item in self.queue if item[1] != "typing")
+        self.dropped += len(self.queue) - len(kept)
+        self.queue = kept
+
+    async def _writer(self):
+        try:
+            while True:
+                while not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                message, _kind = self.queue.popleft()
+                await asyncio.wait_for(self.websocket.send_text(message), self.send_timeout)
+                self.sent += 1
+                if self.over_high_water_since is not None and len(self.queue) < self.low_water:
+                    self.over_high_water_since = None
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.evict("send timed out")
+        except Exception as exc:
+            # The socket is gone; drop it instead of retrying forever
+            print(f"⚠️ Send to {self.user_id} failed: {exc}")
+            self.close()
+            self.manager.remove(self)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.manager.closed_sent += self.sent
+        self.manager.closed_dropped += self.dropped
+        self.queue.clear()
+        if self._writer_task is not None and self._writer_task is not asyncio.current_task():
+            self._writer_task.cancel()
+
+    def evict(self, reason: str):
+        if self.closed:
+            return
+        print(f"🐢 Evicting slow consumer {self.user_id}: {reason}")
+        self.close()
+        self.manager.evicted += 1
+        self.manager.remove(self)
+        asyncio.create_task(self._close_socket(reason))
+
+    async def _close_socket(self, reason: str, code: int = SLOW_CONSUMER_CLOSE_CODE):
+        try:
+            await asyncio.wait_for(
+                self.websocket.close(code=code, reason=reason[:120]),
+                self.send_timeout,
+            )
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "depth": len(self.queue),
+            "peak_depth": self.peak_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "over_high_water": self.over_high_water_since is not None,
+        }
+
+
+class ConnectionManager:
+    """Tracks this process's sockets and routes channel fan-out through a broker.
+
+    Broadcasts are published on the broker's ``fanout`` topic and delivered by
+    every process to its own subscribers. Who is online is tracked by the
+    presence registry, not here. Per-channel subscriber counts are exchanged
+    on the ``members`` topic, so member counts cover every worker.
+    """
+
+    def __init__(self, broker: Optional[Broker] = None):
+        self.broker = broker or InProcessBroker()
+        self.broker.on("fanout", self._on_fanout)
+        self.broker.on("members", self._on_members)
+        self.active_connections: Dict[str, ClientConnection] = {}
+        # channel_id -> user_ids subscribed to it, and the reverse index so a
+        # disconnect can drop a user from its channels without a full sweep
+        self.channel_subscribers: Dict[str, Set[str]] = {}
+        self.user_channels: Dict[str, Set[str]] = {}
+        # Bumped whenever a channel's member count changes, here or as reported by another worker
+        self.subscription_version = 0
+        # node_id -> (when last heard, channel_id -> subscribers) of the other workers
+        self._remote_members: Dict[str, Tuple[float, Dict[str, int]]] = {}
+        self._published_members: Optional[Dict[str, int]] = None
+        self._published_at = 0.0
+        self._member_sync: Optional[asyncio.Task] = None
+        self.evicted = 0
+        # Totals of connections that are gone, so counters never go backwards
+        self.closed_sent = 0
+        self.closed_dropped = 0
+
+    async def start(self):
+        self._member_sync = asyncio.create_task(self._run_member_sync())
+
+    async def stop(self):
+        if self._member_sync is not None:
+            self._member_sync.cancel()
+            try:
+                await self._member_sync
+            except asyncio.CancelledError:
+                pass
+            self._member_sync = None
+        # The other workers stop counting this one's members right away
+        await self.broker.publish("members", {"counts": {}})
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> ClientConnection:
+        await websocket.accept()
+        previous = self.active_connections.get(user_id)
+        if previous is not None:
+            # Same user reconnected: the new socket replaces the old one
+            previous.close()
+            asyncio.create_task(previous._close_socket("replaced by a new connection", code=1000))
+        connection = ClientConnection(websocket, user_id, self)
+        connection.start()
+        self.active_connections[user_id] = connection
+        self.user_channels.setdefault(user_id, set())
+        print(f"✅ User {user_id} connected")
+        return connection
+
+    def disconnect(self, user_id: str, connection: Optional[ClientConnection] = None):
+        current = self.active_connections.get(user_id)
+        if connection is not None:
+            connection.close()
+            if current is not connection:
+                # A newer connection for this user already took over
+                return
+        if current is not None:
+            current.close()
+            del self.active_connections[user_id]
+            print(f"❌ User {user_id} disconnected")
+        for channel_id in self.user_channels.pop(user_id, set()):
+            self.subscription_version += 1
+            subscribers = self.channel_subscribers.get(channel_id)
+            if subscribers is not None:
+                subscribers.discard(user_id)
+                if not subscribers:
+                    del self.channel_subscribers[channel_id]
+
+    def remove(self, connection: ClientConnection):
+        """Drop a connection that failed or was evicted by its writer."""
+        self.disconnect(connection.user_id, connection)
+
+    def subscribe(self, user_id: str, channel_id: str):
+        self.subscription_version += 1
+        self.channel_subscribers.setdefault(channel_id, set()).add(user_id)
+        self.user_channels.setdefault(user_id, set()).add(channel_id)
+
+    def unsubscribe(self, user_id: str, channel_id: str):
+        self.subscription_version += 1
+        subscribers = self.channel_subscribers.get(channel_id)
+        if subscribers is not None:
+            subscribers.discard(user_id)
+            if not subscribers:
+                del self.channel_subscribers[channel_id]
+        channels = self.user_channels.get(user_id)
+        if channels is not None:
+            channels.discard(channel_id)
+
+    def get_subscribers(self, channel_id: str) -> Set[str]:
+        return self.channel_subscribers.get(channel_id, set())
+
+    def member_count(self, channel_id: str) -> int:
+        """Subscribers of a channel on every worker; other workers' as last reported."""
+        return len(self.get_subscribers(channel_id)) + sum(
+            counts.get(channel_id, 0) for _, counts in self._remote_members.values()
+        )
+
+    async def sync_members(self):
+        """Publish this worker's counts if they changed or a heartbeat is due, and forget silent workers."""
+        now = time.monotonic()
+        counts = {channel_id: len(users) for channel_id, users in self.channel_subscribers.items()}
+        if counts != self._published_members or now - self._published_at >= MEMBER_HEARTBEAT_SECONDS:
+            self._published_members, self._published_at = counts, now
+            await self.broker.publish("members", {"counts": counts})
+        silent = [node_id for node_id, (heard, _) in self._remote_members.items()
+                  if now - heard > 3 * MEMBER_HEARTBEAT_SECONDS]
+        for node_id in silent:
+            del self._remote_members[node_id]
+        if silent:
+            self.subscription_version += 1
+
+    async def _run_member_sync(self):
+        while True:
+            await asyncio.sleep(MEMBER_SYNC_SECONDS)
+            try:
+                await self.sync_members()
+            except Exception as exc:
+                print(f"⚠️ Member count sync failed: {exc}")
+
+    def _on_members(self, data: dict, origin: str):
+        if origin == self.broker.node_id:
+            return
+        previous = self._remote_members.get(origin)
+        counts = data["counts"]
+        self._remote_members[origin] = (time.monotonic(), counts)
+        if previous is None or previous[1] != counts:
+            self.subscription_version += 1
+
+    def send_personal_message_nowait(self, message: str, user_id: str):
+        connection = self.active_connections.get(user_id)
+        if connection is not None:
+            connection.enqueue(message, "control")
+
+    async def send_personal_message(self, message: str, user_id: str):
+        self.send_personal_message_nowait(message, user_id)
+
+    async def broadcast_to_channel(self, message: str, channel_id: str, exclude_user: str = None,
+                                   kind: str = "message"):
+        await self.broker.publish("fanout", {
+            "message": message,
+            "channel_id": channel_id,
+            "exclude_user": exclude_user,
+            "kind": kind,
+        })
+
+    def deliver_to_channel(self, message: str, channel_id: str, exclude_user: str = None,
+                           kind: str = "message"):
+        """Queue a frame for this process's subscribers of a channel."""
+        started = time.perf_counter()
+        queued = 0
+        # Snapshot: enqueue may evict a subscriber and mutate the set
+        for user_id in tuple(self.get_subscribers(channel_id)):
+            if user_id == exclude_user:
+                continue
+            connection = self.active_connections.get(user_id)
+            if connection is not None and connection.enqueue(message, kind):
+                queued += 1
+        FANOUT_SECONDS.labels(kind).observe(time.perf_counter() - started)
+        FRAMES_QUEUED.labels(kind).inc(queued)
+
+    def _on_fanout(self, data: dict, origin: str):
+        self.deliver_to_channel(data["message"], data["channel_id"], data["exclude_user"], data["kind"])
+
+    def frames_sent(self) -> int:
+        return self.closed_sent + sum(c.sent for c in self.active_connections.values())
+
+    def frames_dropped(self) -> int:
+        return self.closed_dropped + sum(c.dropped for c in self.active_connections.values())
+
+    def stats(self) -> dict:
+        connections = [c.stats() for c in self.active_connections.values()]
+        depths = [c["depth"] for c in connections]
+        return {
+            "node_id": self.broker.node_id,
+            "connections": len(connections),
+            "channels": {channel_id: len(users) for channel_id, users in self.channel_subscribers.items()},
+            "queued_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "over_high_water": sum(1 for c in connections if c["over_high_water"]),
+            "dropped_total": sum(c["dropped"] for c in connections),
+            "evicted_total": self.evicted,
+            "limits": {
+                "max_queue": WS_QUEUE_MAX,
+                "high_water": WS_QUEUE_HIGH_WATER,
+                "slow_consumer_grace": WS_SLOW_CONSUMER_GRACE,
+                "send_timeout": WS_SEND_TIMEOUT,
+            },
+            "per_connection": connections,
+        }
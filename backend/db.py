@@ -0,0 +1,99 @@
+"""Non-blocking SQLite access for the async chat endpoints.
+
+Queries run on a dedicated thread pool so a slow query never stalls the
+event loop (and with it every WebSocket). Each pool thread keeps one
+long-lived connection, and sqlite3's per-connection statement cache means
+the handful of statements the API uses are prepared once per thread.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+from metrics import REGISTRY, query_name
+
+# Pool tuning (overridable via environment)
+DB_POOL_SIZE = int(os.getenv("CHAT_DB_POOL_SIZE", "4"))
+DB_STATEMENT_CACHE = int(os.getenv("CHAT_DB_STATEMENT_CACHE", "256"))
+
+QUERY_SECONDS = REGISTRY.histogram(
+    "chat_db_query_duration_seconds", "Time spent running a query on a DB pool thread, rows included", ["query"]
+)
+POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "chat_db_pool_wait_seconds", "Time a query waited for a free DB pool thread"
+)
+
+
+class Database:
+    def __init__(self, path: str, pool_size: int = DB_POOL_SIZE,
+                 statement_cache: int = DB_STATEMENT_CACHE):
+        self.path = path
+        self.pool_size = pool_size
+        self.statement_cache = statement_cache
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, cached_statements=self.statement_cache,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _call(self, fn: Callable, args: tuple, query: str, submitted: float) -> Any:
+        started = time.perf_counter()
+        POOL_WAIT_SECONDS.observe(started - submitted)
+        try:
+            return fn(self._connection(), *args)
+        finally:
+            QUERY_SECONDS.labels(query).observe(time.perf_counter() - started)
+
+    async def run(self, fn: Callable[..., Any], *args, query: Optional[str] = None) -> Any:
+        """Run ``fn(connection, *args)`` on a pool thread, timed as ``query`` (default: fn's name)."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="chat-db")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._call, fn, args, query or fn.__name__, time.perf_counter()
+        )
+
+    async def fetchall(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall(), query=query_name(sql))
+
+    async def fetchone(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone(), query=query_name(sql))
+
+    async def execute(self, sql: str, params: Sequence = ()) -> int:
+        """Run a write statement in its own transaction; returns the row count."""
+        def _execute(conn: sqlite3.Connection) -> int:
+            with conn:
+                return conn.execute(sql, params).rowcount
+        return await self.run(_execute, query=query_name(sql))
+
+    async def executemany(self, sql: str, seq_of_params: Sequence[Sequence]) -> int:
+        def _executemany(conn: sqlite3.Connection) -> int:
+            with conn:
+                return conn.executemany(sql, seq_of_params).rowcount
+        return await self.run(_executemany, query=query_name(sql))
+
+    def close(self):
+        """Wait for in-flight queries, then close every pooled connection."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        # Threads of a new pool must not pick up closed connections
+        self._local = threading.local()
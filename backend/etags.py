@@ -0,0 +1,64 @@
+"""Entity tags for conditional GETs on polled list endpoints.
+
+A tag is derived from a version that is already known without running the
+endpoint's query: a per-process change counter for lists built from
+in-memory state (channel members, presence), or a channel's last seq for
+its history. Handlers compute the tag first and answer ``If-None-Match``
+hits with an empty 304, so an unchanged resource is neither queried nor
+serialized again.
+
+Counters restart with the process and differ between workers, so their tags
+carry a per-process epoch: a client moved to another worker gets one full
+response, never a wrong 304.
+"""
+import hashlib
+import uuid
+from typing import Dict, Optional
+
+from fastapi import Response
+
+# Clients should revalidate every time; the 304 makes that cheap
+CACHE_CONTROL = "no-cache"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison against an If-None-Match header (a list or ``*``)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(status_code=304, headers={**(headers or {}), **cache_headers(etag)})
+
+
+class ResourceVersions:
+    """Change counters for resources that have no version of their own."""
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._versions: Dict[str, int] = {}
+
+    def bump(self, resource: str):
+        self._versions[resource] = self._versions.get(resource, 0) + 1
+
+    def etag(self, resource: str, *parts) -> str:
+        return make_etag(resource, self.epoch, self._versions.get(resource, 0), *parts)
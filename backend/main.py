@@ -1,8 +1,10 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set
+import base64
 import json
 import uuid
 from datetime import datetime
@@ -10,10 +12,36 @@ import asyncio
 from contextlib import asynccontextmanager
 import sqlite3
 import os
+import math
+
+from archive import MESSAGE_FIELDS, MessageArchive, create_archive_tables
+from broker import create_broker
+from connections import ConnectionManager
+from db import Database
+from etags import ResourceVersions, cache_headers, etag_matches, make_etag, not_modified
+from metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from persistence import BULK_LOAD_TABLE_SQL, UNLESS_BULK_LOAD, MessageWriter
+from presence import PresenceRegistry
+from ratelimit import create_rate_limiter
+from read_markers import ReadMarkers, create_read_marker_table
+from recent import RecentMessageCache, encode_message, row_to_message
+from search import build_match_query, create_search_index, decode_search_cursor, encode_search_cursor, search_messages
+from serialization import FastJSONResponse, iso_timestamp
+from transfer import ImportLineError, MessageImporter, export_messages
+from typing_indicators import TypingTracker
 
 # Database setup
 DATABASE_URL = "chat_app.db"
 
+# History page size bounds for /api/channels/{id}/messages
+MAX_MESSAGE_PAGE_SIZE = 500
+
+# Result page size bound for /api/search
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Reconnecting clients that missed more than this per channel must reload
+RESYNC_MAX_MESSAGES = int(os.getenv("CHAT_RESYNC_MAX_MESSAGES", "500"))
+
 def init_database():
     """Initialize the SQLite database with tables"""
     conn = sqlite3.connect(DATABASE_URL)
@@ -49,11 +77,98 @@ def init_database():
             channel_id TEXT NOT NULL,
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             message_type TEXT DEFAULT 'text',
+            seq INTEGER,
             FOREIGN KEY (sender_id) REFERENCES users (id),
             FOREIGN KEY (channel_id) REFERENCES channels (id)
         )
     ''')
     
+    # Per-channel sequence numbers, assigned by the message writer
+    cursor.execute("PRAGMA table_info(messages)")
+    if "seq" not in {column[1] for column in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE messages ADD COLUMN seq INTEGER")
+        cursor.execute('''
+            UPDATE messages SET seq = numbered.seq
+            FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY channel_id ORDER BY timestamp, id) AS seq
+                FROM messages
+            ) AS numbered
+            WHERE messages.id = numbered.id
+        ''')
+    
+    # History is read and resynced per channel in seq order
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_channel_seq
+        ON messages (channel_id, seq)
+    ''')
+    # Superseded by idx_messages_channel_seq
+    cursor.execute("DROP INDEX IF EXISTS idx_messages_channel_timestamp")
+    
+    # Per-channel counters kept up to date by triggers, so listing channels
+    # never has to aggregate over the messages table
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'channel_stats'")
+    stats_exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS channel_stats (
+            channel_id TEXT PRIMARY KEY,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            last_message_at TIMESTAMP,
+            last_seq INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    if not stats_exists:
+        # One-time backfill for databases created before channel_stats existed
+        cursor.execute('''
+            INSERT INTO channel_stats (channel_id, message_count, last_message_at, last_seq)
+            SELECT c.id, COUNT(m.id), MAX(m.timestamp), COALESCE(MAX(m.seq), 0)
+            FROM channels c
+            LEFT JOIN messages m ON c.id = m.channel_id
+            GROUP BY c.id
+        ''')
+    cursor.execute("PRAGMA table_info(channel_stats)")
+    if "last_seq" not in {column[1] for column in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE channel_stats ADD COLUMN last_seq INTEGER NOT NULL DEFAULT 0")
+        cursor.execute('''
+            UPDATE channel_stats SET last_seq = COALESCE(
+                (SELECT MAX(seq) FROM messages WHERE messages.channel_id = channel_stats.channel_id), 0
+            )
+        ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_channels_stats_insert
+        AFTER INSERT ON channels
+        BEGIN
+            INSERT OR IGNORE INTO channel_stats (channel_id) VALUES (NEW.id);
+        END
+    ''')
+    
+    # Lets bulk imports suspend the per-row messages triggers without DDL
+    cursor.execute(BULK_LOAD_TABLE_SQL)
+    
+    # Recreated on every start so older databases pick up last_seq tracking
+    cursor.execute("DROP TRIGGER IF EXISTS trg_messages_stats_insert")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_messages_stats_insert
+        AFTER INSERT ON messages {UNLESS_BULK_LOAD}
+        BEGIN
+            INSERT INTO channel_stats (channel_id, message_count, last_message_at, last_seq)
+            VALUES (NEW.channel_id, 1, NEW.timestamp, COALESCE(NEW.seq, 0))
+            ON CONFLICT (channel_id) DO UPDATE SET
+                message_count = message_count + 1,
+                last_message_at = MAX(COALESCE(last_message_at, ''), excluded.last_message_at),
+                last_seq = MAX(last_seq, excluded.last_seq);
+        END
+    ''')
+    
+    # FTS5 index over message text, filled by its own insert trigger
+    create_search_index(cursor)
+    
+    # Which message ranges live in cold archive segments
+    create_archive_tables(cursor)
+    
+    # Last message each user has read per channel, for unread counts
+    create_read_marker_table(cursor)
+    
     # Insert default channels if they don't exist
     default_channels = [
         ("general", "General discussion", "system"),
@@ -89,6 +204,7 @@ class Message(BaseModel):
     channel_id: str
     timestamp: datetime
     message_type: str = "text"
+    seq: Optional[int] = None  # Per-channel sequence number, assigned when persisted
 
 class Channel(BaseModel):
     id: str
@@ -98,6 +214,9 @@ class Channel(BaseModel):
     created_at: datetime
     is_private: bool = False
     member_count: int = 0
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
+    last_seq: int = 0
 
 class CreateChannelRequest(BaseModel):
     name: str
@@ -107,17 +226,63 @@ class CreateChannelRequest(BaseModel):
 class ConnectUserRequest(BaseModel):
     username: str
 
-# Global state for active connections (in production, use Redis)
-active_connections: Dict[str, WebSocket] = {}
+# Thread-pooled access for the request handlers
+db = Database(DATABASE_URL)
+
+# Background writer that group-commits chat messages
+message_writer = MessageWriter(DATABASE_URL)
+
+# Ring buffer of each channel's newest messages, already JSON-encoded
+recent_messages = RecentMessageCache()
+
+# Channel fan-out and presence between workers (CHAT_BROKER=memory|redis)
+broker = create_broker()
+
+# Moves old messages into compressed per-channel segment files; one worker archives
+archive = MessageArchive(DATABASE_URL, broker)
+
+# Token buckets per user, channel and client (CHAT_RATE_LIMIT_BACKEND=memory|redis)
+rate_limiter = create_rate_limiter()
+
+# Read positions per user and channel, written to SQLite in batches
+read_markers = ReadMarkers(db)
+
+# Change counters behind the ETags of list endpoints
+resource_versions = ResourceVersions()
+
+# Who is online, kept in memory and flushed to the users table in batches
+presence = PresenceRegistry(db, broker)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting Chat API Server...")
     print("📊 Database initialized:", DATABASE_URL)
+    await message_writer.start()
+    await broker.start()
+    await manager.start()
+    await rate_limiter.start()
+    await typing_tracker.start()
+    await presence.start()
+    await read_markers.start()
+    await archive.start()
+    for channel_id, messages, complete in await db.run(recent_messages.load_tails):
+        recent_messages.warm(channel_id, messages, complete and not archive.has_segments(channel_id))
+    print("🧠 Recent-message cache warmed:", recent_messages.stats()["channels"], "channels")
     yield
     # Shutdown
     print("🛑 Shutting down Chat API Server...")
+    await typing_tracker.stop()
+    await presence.stop()
+    await read_markers.stop()
+    await archive.stop()
+    # Drain queued messages and fan them out before the broker goes away
+    await message_writer.stop()
+    await asyncio.gather(*pending_deliveries, return_exceptions=True)
+    await manager.stop()
+    await broker.stop()
+    await rate_limiter.stop()
+    db.close()
 
 app = FastAPI(
     title="Modern Chat API",
@@ -167,93 +332,163 @@ app.add_middleware(
     allow_credentials=cors_cfg["credentials"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Before-Cursor", "X-After-Cursor", "ETag"],
 )
 
-# Database helper functions
-def get_db_connection():
-    return sqlite3.connect(DATABASE_URL)
+# Per-route latency, scraped from /metrics
+app.add_middleware(MetricsMiddleware, histogram=REGISTRY.histogram(
+    "chat_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+))
+MESSAGES_RECEIVED = REGISTRY.counter("chat_messages_received_total", "Chat messages received over WebSockets")
 
-def get_channels_from_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT c.*, COUNT(m.id) as message_count
+# Database helper functions
+# List reads build plain dicts shaped like the models (same keys, same order)
+# and skip per-row model construction; see serialization.py
+async def get_channels_from_db() -> List[dict]:
+    rows = await db.fetchall('''
+        SELECT c.id, c.name, c.description, c.created_by, c.created_at, c.is_private,
+               COALESCE(s.message_count, 0), s.last_message_at, COALESCE(s.last_seq, 0)
         FROM channels c
-        LEFT JOIN messages m ON c.id = m.channel_id
-        GROUP BY c.id
+        LEFT JOIN channel_stats s ON s.channel_id = c.id
     ''')
-    rows = cursor.fetchall()
-    conn.close()
     
-    channels = []
-    for row in rows:
-        channels.append(Channel(
-            id=row[0],
-            name=row[1],
-            description=row[2],
-            created_by=row[3],
-            created_at=datetime.fromisoformat(row[4]),
-            is_private=bool(row[5]),
-            member_count=row[6]
-        ))
-    return channels
-
-def get_messages_from_db(channel_id: str, limit: int = 50):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM messages 
-        WHERE channel_id = ? 
-        ORDER BY timestamp DESC 
+    return [{
+        "id": row[0],
+        "name": row[1],
+        "description": row[2],
+        "created_by": row[3],
+        "created_at": iso_timestamp(row[4]),
+        "is_private": bool(row[5]),
+        "member_count": manager.member_count(row[0]),
+        "message_count": row[6],
+        "last_message_at": iso_timestamp(row[7]) if row[7] else None,
+        "last_seq": row[8],
+    } for row in rows]
+
+def encode_message_cursor(seq: int) -> str:
+    """Opaque, URL-safe keyset cursor for a position in a channel's history."""
+    return base64.urlsafe_b64encode(str(seq).encode()).decode().rstrip("=")
+
+def decode_message_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def message_to_dict(message: Message) -> dict:
+    return {
+        "id": message.id,
+        "text": message.text,
+        "sender_id": message.sender_id,
+        "sender_username": message.sender_username,
+        "channel_id": message.channel_id,
+        "timestamp": message.timestamp.isoformat(),
+        "message_type": message.message_type,
+        "seq": message.seq,
+    }
+
+def history_cursor_headers(first_key, last_key, has_more: bool, forward: bool) -> Dict[str, str]:
+    """Cursors for the neighbouring pages: pass X-Before-Cursor as ?before= to
+    scroll back, X-After-Cursor as ?after= to fetch newer messages."""
+    headers = {}
+    if first_key is not None:
+        if forward or has_more:
+            headers["X-Before-Cursor"] = encode_message_cursor(first_key)
+        headers["X-After-Cursor"] = encode_message_cursor(last_key)
+    return headers
+
+async def history_etag(channel_id: str, limit: int,
+                       before: Optional[int], after: Optional[int]) -> Optional[str]:
+    """ETag of a history page from the channel's last seq, or None for an unknown channel.
+
+    The last seq comes from the recent-message cache when the channel is in
+    it (the same state cached pages are served from), else from its
+    channel_stats row. A page that ends below the last seq can never change,
+    so its tag leaves the last seq out and survives new messages.
+    """
+    last_seq = recent_messages.last_key(channel_id)
+    if last_seq is None:
+        row = await db.fetchone('SELECT last_seq FROM channel_stats WHERE channel_id = ?', (channel_id,))
+        if row is None:
+            return None
+        last_seq = row[0]
+    if before is not None and after is None and before <= last_seq:
+        return make_etag("messages", channel_id, limit, before)
+    return make_etag("messages", channel_id, limit, before, after, last_seq)
+
+async def get_messages_from_db(channel_id: str, limit: int = 50,
+                               before: Optional[int] = None, after: Optional[int] = None):
+    """Return up to ``limit`` message dicts in chronological order plus a has-more flag.
+
+    Without ``after`` the page is the newest ``limit`` messages older than
+    ``before`` (or the channel tail); with ``after`` it is the oldest
+    ``limit`` messages newer than it. Either way the query is a range seek on
+    idx_messages_channel_seq, so deep pages cost the same as the first.
+    Pages reaching before the hot table continue into archive segments.
+    """
+    conditions = ["channel_id = ?"]
+    params: list = [channel_id]
+    if before is not None:
+        conditions.append("seq < ?")
+        params.append(before)
+    if after is not None:
+        conditions.append("seq > ?")
+        params.append(after)
+    order = "ASC" if after is not None else "DESC"
+    params.append(limit + 1)
+    rows = await db.fetchall(f'''
+        SELECT id, text, sender_id, sender_username, channel_id, timestamp, message_type, seq
+        FROM messages
+        WHERE {" AND ".join(conditions)}
+        ORDER BY seq {order}
         LIMIT ?
-    ''', (channel_id, limit))
-    rows = cursor.fetchall()
-    conn.close()
-    
-    messages = []
-    for row in rows:
-        messages.append(Message(
-            id=row[0],
-            text=row[1],
-            sender_id=row[2],
-            sender_username=row[3],
-            channel_id=row[4],
-            timestamp=datetime.fromisoformat(row[5]),
-            message_type=row[6]
-        ))
-    return list(reversed(messages))  # Return in chronological order
-
-def save_message_to_db(message: Message):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO messages (id, text, sender_id, sender_username, channel_id, timestamp, message_type)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (message.id, message.text, message.sender_id, message.sender_username, 
-          message.channel_id, message.timestamp.isoformat(), message.message_type))
-    conn.commit()
-    conn.close()
-
-def save_user_to_db(user: User):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    ''', params)
+    if archive.has_segments(channel_id):
+        if after is not None:
+            if after < archive.archived_upto(channel_id):
+                older = await asyncio.to_thread(archive.read_after, channel_id, after, limit + 1)
+                older = [m for m in older if before is None or m["seq"] < before]
+                if older:
+                    # A segment being archived right now may still be in the hot table
+                    rows = [tuple(m[f] for f in MESSAGE_FIELDS) for m in older] + \
+                        [row for row in rows if row[7] > older[-1]["seq"]]
+        elif len(rows) <= limit:
+            # Ran off the start of the hot table
+            upper = rows[-1][7] if rows else before
+            older = await asyncio.to_thread(archive.read_before, channel_id, upper, limit + 1 - len(rows))
+            rows = rows + [tuple(m[f] for f in MESSAGE_FIELDS) for m in older]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after is None:
+        rows.reverse()  # Return in chronological order
+    return [row_to_message(row) for row in rows], has_more
+
+def save_message_to_db(message: Message) -> asyncio.Future:
+    """Queue a message for the group-commit writer; the future resolves once it is durable."""
+    return message_writer.submit((
+        message.id, message.text, message.sender_id, message.sender_username,
+        message.channel_id, message.timestamp.isoformat(), message.message_type
+    ))
+
+async def save_user_to_db(user: User):
+    await db.execute('''
         INSERT OR REPLACE INTO users (id, username, is_online, last_seen)
         VALUES (?, ?, ?, ?)
     ''', (user.id, user.username, user.is_online, user.last_seen.isoformat()))
-    conn.commit()
-    conn.close()
 
-def save_channel_to_db(channel: Channel):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+async def save_channel_to_db(channel: Channel):
+    await db.execute('''
         INSERT INTO channels (id, name, description, created_by, created_at, is_private)
         VALUES (?, ?, ?, ?, ?, ?)
     ''', (channel.id, channel.name, channel.description, channel.created_by, 
           channel.created_at.isoformat(), channel.is_private))
-    conn.commit()
-    conn.close()
+
+async def limit_rest_writes(request: Request):
+    """Refuse REST writes over the per-client budget with 429 and Retry-After."""
+    wait = await rate_limiter.check("rest_writes", request.client.host if request.client else "unknown")
+    if wait > 0:
+        raise HTTPException(status_code=429, detail="Too many requests",
+                            headers={"Retry-After": str(math.ceil(wait))})
 
 # API Routes
 @app.get("/")
@@ -265,52 +500,149 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(), "database": DATABASE_URL}
 
 @app.get("/api/users")
-async def get_users():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users')
-    rows = cursor.fetchall()
-    conn.close()
+async def get_users(request: Request):
+    etag = resource_versions.etag("users", presence.version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    rows = await db.fetchall('SELECT id, username, last_seen FROM users')
     
-    users = []
-    for row in rows:
-        users.append(User(
-            id=row[0],
-            username=row[1],
-            is_online=bool(row[2]),
-            last_seen=datetime.fromisoformat(row[3])
-        ))
-    return users
+    # Presence comes from the registry; the table may lag by one flush
+    return FastJSONResponse([{
+        "id": row[0],
+        "username": row[1],
+        "is_online": presence.is_online(row[0]),
+        "last_seen": iso_timestamp(presence.last_seen(row[0]) or row[2]),
+    } for row in rows], headers=cache_headers(etag))
+
+@app.get("/api/users/online")
+async def get_online_users(offset: int = 0, limit: int = 100):
+    offset = max(0, offset)
+    limit = max(1, min(limit, 1000))
+    return {
+        "count": presence.online_count(),
+        "offset": offset,
+        "users": presence.online_users(offset, limit),
+    }
+
+@app.get("/api/users/{user_id}/unread")
+async def get_unread_counts(user_id: str):
+    """Unread count per channel: its last seq minus the user's read marker."""
+    return FastJSONResponse(await read_markers.unread(user_id))
 
 @app.get("/api/channels")
-async def get_channels():
-    return get_channels_from_db()
+async def get_channels(request: Request):
+    etag = resource_versions.etag("channels", manager.subscription_version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    return FastJSONResponse(await get_channels_from_db(), headers=cache_headers(etag))
 
 @app.get("/api/channels/{channel_id}/messages")
-async def get_channel_messages(channel_id: str, limit: int = 50):
+async def get_channel_messages(request: Request, channel_id: str, limit: int = 50,
+                               before: Optional[str] = None, after: Optional[str] = None):
+    limit = max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+    before_key = decode_message_cursor(before) if before else None
+    after_key = decode_message_cursor(after) if after else None
+    
+    # Unchanged pages are answered before anything is read or encoded
+    etag = await history_etag(channel_id, limit, before_key, after_key)
+    if etag is not None and etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    validators = cache_headers(etag) if etag is not None else {}
+    
+    # Pages inside the recent window are served pre-encoded from memory
+    page = recent_messages.page(channel_id, limit, before_key, after_key)
+    if page is not None:
+        payloads, first_key, last_key, has_more = page
+        return Response(
+            content="[" + ",".join(payloads) + "]",
+            media_type="application/json",
+            headers={**history_cursor_headers(first_key, last_key, has_more, after_key is not None), **validators},
+        )
+    
     # Check if channel exists
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM channels WHERE id = ?', (channel_id,))
-    if not cursor.fetchone():
-        conn.close()
+    if not await db.fetchone('SELECT id FROM channels WHERE id = ?', (channel_id,)):
         raise HTTPException(status_code=404, detail="Channel not found")
-    conn.close()
     
-    return get_messages_from_db(channel_id, limit)
+    appends_before_read = recent_messages.appends
+    messages, has_more = await get_messages_from_db(channel_id, limit, before_key, after_key)
+    if before_key is None and after_key is None:
+        # A tail read re-warms a channel that dropped out of the cache
+        recent_messages.warm_if_unchanged(channel_id, messages, not has_more, appends_before_read)
+    headers = dict(validators)
+    if messages:
+        headers.update(history_cursor_headers(messages[0]["seq"], messages[-1]["seq"], has_more, after_key is not None))
+    return FastJSONResponse(messages, headers=headers)
+
+@app.get("/api/search")
+async def search(q: str, channel_id: Optional[str] = None, sender_id: Optional[str] = None,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 sort: str = "relevance", limit: int = 20, cursor: Optional[str] = None):
+    if sort not in ("relevance", "recent"):
+        raise HTTPException(status_code=400, detail="sort must be 'relevance' or 'recent'")
+    match = build_match_query(q)
+    if match is None:
+        raise HTTPException(status_code=400, detail="Search query is empty")
+    limit = max(1, min(limit, MAX_SEARCH_PAGE_SIZE))
+    try:
+        position = decode_search_cursor(cursor, sort) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    results, next_position = await db.run(
+        search_messages, match, limit, sort, channel_id, sender_id,
+        since.isoformat() if since else None, until.isoformat() if until else None, position
+    )
+    return {
+        "results": results,
+        "next_cursor": encode_search_cursor(next_position) if next_position else None,
+    }
+
+@app.get("/api/channels/{channel_id}/export")
+async def export_channel(channel_id: str):
+    if not await db.fetchone('SELECT id FROM channels WHERE id = ?', (channel_id,)):
+        raise HTTPException(status_code=404, detail="Channel not found")
+    return StreamingResponse(
+        export_messages(db, archive, [channel_id]),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{channel_id}.ndjson"'},
+    )
+
+@app.get("/api/export")
+async def export_all_channels():
+    rows = await db.fetchall('SELECT id FROM channels UNION SELECT channel_id FROM channel_stats ORDER BY 1')
+    return StreamingResponse(
+        export_messages(db, archive, [row[0] for row in rows]),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="messages.ndjson"'},
+    )
 
-@app.post("/api/channels")
+@app.post("/api/import", dependencies=[Depends(limit_rest_writes)])
+async def import_messages(request: Request, channel_id: Optional[str] = None):
+    """Bulk-load an NDJSON body (as produced by the export endpoints).
+
+    ``channel_id`` imports every line into that channel instead of its own.
+    """
+    importer = MessageImporter(DATABASE_URL, channel_id)
+    await asyncio.to_thread(importer.open)
+    try:
+        await importer.import_stream(request.stream())
+    except ImportLineError as error:
+        raise HTTPException(
+            status_code=400, detail=f"{error}; {importer.imported} messages before it were imported"
+        )
+    finally:
+        await asyncio.to_thread(importer.close)
+        if importer.channels:
+            await broker.publish("channels_imported", {"channel_ids": list(importer.channels)})
+    return importer.stats()
+
+@app.post("/api/channels", dependencies=[Depends(limit_rest_writes)])
 async def create_channel(channel_request: CreateChannelRequest):
     channel_id = channel_request.name.lower().replace(" ", "-")
     
     # Check if channel already exists
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM channels WHERE id = ?', (channel_id,))
-    if cursor.fetchone():
-        conn.close()
+    if await db.fetchone('SELECT id FROM channels WHERE id = ?', (channel_id,)):
         raise HTTPException(status_code=400, detail="Channel already exists")
-    conn.close()
     
     new_channel = Channel(
         id=channel_id,
@@ -321,22 +653,19 @@ async def create_channel(channel_request: CreateChannelRequest):
         is_private=channel_request.is_private
     )
     
-    save_channel_to_db(new_channel)
+    await save_channel_to_db(new_channel)
+    recent_messages.warm(channel_id, [], complete=True)
+    await broker.publish("channel_created", {"channel_id": channel_id})
     return new_channel
 
-@app.post("/api/users/connect")
+@app.post("/api/users/connect", dependencies=[Depends(limit_rest_writes)])
 async def connect_user(request: ConnectUserRequest):
     if not request.username.strip():
         raise HTTPException(status_code=400, detail="Username is required")
     
     # Check if username is already taken
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM users WHERE username = ?', (request.username,))
-    if cursor.fetchone():
-        conn.close()
+    if await db.fetchone('SELECT id FROM users WHERE username = ?', (request.username,)):
         raise HTTPException(status_code=400, detail="Username already taken")
-    conn.close()
     
     user_id = str(uuid.uuid4())
     new_user = User(
@@ -346,58 +675,170 @@ async def connect_user(request: ConnectUserRequest):
         last_seen=datetime.now()
     )
     
-    save_user_to_db(new_user)
+    await save_user_to_db(new_user)
+    await read_markers.start_at_latest(new_user.id)
+    await presence.registered(new_user.id, new_user.username)
     return new_user
 
 @app.post("/api/users/{user_id}/disconnect")
 async def disconnect_user(user_id: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE users SET is_online = FALSE, last_seen = ? WHERE id = ?', 
-                  (datetime.now().isoformat(), user_id))
-    conn.commit()
-    conn.close()
+    await presence.mark_offline(user_id)
     return {"message": "User disconnected"}
 
 # WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        print(f"✅ User {user_id} connected")
-
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            print(f"❌ User {user_id} disconnected")
-
-    async def send_personal_message(self, message: str, user_id: str):
-        if user_id in self.active_connections:
-            await self.active_connections[user_id].send_text(message)
-
-    async def broadcast_to_channel(self, message: str, channel_id: str, exclude_user: str = None):
-        for user_id, connection in self.active_connections.items():
-            if user_id != exclude_user:
-                try:
-                    await connection.send_text(message)
-                except:
-                    pass
-
-manager = ConnectionManager()
+manager = ConnectionManager(broker)
+
+async def broadcast_typing(channel_id: str, frame: str, exclude_user: Optional[str]):
+    await manager.broadcast_to_channel(frame, channel_id, exclude_user=exclude_user, kind="typing")
+
+# Coalesces typing frames into rate-limited start/stop transitions
+typing_tracker = TypingTracker(broadcast_typing)
+
+@app.get("/api/ws/stats")
+async def websocket_stats():
+    return {**manager.stats(), "typing": typing_tracker.stats(), "presence": presence.stats(),
+            "rate_limits": rate_limiter.stats()}
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return recent_messages.stats()
+
+@app.get("/api/db/stats")
+async def db_stats():
+    return {"message_writer": message_writer.stats(), "pool_size": db.pool_size, "archive": archive.stats(),
+            "read_markers": read_markers.stats()}
+
+# Everything below is read from live state only when /metrics is scraped
+REGISTRY.gauge_callback("chat_ws_connections", "Open WebSockets on this worker",
+                        lambda: len(manager.active_connections))
+REGISTRY.gauge_callback("chat_ws_channel_subscribers", "Local WebSockets subscribed to a channel",
+                        lambda: [((channel_id,), len(users)) for channel_id, users in manager.channel_subscribers.items()],
+                        ["channel"])
+REGISTRY.gauge_callback("chat_ws_outbound_queued", "Frames waiting in outbound queues",
+                        lambda: sum(c.depth for c in manager.active_connections.values()))
+REGISTRY.gauge_callback("chat_ws_outbound_queue_depth_max", "Deepest outbound queue",
+                        lambda: max((c.depth for c in manager.active_connections.values()), default=0))
+REGISTRY.gauge_callback("chat_ws_over_high_water", "Connections above the outbound high-water mark",
+                        lambda: sum(1 for c in manager.active_connections.values() if c.over_high_water_since is not None))
+REGISTRY.counter_callback("chat_ws_frames_sent_total", "Frames written to WebSockets", manager.frames_sent)
+REGISTRY.counter_callback("chat_ws_frames_dropped_total", "Typing frames dropped under backlog", manager.frames_dropped)
+REGISTRY.counter_callback("chat_ws_evictions_total", "Slow consumers disconnected", lambda: manager.evicted)
+REGISTRY.counter_callback("chat_broker_publish_failures_total", "Broker events other workers missed",
+                          lambda: broker.publish_failures)
+REGISTRY.gauge_callback("chat_presence_online", "Users online across workers", presence.online_count)
+REGISTRY.gauge_callback("chat_read_markers_pending", "Read markers waiting for the next batch write",
+                        lambda: read_markers.stats()["pending_flush"])
+REGISTRY.gauge_callback("chat_message_writer_pending", "Messages queued for the next group commit",
+                        lambda: message_writer.stats()["pending"])
+
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+# Deliveries waiting on the message writer, referenced until they finish
+pending_deliveries: Set[asyncio.Task] = set()
+
+async def deliver_persisted_message(persisted: asyncio.Future, user_id: str, message: Message,
+                                    client_msg_id: Optional[str] = None):
+    """Fan a message out once it is durable and numbered, then ack the sender.
+
+    Acks echo the sender's ``client_msg_id`` so it can match them to its sends.
+    """
+    try:
+        message.seq = await persisted
+    except Exception as error:
+        print(f"⚠️ Failed to persist message {message.id}: {error}")
+        ack = {"type": "message_error", "message_id": message.id, "detail": "Message could not be saved"}
+    else:
+        await broker.publish("messages", {"message": message_to_dict(message), "exclude_user": user_id})
+        ack = {"type": "message_sent", "message_id": message.id, "channel_id": message.channel_id, "seq": message.seq}
+        # Your own messages are never unread
+        read_markers.mark_read(user_id, message.channel_id, message.seq)
+    if client_msg_id is not None:
+        ack["client_msg_id"] = client_msg_id
+    manager.send_personal_message_nowait(json.dumps(ack), user_id)
+
+def on_message_persisted(data: dict, origin: str):
+    """Every worker caches each committed message and delivers it to its own subscribers."""
+    message = data["message"]
+    payload = recent_messages.append(message["channel_id"], message)
+    manager.deliver_to_channel(
+        '{"type":"new_message","message":' + payload + '}', message["channel_id"], exclude_user=data["exclude_user"]
+    )
+    # Message counts and last_seq in the channel list changed
+    resource_versions.bump("channels")
+
+broker.on("messages", on_message_persisted)
+
+def on_channel_created(data: dict, origin: str):
+    resource_versions.bump("channels")
+
+broker.on("channel_created", on_channel_created)
+
+def on_channels_imported(data: dict, origin: str):
+    """Imports bypass the message writer, so every worker drops its cached tails of those channels."""
+    for channel_id in data["channel_ids"]:
+        recent_messages.invalidate(channel_id)
+    resource_versions.bump("channels")
+
+broker.on("channels_imported", on_channels_imported)
+
+async def resync_channel(user_id: str, channel_id: str, last_seq: int):
+    """Replay what a reconnecting client missed after last_seq, or ask it to reload."""
+    page = recent_messages.page(channel_id, RESYNC_MAX_MESSAGES, after=last_seq)
+    if page is not None:
+        payloads, _, _, has_more = page
+    else:
+        messages, has_more = await get_messages_from_db(channel_id, RESYNC_MAX_MESSAGES, after=last_seq)
+        payloads = [encode_message(m) for m in messages]
+    if has_more:
+        frame = json.dumps({"type": "resync_required", "channel_id": channel_id})
+    else:
+        frame = '{"type":"resync","channel_id":' + json.dumps(channel_id) + ',"messages":[' + ",".join(payloads) + ']}'
+    manager.send_personal_message_nowait(frame, user_id)
 
 @app.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await manager.connect(websocket, user_id)
+async def websocket_endpoint(websocket: WebSocket, user_id: str, channels: Optional[str] = None):
+    connection = await manager.connect(websocket, user_id)
+    await presence.connected(user_id)
+    # Initial subscriptions can be passed as ?channels=general,tech
+    for channel_id in (channels or "").split(","):
+        if channel_id.strip():
+            manager.subscribe(user_id, channel_id.strip())
     
     try:
         while True:
             data = await websocket.receive_text()
             message_data = json.loads(data)
             
-            if message_data["type"] == "message":
+            if message_data["type"] in ("subscribe", "unsubscribe"):
+                channel_ids = message_data.get("channel_ids") or [message_data["channel_id"]]
+                for channel_id in channel_ids:
+                    if message_data["type"] == "subscribe":
+                        manager.subscribe(user_id, channel_id)
+                    else:
+                        manager.unsubscribe(user_id, channel_id)
+                await manager.send_personal_message(
+                    json.dumps({
+                        "type": message_data["type"] + "d",
+                        "channel_ids": channel_ids
+                    }),
+                    user_id
+                )
+                
+            elif message_data["type"] == "message":
+                MESSAGES_RECEIVED.inc()
+                # Shed floods here, before anything is queued or fanned out
+                limit, wait = await rate_limiter.check_all(
+                    ("messages_user", user_id), ("messages_channel", message_data["channel_id"])
+                )
+                if limit is not None:
+                    frame = {"type": "rate_limited", "limit": limit, "channel_id": message_data["channel_id"],
+                             "retry_after": round(wait, 3)}
+                    if message_data.get("client_msg_id") is not None:
+                        frame["client_msg_id"] = message_data["client_msg_id"]
+                    manager.send_personal_message_nowait(json.dumps(frame), user_id)
+                    continue
                 # Create new message
                 new_message = Message(
                     id=str(uuid.uuid4()),
@@ -408,57 +849,49 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                     timestamp=datetime.now()
                 )
                 
-                # Save message to database
-                save_message_to_db(new_message)
+                await typing_tracker.stopped(new_message.channel_id, user_id)
                 
-                # Broadcast to all connected users
-                await manager.broadcast_to_channel(
-                    json.dumps({
-                        "type": "new_message",
-                        "message": {
-                            "id": new_message.id,
-                            "text": new_message.text,
-                            "sender_id": new_message.sender_id,
-                            "sender_username": new_message.sender_username,
-                            "channel_id": new_message.channel_id,
-                            "timestamp": new_message.timestamp.isoformat()
-                        }
-                    }),
-                    message_data["channel_id"],
-                    exclude_user=user_id
-                )
+                # Queue the message for the next group commit; it is broadcast
+                # with its seq once durable, and the sender acked after that
+                persisted = save_message_to_db(new_message)
+                delivery = asyncio.create_task(deliver_persisted_message(
+                    persisted, user_id, new_message, message_data.get("client_msg_id")
+                ))
+                pending_deliveries.add(delivery)
+                delivery.add_done_callback(pending_deliveries.discard)
                 
-                # Send confirmation back to sender
-                await manager.send_personal_message(
-                    json.dumps({
-                        "type": "message_sent",
-                        "message_id": new_message.id
-                    }),
-                    user_id
-                )
+            elif message_data["type"] == "resync":
+                # {"channels": {channel_id: last seq the client has}}
+                for channel_id, last_seq in message_data["channels"].items():
+                    await resync_channel(user_id, channel_id, int(last_seq))
+                
+            elif message_data["type"] == "read":
+                # {"channel_id": ..., "seq": n} or {"channels": {channel_id: seq}}
+                positions = message_data.get("channels") or {message_data["channel_id"]: message_data["seq"]}
+                for channel_id, seq in positions.items():
+                    read_markers.mark_read(user_id, channel_id, int(seq))
                 
             elif message_data["type"] == "typing":
-                # Broadcast typing indicator
-                await manager.broadcast_to_channel(
-                    json.dumps({
-                        "type": "user_typing",
-                        "user_id": user_id,
-                        "username": message_data.get("username", "Unknown"),
-                        "channel_id": message_data["channel_id"]
-                    }),
-                    message_data["channel_id"],
-                    exclude_user=user_id
-                )
+                # Only start/stop transitions reach the channel, rate-limited
+                if message_data.get("state") == "stop":
+                    await typing_tracker.stopped(message_data["channel_id"], user_id)
+                elif await rate_limiter.check("typing_user", user_id):
+                    pass  # Typing is best-effort; excess frames are dropped silently
+                else:
+                    await typing_tracker.typing(
+                        message_data["channel_id"], user_id, message_data.get("username", "Unknown")
+                    )
+                
+            elif message_data["type"] == "heartbeat":
+                # Keeps last_seen fresh; written out with the next presence flush
+                presence.heartbeat(user_id)
                 
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
-        # Update user status in database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE users SET is_online = FALSE, last_seen = ? WHERE id = ?', 
-                      (datetime.now().isoformat(), user_id))
-        conn.commit()
-        conn.close()
+        pass
+    finally:
+        manager.disconnect(user_id, connection)
+        await typing_tracker.user_gone(user_id)
+        await presence.disconnected(user_id)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,342 @@
+"""In-process metrics in the Prometheus text format.
+
+A deliberately small registry instead of a client library: counters and
+histograms are a dict lookup plus an uncontended lock per update (they are
+also updated from DB pool threads), and everything that already exists as
+server state (connections, queue depths, subscribers) is read by callbacks
+only when ``/metrics`` is scraped, so nothing is added to the hot path for
+it. Label values must come from a bounded set: route templates, statement
+names, frame kinds, channel ids.
+"""
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Starlette appends the utf-8 charset to text responses
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds; covers sub-millisecond cache hits up to multi-second stalls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_STATEMENT = re.compile(
+    r"^\s*(\w+)(?:.*?\b(?:FROM|INTO|UPDATE|TABLE|INDEX|TRIGGER)\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+))?",
+    re.IGNORECASE | re.DOTALL,
+)
+_UPDATE = re.compile(r"^\s*UPDATE\s+(?:OR\s+\w+\s+)?(\w+)", re.IGNORECASE)
+
+CallbackResult = Union[float, Iterable[Tuple[Sequence[str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def query_name(sql: str) -> str:
+    """A bounded label for a statement: its verb and first table, e.g. ``select messages``."""
+    match = _UPDATE.match(sql) or _STATEMENT.match(sql)
+    if match is None:
+        return "other"
+    if match.re is _UPDATE:
+        return f"update {match.group(1)}"
+    verb, table = match.group(1).lower(), match.group(2)
+    return f"{verb} {table}" if table else verb
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf, not cumulative until rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Callback(_Metric):
+    """A gauge or counter whose value is read from existing state at scrape time."""
+
+    def __init__(self, name: str, documentation: str, kind: str, fn: Callable[[], CallbackResult],
+                 labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        result = self.fn()
+        if not self.labelnames:
+            return [f"{self.name} {_format_value(result)}"]
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+                for values, value in result]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        # Re-registering a name (e.g. on module reload) keeps the first metric
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name: str, documentation: str, fn: Callable[[], CallbackResult],
+                       labelnames: Sequence[str] = ()) -> Callback:
+        return self._register(Callback(name, documentation, "gauge", fn, labelnames))
+
+    def counter_callback(self, name: str, documentation: str, fn: Callable[[], CallbackResult],
+                         labelnames: Sequence[str] = ()) -> Callback:
+        return self._register(Callback(name, documentation, "counter", fn, labelnames))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = metric.render()
+            except Exception as exc:
+                # One broken callback must not take the whole scrape down
+                print(f"⚠️ Metric {metric.name} failed: {exc}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# The process-wide registry; each app prefixes its own metric names
+REGISTRY = Registry()
+
+
+class MetricsMiddleware:
+    """Times HTTP requests per route template, method and status.
+
+    A plain ASGI middleware rather than ``BaseHTTPMiddleware``, which would
+    add a task and a stream copy to every request. The route is read from the
+    endpoint the router resolved, so unknown paths all share one label.
+    WebSocket sessions are long-lived and are not timed here.
+    """
+
+    def __init__(self, app, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+        self._routes: Optional[Dict[object, str]] = None
+
+    def _route_label(self, scope) -> str:
+        if self._routes is None:
+            self._routes = {getattr(route, "endpoint", None) or getattr(route, "app", None): route.path
+                            for route in scope["app"].routes}
+        return self._routes.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.histogram.labels(scope["method"], self._route_label(scope), str(status)).observe(
+                time.perf_counter() - started
+            )
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Attributes execute and fetch time to the statement that produced the rows."""
+
+    histogram: Optional[Histogram] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._query: Optional[str] = None
+        self._elapsed = 0.0
+
+    def _record(self):
+        if self._query is not None and self.histogram is not None:
+            self.histogram.labels(self._query).observe(self._elapsed)
+        self._query = None
+        self._elapsed = 0.0
+
+    def __del__(self):
+        # A cursor dropped before the next statement still reports its last one
+        self._record()
+
+    def _timed(self, query: Optional[str], fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            if query is not None:
+                self._record()
+                self._query = query
+            self._elapsed += time.perf_counter() - started
+
+    def execute(self, sql, parameters=()):
+        return self._timed(query_name(sql), super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(query_name(sql), super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._timed(None, super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed(None, super().fetchmany, *(() if size is None else (size,)))
+
+    def fetchall(self):
+        return self._timed(None, super().fetchall)
+
+
+class TimedConnection(sqlite3.Connection):
+    """A connection whose cursors time every statement into ``histogram``.
+
+    Use as ``sqlite3.connect(path, factory=timed_connection(histogram))``;
+    timings are recorded on the next statement of the same cursor, when the
+    cursor is garbage-collected or when the connection is closed.
+    """
+
+    histogram: Optional[Histogram] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Weak, so a long-lived connection doesn't keep every cursor it made
+        self._cursors: "weakref.WeakSet[TimedCursor]" = weakref.WeakSet()
+
+    def cursor(self, factory=None):
+        cursor = super().cursor(factory or self._cursor_class)
+        self._cursors.add(cursor)
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        for cursor in list(self._cursors):
+            cursor._record()
+        self._cursors.clear()
+        super().close()
+
+
+def timed_connection(histogram: Histogram) -> type:
+    cursor_class = type("TimedCursor", (TimedCursor,), {"histogram": histogram})
+    return type("TimedConnection", (TimedConnection,), {"histogram": histogram, "_cursor_class": cursor_class})
@@ -0,0 +1,208 @@
+"""Write-behind message persistence with group commit.
+
+Chat messages are handed to a single background writer that owns one
+long-lived WAL-mode SQLite connection. Rows queued within a short window
+are inserted in one transaction, so a burst of N messages costs one commit
+(and one fsync) instead of N. Each submitted row gets a future that resolves
+once the transaction holding it is durable.
+
+The writer also numbers messages: inside the transaction each row gets the
+next sequence number of its channel (one past its highest ``seq``, hot or
+archived), and its future resolves to that number. Since only committed rows consume
+numbers, every channel's sequence is gap-free.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from db import QUERY_SECONDS
+from metrics import REGISTRY
+
+# Group-commit tuning (overridable via environment)
+MESSAGE_BATCH_SIZE = int(os.getenv("CHAT_MESSAGE_BATCH_SIZE", "500"))
+MESSAGE_FLUSH_INTERVAL = float(os.getenv("CHAT_MESSAGE_FLUSH_MS", "5")) / 1000
+DB_SYNCHRONOUS = os.getenv("CHAT_DB_SYNCHRONOUS", "FULL")
+
+MESSAGES_PERSISTED = REGISTRY.counter("chat_messages_persisted_total", "Messages committed by the message writer")
+BATCH_ROWS = REGISTRY.histogram(
+    "chat_message_batch_rows", "Messages per group commit", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+# A bulk import puts a row here and deletes it again inside its own write
+# transaction, so only that transaction ever sees it; meanwhile the per-row
+# triggers on ``messages`` skip, and the import does their work set-based
+BULK_LOAD_TABLE_SQL = "CREATE TABLE IF NOT EXISTS messages_bulk_load (id INTEGER PRIMARY KEY CHECK (id = 1))"
+UNLESS_BULK_LOAD = "WHEN NOT EXISTS (SELECT 1 FROM messages_bulk_load)"
+
+INSERT_MESSAGE_SQL = '''
+    INSERT INTO messages (id, text, sender_id, sender_username, channel_id, timestamp, message_type, seq)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+# A seek on idx_messages_channel_seq; channel_stats still remembers seqs
+# whose rows have been archived out of the table
+LAST_SEQ_SQL = '''
+    SELECT MAX(
+        COALESCE((SELECT MAX(seq) FROM messages WHERE channel_id = ?1), 0),
+        COALESCE((SELECT last_seq FROM channel_stats WHERE channel_id = ?1), 0)
+    )
+'''
+
+
+class MessageWriter:
+    def __init__(self, db_path: str, batch_size: int = MESSAGE_BATCH_SIZE,
+                 flush_interval: float = MESSAGE_FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.batches_written = 0
+        self.last_batch_size = 0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stopping = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        # One thread owns the connection; commits never run on the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-writer")
+        await loop.run_in_executor(self._executor, self._open)
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued, then close the connection."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=True)
+
+    def submit(self, row: Sequence) -> asyncio.Future:
+        """Queue a message row (without seq); the future resolves to its seq once committed."""
+        if not self.running or self._stopping:
+            raise RuntimeError("Message writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((tuple(row), future))
+        return future
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "last_batch_size": self.last_batch_size,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval * 1000,
+        }
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                # Wake-up from stop(); keep going only if rows are still queued
+                if self._queue.empty():
+                    break
+                continue
+            # Give concurrent senders a moment to join this commit
+            if self._queue.qsize() + 1 < self.batch_size and self.flush_interval > 0:
+                await asyncio.sleep(self.flush_interval)
+            await self._flush([item] + self._take(self.batch_size - 1))
+            if self._stopping and self._queue.empty():
+                break
+
+    def _take(self, limit: int) -> List[Tuple[tuple, asyncio.Future]]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                batch.append(item)
+        return batch
+
+    async def _flush(self, batch: List[Tuple[tuple, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._executor, self._write, [row for row, _ in batch])
+        except Exception as exc:
+            results = [exc] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    # The methods below run on the writer thread only
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute("PRAGMA busy_timeout=5000")
+        self._conn = conn
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _insert(self, rows: List[tuple]) -> List[int]:
+        """Insert rows numbered after their channels' last seq; runs inside a transaction."""
+        conn = self._conn
+        next_seq: Dict[str, int] = {}
+        seqs = []
+        for row in rows:
+            channel_id = row[4]
+            if channel_id not in next_seq:
+                next_seq[channel_id] = conn.execute(LAST_SEQ_SQL, (channel_id,)).fetchone()[0]
+            next_seq[channel_id] += 1
+            seqs.append(next_seq[channel_id])
+        conn.executemany(INSERT_MESSAGE_SQL, [row + (seq,) for row, seq in zip(rows, seqs)])
+        return seqs
+
+    def _write(self, rows: List[tuple]) -> List[Union[int, Exception]]:
+        conn = self._conn
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            results: List[Union[int, Exception]] = self._insert(rows)
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK")
+            # Isolate the offending rows so one bad message can't fail the batch
+            results = []
+            for row in rows:
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    results.extend(self._insert([row]))
+                    conn.execute("COMMIT")
+                except sqlite3.Error as exc:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    results.append(exc)
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        QUERY_SECONDS.labels("write messages").observe(time.perf_counter() - started)
+        written = sum(1 for r in results if not isinstance(r, Exception))
+        MESSAGES_PERSISTED.inc(written)
+        BATCH_ROWS.observe(len(rows))
+        self.rows_written += written
+        self.batches_written += 1
+        self.last_batch_size = len(rows)
+        return results
@@ -0,0 +1,213 @@
+"""Authoritative in-memory presence.
+
+Who is online is decided here from WebSocket connects, disconnects and
+heartbeats, not read back from the ``users`` table. Changes are shared with
+other workers over the broker's ``presence`` topic, and ``last_seen`` /
+``is_online`` are written to SQLite in periodic batches so the database
+stays a durable record without being on the hot path.
+"""
+import asyncio
+import os
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from broker import Broker
+from db import Database
+
+PRESENCE_FLUSH_INTERVAL = float(os.getenv("CHAT_PRESENCE_FLUSH_SECONDS", "5"))
+
+
+class PresenceEntry:
+    __slots__ = ("username", "connections", "remote_nodes", "last_seen")
+
+    def __init__(self, username: str, last_seen: datetime):
+        self.username = username
+        self.connections = 0
+        # Other workers this user is connected to
+        self.remote_nodes: Set[str] = set()
+        self.last_seen = last_seen
+
+    @property
+    def online(self) -> bool:
+        return self.connections > 0 or bool(self.remote_nodes)
+
+
+class PresenceRegistry:
+    def __init__(self, db: Database, broker: Broker, flush_interval: float = PRESENCE_FLUSH_INTERVAL):
+        self.db = db
+        self.broker = broker
+        self.flush_interval = flush_interval
+        self.flushes = 0
+        self.rows_flushed = 0
+        # Bumped on every change visible in the users list
+        self.version = 0
+        self._entries: Dict[str, PresenceEntry] = {}
+        # (lowercase username, user_id) of online users, kept sorted for paging
+        self._online: List[Tuple[str, str]] = []
+        # user_id -> (is_online, last_seen) not yet written to SQLite
+        self._dirty: Dict[str, Tuple[bool, str]] = {}
+        self._task: Optional[asyncio.Task] = None
+        broker.on("presence", self._on_remote_event)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def seen(self, user_id: str, username: str):
+        """Remember a user's name without marking them online."""
+        if user_id not in self._entries:
+            self._entries[user_id] = PresenceEntry(username, datetime.now())
+            self.version += 1
+
+    async def registered(self, user_id: str, username: str):
+        """A new account: remember it here and tell the other workers it exists."""
+        self.seen(user_id, username)
+        await self._publish(user_id, self._entries[user_id], False)
+
+    async def connected(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            row = await self.db.fetchone('SELECT username FROM users WHERE id = ?', (user_id,))
+            entry = self._entries.setdefault(user_id, PresenceEntry(row[0] if row else "Unknown", datetime.now()))
+        was_online = entry.online
+        entry.connections += 1
+        self._touch(user_id, entry, was_online)
+        await self._publish(user_id, entry, True)
+
+    async def disconnected(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None or entry.connections == 0:
+            return
+        was_online = entry.online
+        entry.connections -= 1
+        self._touch(user_id, entry, was_online)
+        if entry.connections == 0:
+            await self._publish(user_id, entry, False)
+
+    async def mark_offline(self, user_id: str):
+        """Explicit sign-out: offline here regardless of open sockets."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self._dirty[user_id] = (False, datetime.now().isoformat())
+            return
+        was_online = entry.online
+        entry.connections = 0
+        self._touch(user_id, entry, was_online)
+        await self._publish(user_id, entry, False)
+
+    def heartbeat(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._touch(user_id, entry, entry.online)
+
+    def _touch(self, user_id: str, entry: PresenceEntry, was_online: bool):
+        self.version += 1
+        entry.last_seen = datetime.now()
+        # Merged state: a user who left this worker may still be on another one
+        self._dirty[user_id] = (entry.online, entry.last_seen.isoformat())
+        self._reindex(user_id, entry, was_online)
+
+    def _reindex(self, user_id: str, entry: PresenceEntry, was_online: bool):
+        key = (entry.username.lower(), user_id)
+        if entry.online and not was_online:
+            insort(self._online, key)
+        elif was_online and not entry.online:
+            index = bisect_left(self._online, key)
+            if index < len(self._online) and self._online[index] == key:
+                del self._online[index]
+
+    async def _publish(self, user_id: str, entry: PresenceEntry, online: bool):
+        await self.broker.publish("presence", {
+            "user_id": user_id,
+            "username": entry.username,
+            "online": online,
+            "last_seen": entry.last_seen.isoformat(),
+        })
+
+    def _on_remote_event(self, data: dict, origin: str):
+        if origin == self.broker.node_id:
+            return
+        last_seen = datetime.fromisoformat(data["last_seen"])
+        entry = self._entries.setdefault(data["user_id"], PresenceEntry(data["username"], last_seen))
+        was_online = entry.online
+        if data["online"]:
+            entry.remote_nodes.add(origin)
+        else:
+            entry.remote_nodes.discard(origin)
+        entry.last_seen = max(entry.last_seen, last_seen)
+        if data["user_id"] in self._dirty:
+            # Don't let a pending flush write back what this event just changed
+            self._dirty[data["user_id"]] = (entry.online, self._dirty[data["user_id"]][1])
+        self.version += 1
+        self._reindex(data["user_id"], entry, was_online)
+
+    def is_online(self, user_id: str) -> bool:
+        entry = self._entries.get(user_id)
+        return entry is not None and entry.online
+
+    def last_seen(self, user_id: str) -> Optional[datetime]:
+        entry = self._entries.get(user_id)
+        return entry.last_seen if entry is not None else None
+
+    def online_count(self) -> int:
+        return len(self._online)
+
+    def online_user_ids(self) -> Set[str]:
+        return {user_id for _, user_id in self._online}
+
+    def online_users(self, offset: int = 0, limit: int = 100) -> List[dict]:
+        """A page of online users ordered by username."""
+        page = []
+        for _, user_id in self._online[offset:offset + limit]:
+            entry = self._entries[user_id]
+            page.append({
+                "id": user_id,
+                "username": entry.username,
+                "is_online": True,
+                "last_seen": entry.last_seen.isoformat(),
+            })
+        return page
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        rows = [(is_online, last_seen, user_id) for user_id, (is_online, last_seen) in batch.items()]
+        try:
+            await self.db.executemany('UPDATE users SET is_online = ?, last_seen = ? WHERE id = ?', rows)
+        except Exception as exc:
+            print(f"⚠️ Presence flush failed: {exc}")
+            # Keep the newer in-memory value if one arrived meanwhile
+            for user_id, value in batch.items():
+                self._dirty.setdefault(user_id, value)
+            return
+        self.flushes += 1
+        self.rows_flushed += len(rows)
+        if any(user_id not in self._entries for user_id in batch):
+            # The users list shows the table's last_seen for users tracked nowhere else
+            self.version += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "online": len(self._online),
+            "tracked_users": len(self._entries),
+            "pending_flush": len(self._dirty),
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "flush_interval_seconds": self.flush_interval,
+        }
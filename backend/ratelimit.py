@@ -0,0 +1,201 @@
+"""Token-bucket rate limits checked at the edge.
+
+Every limit is a bucket of ``burst`` tokens refilled at ``rate`` tokens per
+second, one bucket per key (a user, a channel, a client address). A request
+that finds the bucket empty is refused before it costs anything: no model,
+no queued write, no fan-out, just a ``rate_limited`` frame or a 429 telling
+the client how long to wait.
+
+Buckets live in this process by default. With ``CHAT_RATE_LIMIT_BACKEND=redis``
+they live in Redis and are updated by one Lua script per check, so all
+workers share them; if Redis can't be reached the check lets the request
+through rather than failing it.
+
+Limits are configured as ``"rate,burst"`` (e.g. ``CHAT_LIMIT_MESSAGES_USER=5,20``);
+an empty value or a rate of 0 turns that limit off.
+"""
+import os
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from broker import REDIS_URL
+from metrics import REGISTRY
+
+RATE_LIMIT_BACKEND = os.getenv("CHAT_RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_PREFIX = os.getenv("CHAT_RATE_LIMIT_PREFIX", "chat:rl:")
+
+# In-memory buckets are swept of idle (full) entries past this many keys
+MAX_LOCAL_BUCKETS = int(os.getenv("CHAT_RATE_LIMIT_MAX_KEYS", "100000"))
+
+RATE_LIMITED = REGISTRY.counter("chat_rate_limited_total", "Requests refused by a rate limit", ["limit"])
+
+
+class Limit(NamedTuple):
+    rate: float   # tokens per second
+    burst: float  # bucket size
+
+
+def parse_limit(spec: str) -> Optional[Limit]:
+    spec = spec.strip()
+    if not spec:
+        return None
+    rate, _, burst = spec.partition(",")
+    limit = Limit(float(rate), float(burst or rate))
+    return limit if limit.rate > 0 and limit.burst > 0 else None
+
+
+DEFAULT_LIMITS: Dict[str, Optional[Limit]] = {
+    # Chat messages each user may send, and each channel may receive
+    "messages_user": parse_limit(os.getenv("CHAT_LIMIT_MESSAGES_USER", "5,20")),
+    "messages_channel": parse_limit(os.getenv("CHAT_LIMIT_MESSAGES_CHANNEL", "50,200")),
+    # Typing frames per user; clients send roughly one every two seconds
+    "typing_user": parse_limit(os.getenv("CHAT_LIMIT_TYPING_USER", "5,10")),
+    # REST writes (create channel, connect user) per client address
+    "rest_writes": parse_limit(os.getenv("CHAT_LIMIT_REST_WRITES", "1,10")),
+}
+
+# KEYS[1] bucket; ARGV rate, burst, cost. Returns the seconds to wait as a
+# string (0 when the tokens were taken), so fractions survive the reply.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RateLimiter:
+    """In-process token buckets; ``check()`` returns 0 or the seconds until allowed."""
+
+    def __init__(self, limits: Optional[Dict[str, Optional[Limit]]] = None):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.allowed = 0
+        self.limited: Dict[str, int] = {}
+        # (limit name, key) -> (tokens, updated_at)
+        self._buckets: Dict[Tuple[str, str], Tuple[float, float]] = {}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def check(self, name: str, key: str, cost: float = 1) -> float:
+        limit = self.limits.get(name)
+        if limit is None:
+            return 0.0
+        wait = await self._take(name, key, limit, cost)
+        if wait > 0:
+            self.limited[name] = self.limited.get(name, 0) + 1
+            RATE_LIMITED.labels(name).inc()
+        else:
+            self.allowed += 1
+        return wait
+
+    async def check_all(self, *checks: Tuple[str, str]) -> Tuple[Optional[str], float]:
+        """Check ``(limit, key)`` pairs in order; the first refusal and its wait, or ``(None, 0)``."""
+        for name, key in checks:
+            wait = await self.check(name, key)
+            if wait > 0:
+                return name, wait
+        return None, 0.0
+
+    async def _take(self, name: str, key: str, limit: Limit, cost: float) -> float:
+        return self.take_local(name, key, limit, cost)
+
+    def take_local(self, name: str, key: str, limit: Limit, cost: float, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        bucket = (name, key)
+        tokens, updated = self._buckets.get(bucket, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+        if tokens < cost:
+            self._buckets[bucket] = (tokens, now)
+            return (cost - tokens) / limit.rate
+        if len(self._buckets) >= MAX_LOCAL_BUCKETS and bucket not in self._buckets:
+            self._sweep(now)
+        self._buckets[bucket] = (tokens - cost, now)
+        return 0.0
+
+    def _sweep(self, now: float):
+        """Forget buckets that have refilled; they'd start full anyway."""
+        for bucket, (tokens, updated) in list(self._buckets.items()):
+            limit = self.limits.get(bucket[0])
+            if limit is None or tokens + (now - updated) * limit.rate >= limit.burst:
+                del self._buckets[bucket]
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "limits": {name: limit._asdict() if limit else None for name, limit in self.limits.items()},
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+            "local_buckets": len(self._buckets),
+        }
+
+
+class RedisRateLimiter(RateLimiter):
+    """Buckets shared by every worker through Redis.
+
+    ``client`` may be any object with the ``redis.asyncio.Redis``
+    ``register_script`` interface, which lets tests swap in a stand-in.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Optional[Limit]]] = None, url: str = REDIS_URL,
+                 client: Any = None, prefix: str = RATE_LIMIT_PREFIX):
+        super().__init__(limits)
+        self.url = url
+        self.prefix = prefix
+        self.errors = 0
+        self._client = client
+        self._script = None
+
+    async def start(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("CHAT_RATE_LIMIT_BACKEND=redis requires the 'redis' package (pip install redis)")
+            self._client = redis.from_url(self.url)
+        self._script = self._client.register_script(TOKEN_BUCKET_LUA)
+
+    async def stop(self):
+        if self._client is not None:
+            close = getattr(self._client, "aclose", None) or self._client.close
+            await close()
+            self._client = None
+
+    async def _take(self, name: str, key: str, limit: Limit, cost: float) -> float:
+        try:
+            wait = await self._script(keys=[f"{self.prefix}{name}:{key}"], args=[limit.rate, limit.burst, cost])
+        except Exception as exc:
+            # Fail open: an unreachable Redis must not take the chat down with it
+            self.errors += 1
+            if self.errors == 1 or self.errors % 1000 == 0:
+                print(f"⚠️ Rate limit check failed ({self.errors} so far), allowing: {exc}")
+            return 0.0
+        return float(wait)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "backend": "redis", "errors": self.errors}
+
+
+def create_rate_limiter(backend: str = RATE_LIMIT_BACKEND) -> RateLimiter:
+    if backend == "redis":
+        return RedisRateLimiter()
+    if backend == "memory":
+        return RateLimiter()
+    raise ValueError(f"Unknown CHAT_RATE_LIMIT_BACKEND: {backend!r}")
@@ -0,0 +1,131 @@
+"""Per-user read markers and unread counts.
+
+A read marker is the highest seq a user has read in a channel. Seqs are
+gap-free per channel, so a channel's unread count is simply its
+``channel_stats.last_seq`` minus the marker: every badge a user needs comes
+from one join of ``channel_stats`` against that user's markers, a row per
+channel however long the histories are.
+
+Clients report reads over the WebSocket as often as they like. Markers only
+ever move forward; they are kept in memory and upserted in periodic batches
+like presence, and pending values are merged into unread counts so a user
+never sees a badge come back for something they just read.
+"""
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+
+from db import Database
+
+READ_MARKER_FLUSH_INTERVAL = float(os.getenv("CHAT_READ_MARKER_FLUSH_SECONDS", "2"))
+
+UNREAD_SQL = '''
+    SELECT s.channel_id, s.last_seq, COALESCE(r.last_read_seq, 0)
+    FROM channel_stats s
+    LEFT JOIN read_markers r ON r.user_id = ? AND r.channel_id = s.channel_id
+    ORDER BY s.channel_id
+'''
+
+UPSERT_MARKER_SQL = '''
+    INSERT INTO read_markers (user_id, channel_id, last_read_seq, updated_at)
+    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id, channel_id) DO UPDATE SET
+        last_read_seq = MAX(last_read_seq, excluded.last_read_seq),
+        updated_at = excluded.updated_at
+'''
+
+
+def create_read_marker_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS read_markers (
+            user_id TEXT NOT NULL,
+            channel_id TEXT NOT NULL,
+            last_read_seq INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, channel_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+class ReadMarkers:
+    def __init__(self, db: Database, flush_interval: float = READ_MARKER_FLUSH_INTERVAL):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.marks = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        # (user_id, channel_id) -> highest seq read, not yet written to SQLite
+        self._pending: Dict[Tuple[str, str], int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def mark_read(self, user_id: str, channel_id: str, seq: int):
+        """Record that a user has read a channel up to ``seq``; stale marks are ignored."""
+        if seq <= 0:
+            return
+        key = (user_id, channel_id)
+        if seq > self._pending.get(key, 0):
+            self._pending[key] = seq
+        self.marks += 1
+
+    async def start_at_latest(self, user_id: str):
+        """Mark every existing channel read for a new user, so old history isn't unread."""
+        await self.db.execute('''
+            INSERT OR IGNORE INTO read_markers (user_id, channel_id, last_read_seq)
+            SELECT ?, channel_id, last_seq FROM channel_stats
+        ''', (user_id,))
+
+    async def unread(self, user_id: str) -> List[dict]:
+        rows = await self.db.fetchall(UNREAD_SQL, (user_id,))
+        counts = []
+        for channel_id, last_seq, last_read_seq in rows:
+            last_read_seq = max(last_read_seq, self._pending.get((user_id, channel_id), 0))
+            counts.append({
+                "channel_id": channel_id,
+                "last_seq": last_seq,
+                "last_read_seq": last_read_seq,
+                "unread": max(0, last_seq - last_read_seq),
+            })
+        return counts
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        rows = [(user_id, channel_id, seq) for (user_id, channel_id), seq in batch.items()]
+        try:
+            await self.db.executemany(UPSERT_MARKER_SQL, rows)
+        except Exception as exc:
+            print(f"⚠️ Read marker flush failed: {exc}")
+            for key, seq in batch.items():
+                if seq > self._pending.get(key, 0):
+                    self._pending[key] = seq
+            return
+        self.flushes += 1
+        self.rows_flushed += len(rows)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "marks": self.marks,
+            "pending_flush": len(self._pending),
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "flush_interval_seconds": self.flush_interval,
+        }
@@ -0,0 +1,190 @@
+"""In-memory ring buffer of each channel's most recent messages.
+
+Nearly every history request is "the latest page of a channel". This cache
+keeps the newest messages of each channel already encoded as JSON, fed by
+the message write path and warmed from SQLite at startup, so those requests
+are answered without touching the database or building models. Requests
+that reach past the buffered window return None and fall through to SQLite.
+"""
+import os
+import sqlite3
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from serialization import dumps_str, iso_timestamp
+
+# Memory caps (overridable via environment)
+RECENT_MESSAGES_PER_CHANNEL = int(os.getenv("CHAT_RECENT_PER_CHANNEL", "200"))
+RECENT_MAX_CHANNELS = int(os.getenv("CHAT_RECENT_MAX_CHANNELS", "500"))
+
+MessageKey = int  # The message's per-channel seq, the history sort order
+
+
+def encode_message(message: dict) -> str:
+    # Same compact encoding FastAPI's JSONResponse produces
+    return dumps_str(message)
+
+
+class ChannelBuffer:
+    __slots__ = ("keys", "payloads", "complete")
+
+    def __init__(self, complete: bool):
+        self.keys: List[MessageKey] = []
+        self.payloads: List[str] = []
+        # True while the buffer holds the channel's entire history
+        self.complete = complete
+
+
+class RecentMessageCache:
+    def __init__(self, per_channel: int = RECENT_MESSAGES_PER_CHANNEL,
+                 max_channels: int = RECENT_MAX_CHANNELS):
+        self.per_channel = per_channel
+        self.max_channels = max_channels
+        self.hits = 0
+        self.misses = 0
+        self.appends = 0
+        self._channels: "OrderedDict[str, ChannelBuffer]" = OrderedDict()
+        # channel_id -> value of self.appends at its latest write, so a tail
+        # read from SQLite is only cached if no write raced with it
+        self._last_append: Dict[str, int] = {}
+
+    def __contains__(self, channel_id: str) -> bool:
+        return channel_id in self._channels
+
+    def warm(self, channel_id: str, messages: List[dict], complete: bool):
+        """(Re)load a channel from chronologically ordered message dicts."""
+        buffer = ChannelBuffer(complete)
+        for message in messages[-self.per_channel:]:
+            buffer.keys.append(message["seq"])
+            buffer.payloads.append(encode_message(message))
+        if len(messages) > self.per_channel:
+            buffer.complete = False
+        self._channels[channel_id] = buffer
+        self._channels.move_to_end(channel_id)
+        while len(self._channels) > self.max_channels:
+            self._channels.popitem(last=False)
+
+    def warm_if_unchanged(self, channel_id: str, messages: List[dict], complete: bool, since: int):
+        if self._last_append.get(channel_id, 0) <= since:
+            self.warm(channel_id, messages, complete)
+
+    def load_tails(self, conn: sqlite3.Connection) -> List[Tuple[str, List[dict], bool]]:
+        """Read the most active channels' tails for warm(); runs on a DB pool thread."""
+        tails = []
+        channel_ids = [row[0] for row in conn.execute('''
+            SELECT c.id FROM channels c
+            LEFT JOIN channel_stats s ON s.channel_id = c.id
+            ORDER BY s.last_message_at DESC
+            LIMIT ?
+        ''', (self.max_channels,))]
+        # Least active first so the LRU order ends with the busiest channels
+        for channel_id in reversed(channel_ids):
+            rows = conn.execute('''
+                SELECT id, text, sender_id, sender_username, channel_id, timestamp, message_type, seq
+                FROM messages
+                WHERE channel_id = ?
+                ORDER BY seq DESC
+                LIMIT ?
+            ''', (channel_id, self.per_channel + 1)).fetchall()
+            messages = [row_to_message(row) for row in reversed(rows[:self.per_channel])]
+            tails.append((channel_id, messages, len(rows) <= self.per_channel))
+        return tails
+
+    def append(self, channel_id: str, message: dict) -> str:
+        """Add a committed message; returns its encoded payload for reuse."""
+        self.appends += 1
+        self._last_append[channel_id] = self.appends
+        payload = encode_message(message)
+        buffer = self._channels.get(channel_id)
+        if buffer is None:
+            # Not cached: the next tail request warms it from SQLite
+            return payload
+        key = message["seq"]
+        if not buffer.keys or key > buffer.keys[-1]:
+            buffer.keys.append(key)
+            buffer.payloads.append(payload)
+        else:
+            index = bisect_right(buffer.keys, key)
+            buffer.keys.insert(index, key)
+            buffer.payloads.insert(index, payload)
+        overflow = len(buffer.keys) - self.per_channel
+        if overflow > 0:
+            del buffer.keys[:overflow]
+            del buffer.payloads[:overflow]
+            buffer.complete = False
+        return payload
+
+    def last_key(self, channel_id: str) -> Optional[MessageKey]:
+        """The newest seq this cache has seen for a channel, or None if it isn't cached."""
+        buffer = self._channels.get(channel_id)
+        if buffer is None:
+            return None
+        if buffer.keys:
+            return buffer.keys[-1]
+        return 0 if buffer.complete else None
+
+    def invalidate(self, channel_id: str):
+        self._channels.pop(channel_id, None)
+
+    def page(self, channel_id: str, limit: int, before: Optional[MessageKey] = None,
+             after: Optional[MessageKey] = None):
+        """Serve a history page from memory.
+
+        Mirrors get_messages_from_db: returns (payloads, first_key, last_key,
+        has_more) in chronological order, or None if the buffer can't answer.
+        """
+        buffer = self._channels.get(channel_id)
+        if buffer is None:
+            self.misses += 1
+            return None
+        keys = buffer.keys
+        end = bisect_left(keys, before) if before is not None else len(keys)
+
+        if after is not None:
+            # Seqs are gap-free, so the buffer covers everything after the
+            # cursor once it starts at most one past it
+            if not buffer.complete and (not keys or after < keys[0] - 1):
+                self.misses += 1
+                return None
+            start = bisect_right(keys, after)
+            stop = min(end, start + limit)
+            has_more = end - start > limit
+        else:
+            if end < limit and not buffer.complete:
+                self.misses += 1
+                return None
+            start = max(0, end - limit)
+            stop = end
+            has_more = start > 0 or not buffer.complete
+
+        self.hits += 1
+        self._channels.move_to_end(channel_id)
+        if start >= stop:
+            return [], None, None, has_more
+        return buffer.payloads[start:stop], keys[start], keys[stop - 1], has_more
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "channels": len(self._channels),
+            "messages": sum(len(b.keys) for b in self._channels.values()),
+            "per_channel": self.per_channel,
+            "max_channels": self.max_channels,
+        }
+
+
+def row_to_message(row: tuple) -> dict:
+    return {
+        "id": row[0],
+        "text": row[1],
+        "sender_id": row[2],
+        "sender_username": row[3],
+        "channel_id": row[4],
+        "timestamp": iso_timestamp(row[5]),
+        "message_type": row[6],
+        "seq": row[7],
+    }
@@ -0,0 +1,211 @@
+"""Full-text search over chat history.
+
+Messages are indexed in an FTS5 table filled by an insert trigger on
+``messages``, so every row the message writer commits is searchable in the
+same transaction and nothing is ever re-indexed. The index carries the
+columns a result needs (ids, sender, timestamp) so a search never touches
+``messages`` itself, and rows stay searchable after they leave it.
+
+Channel and sender filters are part of the MATCH: each row's ``filters``
+column holds one token per channel and sender id (``c``/``s`` and the hex
+of the id, so any id is exactly one token), and FTS5 intersects their
+posting lists with the query's instead of checking every hit. ``since`` and
+``until`` are still checked per hit.
+
+Relevance pages are keyed on (score, rowid). "Recent" walks the index
+backwards by rowid and stops after one page instead of sorting every match;
+rowids follow indexing order, so imported history counts as newer than
+everything indexed before the import.
+
+User input is never passed to MATCH verbatim: each word becomes a quoted
+FTS5 string (the last one a prefix), ``"quoted phrases"`` stay phrases,
+and all terms must match.
+"""
+import base64
+import math
+import re
+import sqlite3
+from typing import List, Optional, Tuple
+
+from persistence import UNLESS_BULK_LOAD
+from serialization import iso_timestamp
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_TOKENS = 16
+
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r"\w+")
+
+
+# Index columns filled from a ``messages`` row; FILTER_KEYS_SQL is the filters column
+FTS_COLUMNS = "text, filters, message_id, channel_id, sender_id, sender_username, timestamp"
+FILTER_KEYS_SQL = "'c' || hex({0}channel_id) || ' s' || hex({0}sender_id)"
+MESSAGE_COLUMNS_SQL = ("{0}text, " + FILTER_KEYS_SQL + ", {0}id, {0}channel_id, {0}sender_id, "
+                       "{0}sender_username, {0}timestamp")
+
+
+def create_search_index(cursor: sqlite3.Cursor):
+    """Create the FTS5 index and its trigger; backfills once on first creation.
+
+    An index from before the ``filters`` column is rebuilt from its own rows,
+    which keeps archived messages (no longer in ``messages``) and rowids.
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+    row = cursor.fetchone()
+    index_exists = row is not None
+    if index_exists and "filters" not in row[0]:
+        cursor.execute("DROP TRIGGER IF EXISTS trg_messages_fts_insert")
+        cursor.execute("ALTER TABLE messages_fts RENAME TO messages_fts_old")
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            text,
+            filters,
+            message_id UNINDEXED,
+            channel_id UNINDEXED,
+            sender_id UNINDEXED,
+            sender_username UNINDEXED,
+            timestamp UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    ''')
+    if index_exists and "filters" not in row[0]:
+        cursor.execute(f'''
+            INSERT INTO messages_fts (rowid, {FTS_COLUMNS})
+            SELECT rowid, text, {FILTER_KEYS_SQL.format("")}, message_id, channel_id, sender_id,
+                   sender_username, timestamp
+            FROM messages_fts_old
+            ORDER BY rowid
+        ''')
+        cursor.execute("DROP TABLE messages_fts_old")
+    elif not index_exists:
+        cursor.execute(f'''
+            INSERT INTO messages_fts ({FTS_COLUMNS})
+            SELECT {MESSAGE_COLUMNS_SQL.format("")} FROM messages
+            ORDER BY timestamp, id
+        ''')
+    # Filter tokens match every row of a channel or sender; they must not score
+    cursor.execute("INSERT INTO messages_fts (messages_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')")
+    # Recreated on every start so older databases pick up the bulk-load guard
+    cursor.execute("DROP TRIGGER IF EXISTS trg_messages_fts_insert")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_messages_fts_insert
+        AFTER INSERT ON messages {UNLESS_BULK_LOAD}
+        BEGIN
+            INSERT INTO messages_fts ({FTS_COLUMNS})
+            VALUES ({MESSAGE_COLUMNS_SQL.format("NEW.")});
+        END
+    ''')
+
+
+def index_messages_after(cursor: sqlite3.Cursor, rowid: int):
+    """Index every message with a rowid above ``rowid``, for bulk loads that suspend the trigger."""
+    cursor.execute(f'''
+        INSERT INTO messages_fts ({FTS_COLUMNS})
+        SELECT {MESSAGE_COLUMNS_SQL.format("")} FROM messages
+        WHERE rowid > ?
+        ORDER BY rowid
+    ''', (rowid,))
+
+
+def filter_key(kind: str, value: str) -> str:
+    """The ``filters`` token for a channel (``"c"``) or sender (``"s"``) id."""
+    return kind + value.encode("utf-8").hex()
+
+
+def build_match_query(q: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 query, or None if it has no words."""
+    terms = []
+    for phrase, word in _TERM.findall(q):
+        tokens = _WORD.findall(phrase if phrase else word)
+        if tokens:
+            terms.append((" ".join(tokens), bool(phrase)))
+    if not terms:
+        return None
+    parts = ['"%s"' % text for text, _ in terms]
+    if not terms[-1][1]:
+        # Search-as-you-type: the last bare word matches as a prefix
+        parts[-1] += "*"
+    return " ".join(parts)
+
+
+def encode_search_cursor(position: Tuple) -> str:
+    # repr() round-trips a float score exactly
+    raw = "|".join(repr(value) for value in position).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str, sort: str) -> Tuple:
+    """Raises ValueError for cursors that don't belong to this sort order."""
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    if sort == "relevance":
+        score, rowid = raw.split("|")
+        if not math.isfinite(float(score)):
+            raise ValueError("score is not finite")
+        return float(score), int(rowid)
+    return (int(raw),)
+
+
+def search_messages(conn: sqlite3.Connection, match: str, limit: int, sort: str = "relevance",
+                    channel_id: Optional[str] = None, sender_id: Optional[str] = None,
+                    since: Optional[str] = None, until: Optional[str] = None,
+                    cursor: Optional[Tuple] = None) -> Tuple[List[dict], Optional[Tuple]]:
+    """Run a search on a DB pool thread; returns (results, next cursor position).
+
+    Relevance pages resume after the last row's (bm25, rowid), so a deep page
+    costs no more than the first; scores shift a little as the index grows,
+    which can only move rows across a page boundary the reader already
+    passed. Recency pages use the index rowid as a keyset. Both orders are
+    ones FTS5 produces itself, so snippets are only built for returned rows.
+    """
+    match = f"text : ({match})"
+    if channel_id is not None:
+        match += f' AND filters : "{filter_key("c", channel_id)}"'
+    if sender_id is not None:
+        match += f' AND filters : "{filter_key("s", sender_id)}"'
+    where = ["messages_fts MATCH ?"]
+    params: list = [match]
+    if since is not None:
+        where.append("timestamp >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("timestamp < ?")
+        params.append(until)
+
+    if sort == "relevance":
+        order = "rank, rowid"
+        if cursor is not None:
+            where.append("(rank > ? OR (rank = ? AND rowid > ?))")
+            params.extend((cursor[0], cursor[0], cursor[1]))
+    else:
+        order = "rowid DESC"
+        if cursor is not None:
+            where.append("rowid < ?")
+            params.append(cursor[0])
+
+    rows = conn.execute(f'''
+        SELECT rowid, message_id, channel_id, sender_id, sender_username, timestamp,
+               snippet(messages_fts, 0, ?, ?, '…', ?), rank
+        FROM messages_fts
+        WHERE {" AND ".join(where)}
+        ORDER BY {order}
+        LIMIT ?
+    ''', [SNIPPET_START, SNIPPET_END, SNIPPET_TOKENS, *params, limit + 1]).fetchall()
+
+    results = [{
+        "id": row[1],
+        "channel_id": row[2],
+        "sender_id": row[3],
+        "sender_username": row[4],
+        "timestamp": iso_timestamp(row[5]),
+        "snippet": row[6],
+        # bm25 is lower-is-better; flip it so higher scores rank first
+        "score": -row[7],
+    } for row in rows[:limit]]
+
+    next_position = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_position = (last[7], last[0]) if sort == "relevance" else (last[0],)
+    return results, next_position
@@ -0,0 +1,226 @@
+"""Bulk export and import of channel history as NDJSON.
+
+Export streams one JSON message per line, channel by channel in seq order:
+archived segments first, then the hot table in keyset pages on
+idx_messages_channel_seq, so memory stays flat however long the history is.
+
+Import is the reverse for backups, migrations and seeding. Lines are parsed
+in batches and each batch is written in one transaction. Inside it the
+per-row ``messages`` triggers are switched off by a row in
+``messages_bulk_load`` (plain DML, so no schema change that would make other
+connections re-prepare their statements), the rows go in with a single
+``executemany``, the search index and ``channel_stats`` are brought up to
+date with one set-based statement each, and the flag row is deleted before
+the commit, so other connections never see the triggers off. Imported
+messages are appended to their channel after its last seq in file order,
+and ids already present are skipped, hot or archived, so re-running an
+import is harmless and restoring an export into an empty database
+reproduces its seqs.
+
+Importing into another channel (``channel_id``) copies messages rather than
+moving them, so a line from a different channel gets a new id derived from
+the target channel and its own id: the copy never collides with the
+original, and importing the same file into the same channel twice still
+skips the second time.
+"""
+import asyncio
+import os
+import sqlite3
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from archive import MESSAGE_FIELDS, MessageArchive
+from db import Database
+from persistence import INSERT_MESSAGE_SQL, LAST_SEQ_SQL
+from recent import encode_message, row_to_message
+from search import index_messages_after
+from serialization import loads
+
+# Transfer tuning (overridable via environment)
+EXPORT_PAGE_SIZE = int(os.getenv("CHAT_EXPORT_PAGE_SIZE", "2000"))
+IMPORT_BATCH_SIZE = int(os.getenv("CHAT_IMPORT_BATCH_SIZE", "50000"))
+
+EXPORT_PAGE_SQL = f'''
+    SELECT {", ".join(MESSAGE_FIELDS)} FROM messages
+    WHERE channel_id = ? AND seq > ?
+    ORDER BY seq
+    LIMIT ?
+'''
+
+# Namespace of the ids minted for messages copied into another channel
+COPY_ID_NAMESPACE = uuid.UUID("6f1d2a0e-4c3b-5e8a-9b7d-2f0c1e3a5d47")
+
+
+async def export_messages(db: Database, archive: MessageArchive, channel_ids: Iterable[str],
+                          page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[bytes]:
+    """Yield NDJSON chunks of every message of the given channels."""
+    for channel_id in channel_ids:
+        last_seq = 0
+        for segment in archive.segments(channel_id):
+            messages = await asyncio.to_thread(archive.read_segment, segment)
+            lines = [encode_message(m) for m in messages if m["seq"] > last_seq]
+            if lines:
+                yield ("\n".join(lines) + "\n").encode("utf-8")
+                last_seq = messages[-1]["seq"]
+        # Rows archived while this runs are skipped by seq, never repeated
+        while True:
+            rows = await db.fetchall(EXPORT_PAGE_SQL, (channel_id, last_seq, page_size))
+            if not rows:
+                break
+            yield ("\n".join(encode_message(row_to_message(row)) for row in rows) + "\n").encode("utf-8")
+            last_seq = rows[-1][7]
+            if len(rows) < page_size:
+                break
+
+
+class ImportLineError(ValueError):
+    """A line that can't be imported; nothing from its batch was written."""
+
+
+class MessageImporter:
+    """Writes NDJSON message lines in large transactions on its own connection.
+
+    Not thread-safe; feed it batches one at a time (any thread will do).
+    """
+
+    def __init__(self, db_path: str, channel_id: Optional[str] = None):
+        self.db_path = db_path
+        # Import everything into this channel instead of each line's own
+        self.channel_id = channel_id
+        self.lines = 0
+        self.imported = 0
+        self.skipped = 0
+        self.channels: Dict[str, int] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _parse(self, lines: List[bytes]) -> Dict[str, tuple]:
+        """Rows keyed by id, in file order; later duplicates of an id are dropped."""
+        rows: Dict[str, tuple] = {}
+        for line in lines:
+            self.lines += 1
+            if not line.strip():
+                continue
+            try:
+                data = loads(line)
+                timestamp = data.get("timestamp")
+                message_id = str(data.get("id") or uuid.uuid4())
+                channel_id = self.channel_id or str(data["channel_id"])
+                if channel_id != data.get("channel_id"):
+                    message_id = str(uuid.uuid5(COPY_ID_NAMESPACE, f"{channel_id}\n{message_id}"))
+                row = (
+                    message_id,
+                    str(data["text"]),
+                    str(data["sender_id"]),
+                    str(data.get("sender_username") or "Unknown"),
+                    channel_id,
+                    datetime.fromisoformat(timestamp).isoformat() if timestamp else datetime.now().isoformat(),
+                    str(data.get("message_type") or "text"),
+                )
+            except (ValueError, KeyError, TypeError, AttributeError) as exc:  # orjson errors are ValueErrors
+                raise ImportLineError(f"line {self.lines}: {exc!r}") from None
+            rows.setdefault(row[0], row)
+        return rows
+
+    def import_batch(self, lines: List[bytes]) -> Tuple[int, int]:
+        """Import one batch of NDJSON lines in a single transaction; returns (imported, skipped)."""
+        parsed = self._parse(lines)
+        if not parsed:
+            return 0, 0
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS import_ids (id TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM import_ids")
+            conn.executemany("INSERT INTO import_ids (id) VALUES (?)", [(message_id,) for message_id in parsed])
+            existing = {row[0] for row in conn.execute('''
+                SELECT i.id FROM import_ids i JOIN messages m ON m.id = i.id
+                UNION ALL
+                SELECT i.id FROM import_ids i JOIN archived_message_ids a ON a.id = i.id
+            ''')}
+            rows = [row for message_id, row in parsed.items() if message_id not in existing]
+
+            next_seq: Dict[str, int] = {}
+            numbered = []
+            for row in rows:
+                channel_id = row[4]
+                if channel_id not in next_seq:
+                    next_seq[channel_id] = conn.execute(LAST_SEQ_SQL, (channel_id,)).fetchone()[0]
+                next_seq[channel_id] += 1
+                numbered.append(row + (next_seq[channel_id],))
+
+            if numbered:
+                self._insert(conn, numbered, list(next_seq))
+            conn.execute("COMMIT")
+        except Exception:
+            # Rolls the bulk-load flag back too
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        for row in numbered:
+            self.channels[row[4]] = self.channels.get(row[4], 0) + 1
+        self.imported += len(numbered)
+        self.skipped += len(parsed) - len(numbered)
+        return len(numbered), len(parsed) - len(numbered)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, rows: List[tuple], channel_ids: List[str]):
+        conn.execute("INSERT INTO messages_bulk_load (id) VALUES (1)")
+        after_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM messages").fetchone()[0]
+
+        conn.executemany(INSERT_MESSAGE_SQL, rows)
+        index_messages_after(conn.cursor(), after_rowid)
+        conn.executemany('''
+            INSERT OR IGNORE INTO channels (id, name, description, created_by) VALUES (?, ?, '', 'import')
+        ''', [(channel_id, channel_id.title()) for channel_id in channel_ids])
+        # What trg_messages_stats_insert would have done, one row per channel
+        conn.execute('''
+            INSERT INTO channel_stats (channel_id, message_count, last_message_at, last_seq)
+            SELECT channel_id, COUNT(*), MAX(timestamp), MAX(seq) FROM messages
+            WHERE rowid > ?
+            GROUP BY channel_id
+            ON CONFLICT (channel_id) DO UPDATE SET
+                message_count = message_count + excluded.message_count,
+                last_message_at = MAX(COALESCE(last_message_at, ''), excluded.last_message_at),
+                last_seq = MAX(last_seq, excluded.last_seq)
+        ''', (after_rowid,))
+        conn.execute("DELETE FROM messages_bulk_load")
+
+    async def import_stream(self, chunks: AsyncIterator[bytes], batch_size: int = IMPORT_BATCH_SIZE):
+        """Split a byte stream into lines and import it batch by batch off the event loop."""
+        batch: List[bytes] = []
+        # The unfinished last line; only split once a newline arrives, so a
+        # long line in many small chunks is copied once, not once per chunk
+        pending = bytearray()
+        async for chunk in chunks:
+            end = chunk.rfind(b"\n")
+            if end < 0:
+                pending += chunk
+                continue
+            pending += chunk[:end]
+            batch.extend(bytes(pending).split(b"\n"))
+            pending = bytearray(chunk[end + 1:])
+            if len(batch) >= batch_size:
+                await asyncio.to_thread(self.import_batch, batch)
+                batch = []
+        batch.append(bytes(pending))
+        await asyncio.to_thread(self.import_batch, batch)
+
+    def stats(self) -> dict:
+        return {
+            "lines": self.lines,
+            "imported": self.imported,
+            "skipped_existing": self.skipped,
+            "channels": self.channels,
+        }
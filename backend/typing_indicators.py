@@ -0,0 +1,152 @@
+"""Server-side typing indicator state.
+
+Clients send a ``typing`` frame on (nearly) every keystroke burst. Instead of
+re-broadcasting each one, the tracker keeps who is typing in which channel
+with an expiry and only tells the channel about state changes, at most once
+per channel per interval. In aggregate mode each flush is a single
+``typing_state`` frame listing everyone typing; otherwise it is one
+``user_typing`` / ``user_stopped_typing`` frame per changed user.
+
+Aggregate mode describes only this process's typists, so it is meant for
+single-worker deployments; the per-user transitions work across workers.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+TYPING_TTL = float(os.getenv("CHAT_TYPING_TTL", "3"))
+TYPING_INTERVAL = float(os.getenv("CHAT_TYPING_INTERVAL_MS", "500")) / 1000
+TYPING_AGGREGATE = os.getenv("CHAT_TYPING_AGGREGATE", "false").lower() in ("1", "true", "yes")
+
+# emit(channel_id, frame, exclude_user)
+Emitter = Callable[[str, str, Optional[str]], Awaitable[None]]
+
+
+class TypingTracker:
+    def __init__(self, emit: Emitter, ttl: float = TYPING_TTL, interval: float = TYPING_INTERVAL,
+                 aggregate: bool = TYPING_AGGREGATE):
+        self.emit = emit
+        self.ttl = ttl
+        self.interval = interval
+        self.aggregate = aggregate
+        self.frames_in = 0
+        self.frames_out = 0
+
+        # channel_id -> user_id -> (username, expires_at)
+        self._typing: Dict[str, Dict[str, Tuple[str, float]]] = {}
+        # channel_id -> user_id -> username, as last told to the channel
+        self._announced: Dict[str, Dict[str, str]] = {}
+        self._last_flush: Dict[str, float] = {}
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def typing(self, channel_id: str, user_id: str, username: str):
+        self.frames_in += 1
+        users = self._typing.setdefault(channel_id, {})
+        started = user_id not in users
+        users[user_id] = (username, time.monotonic() + self.ttl)
+        if started:
+            await self._changed(channel_id)
+
+    async def stopped(self, channel_id: str, user_id: str):
+        users = self._typing.get(channel_id)
+        if users and users.pop(user_id, None) is not None:
+            await self._changed(channel_id)
+
+    async def user_gone(self, user_id: str):
+        for channel_id in [c for c, users in self._typing.items() if user_id in users]:
+            await self.stopped(channel_id, user_id)
+
+    async def _changed(self, channel_id: str):
+        # Leading edge: flush right away unless the channel flushed recently
+        if time.monotonic() - self._last_flush.get(channel_id, 0.0) >= self.interval:
+            await self._flush(channel_id)
+        else:
+            self._dirty.add(channel_id)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            # One bad send or callback must not end the loop for every channel
+            try:
+                now = time.monotonic()
+                for channel_id, users in list(self._typing.items()):
+                    expired = [user_id for user_id, (_, expires_at) in users.items() if expires_at <= now]
+                    for user_id in expired:
+                        del users[user_id]
+                    if expired:
+                        self._dirty.add(channel_id)
+                for channel_id in list(self._dirty):
+                    if now - self._last_flush.get(channel_id, 0.0) >= self.interval:
+                        await self._flush(channel_id)
+                for channel_id, flushed_at in list(self._last_flush.items()):
+                    if now - flushed_at > self.interval and channel_id not in self._typing:
+                        del self._last_flush[channel_id]
+            except Exception as exc:
+                print(f"⚠️ Typing indicator flush failed: {exc}")
+
+    async def _flush(self, channel_id: str):
+        self._dirty.discard(channel_id)
+        self._last_flush[channel_id] = time.monotonic()
+        current = {user_id: username for user_id, (username, _) in self._typing.get(channel_id, {}).items()}
+        announced = self._announced.get(channel_id, {})
+        if current:
+            self._announced[channel_id] = current
+        else:
+            self._announced.pop(channel_id, None)
+            self._typing.pop(channel_id, None)
+        if current.keys() == announced.keys():
+            return  # e.g. started and stopped within one interval
+
+        if self.aggregate:
+            await self._send(channel_id, {
+                "type": "typing_state",
+                "channel_id": channel_id,
+                "count": len(current),
+                "users": [{"user_id": u, "username": name} for u, name in current.items()],
+            }, None)
+            return
+        for user_id, username in current.items():
+            if user_id not in announced:
+                await self._send(channel_id, {
+                    "type": "user_typing",
+                    "user_id": user_id,
+                    "username": username,
+                    "channel_id": channel_id,
+                }, user_id)
+        for user_id, username in announced.items():
+            if user_id not in current:
+                await self._send(channel_id, {
+                    "type": "user_stopped_typing",
+                    "user_id": user_id,
+                    "username": username,
+                    "channel_id": channel_id,
+                }, user_id)
+
+    async def _send(self, channel_id: str, frame: dict, exclude_user: Optional[str]):
+        self.frames_out += 1
+        await self.emit(channel_id, json.dumps(frame), exclude_user)
+
+    def stats(self) -> dict:
+        return {
+            "frames_in": self.frames_in,
+            "frames_out": self.frames_out,
+            "channels_typing": len(self._typing),
+            "aggregate": self.aggregate,
+            "ttl": self.ttl,
+            "interval_ms": self.interval * 1000,
+        }
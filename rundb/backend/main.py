@@ -1,17 +1,350 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List
-import math
+import asyncio
+import base64
+import json
 import sqlite3
 import os
+import statistics
+import sys
+import unicodedata
 from datetime import datetime
 
 BASE_DIR = os.path.dirname(__file__)
 DB_PATH = os.path.join(BASE_DIR, 'rundb.db')
 
+# Metrics and the fast JSON response are shared with the chat backend
+sys.path.insert(0, os.path.join(BASE_DIR, '..', '..', 'backend'))
+from metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware, timed_connection  # noqa: E402
+from serialization import FastJSONResponse  # noqa: E402
+
+# Every statement is timed per query name, fetching included
+TimedConnection = timed_connection(REGISTRY.histogram(
+    'rundb_db_query_duration_seconds', 'SQLite statement time, rows included', ['query']
+))
+
+# Letters NFKD leaves alone, folded the way they are typed without them
+FOLD_LETTERS = str.maketrans({'ø': 'o', 'æ': 'ae', 'œ': 'oe', 'ð': 'd', 'þ': 'th', 'ß': 'ss', 'ł': 'l', 'đ': 'd'})
+
+def fold(text: Optional[str]) -> Optional[str]:
+    """Lowercase, strip diacritics and collapse whitespace: 'Østensjø' -> 'ostensjo', 'Bærum' -> 'baerum'."""
+    if text is None:
+        return None
+    decomposed = unicodedata.normalize('NFKD', text.lower().translate(FOLD_LETTERS))
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+# How often the background task brings the trigger-marked tables up to date
+REFRESH_INTERVAL = float(os.getenv('RUNDB_REFRESH_INTERVAL_SECONDS', '2'))
+
 def get_conn():
-    return sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, factory=TimedConnection)
+    # Readers never wait on the refresher's writes; writers queue instead of failing
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA busy_timeout=5000')
+    # SQLite's lower() only folds ASCII; athlete search text needs ø, å, æ too
+    conn.create_function('py_lower', 1, lambda s: s.lower() if s is not None else None, deterministic=True)
+    conn.create_function('py_fold', 1, fold, deterministic=True)
+    return conn
+
+# Result lists are ordered by this expression; indexes repeat it verbatim
+FINISH_ORDER = 'CASE WHEN finish IS NULL THEN 99999 ELSE finish END'
+
+# Versioned schema changes on top of the CREATE TABLE IF NOT EXISTS baseline.
+# PRAGMA user_version holds the number of the last one applied; each runs
+# once, in order, in its own transaction. Append new ones, never edit old ones.
+MIGRATIONS = [
+    (1, 'indexes for event, race, runner and date lookups', [
+        # Event pages and per-race stats, covering the columns the stats read
+        'CREATE INDEX IF NOT EXISTS idx_rundb_results_race ON rundb_results (event_id, race_id, finish, time_sec)',
+        # A runner's results, newest first; also the athletes join
+        f'CREATE INDEX IF NOT EXISTS idx_rundb_results_runner ON rundb_results (runner_id, date DESC, ({FINISH_ORDER}))',
+        # Latest results across all events, read in order and cut at LIMIT
+        f'CREATE INDEX IF NOT EXISTS idx_rundb_results_latest ON rundb_results (date DESC, ({FINISH_ORDER}))',
+        'CREATE INDEX IF NOT EXISTS idx_rundb_event_races_event ON rundb_event_races (event_id)',
+    ]),
+    (2, 'rundb_athlete_stats summary table', [
+        '''
+        CREATE TABLE IF NOT EXISTS rundb_athlete_stats (
+            runner_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            sex TEXT,
+            date TEXT,
+            club TEXT,
+            country TEXT,
+            avatar_url TEXT,
+            search_text TEXT NOT NULL,
+            run_count INTEGER NOT NULL,
+            last_race_date TEXT,
+            podium_1 INTEGER NOT NULL,
+            podium_2 INTEGER NOT NULL,
+            podium_3 INTEGER NOT NULL,
+            podium_top3 INTEGER NOT NULL,
+            popularity INTEGER NOT NULL
+        )
+        ''',
+        # One index per sort order, ties broken by name then id
+        'CREATE INDEX IF NOT EXISTS idx_rundb_athlete_stats_name ON rundb_athlete_stats (name, runner_id)',
+        'CREATE INDEX IF NOT EXISTS idx_rundb_athlete_stats_popularity ON rundb_athlete_stats (popularity DESC, name, runner_id)',
+        'CREATE INDEX IF NOT EXISTS idx_rundb_athlete_stats_runs ON rundb_athlete_stats (run_count DESC, name, runner_id)',
+        # Range filters, read directly when they match few athletes
+        'CREATE INDEX IF NOT EXISTS idx_rundb_athlete_stats_podiums ON rundb_athlete_stats (podium_top3)',
+        'CREATE INDEX IF NOT EXISTS idx_rundb_athlete_stats_last_race ON rundb_athlete_stats (last_race_date)',
+        # Runners whose row is stale; triggers mark them, readers refresh
+        '''
+        CREATE TABLE IF NOT EXISTS rundb_athlete_stats_dirty (
+            runner_id TEXT PRIMARY KEY
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_results_athlete_insert
+        AFTER INSERT ON rundb_results WHEN NEW.runner_id IS NOT NULL
+        BEGIN
+            INSERT OR IGNORE INTO rundb_athlete_stats_dirty VALUES (NEW.runner_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_results_athlete_delete
+        AFTER DELETE ON rundb_results WHEN OLD.runner_id IS NOT NULL
+        BEGIN
+            INSERT OR IGNORE INTO rundb_athlete_stats_dirty VALUES (OLD.runner_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_results_athlete_update
+        AFTER UPDATE OF runner_id, finish, date ON rundb_results
+        BEGIN
+            INSERT OR IGNORE INTO rundb_athlete_stats_dirty SELECT OLD.runner_id WHERE OLD.runner_id IS NOT NULL;
+            INSERT OR IGNORE INTO rundb_athlete_stats_dirty SELECT NEW.runner_id WHERE NEW.runner_id IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_runners_athlete_insert
+        AFTER INSERT ON rundb_runners
+        BEGIN
+            INSERT OR IGNORE INTO rundb_athlete_stats_dirty VALUES (NEW.id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_runners_athlete_update
+        AFTER UPDATE ON rundb_runners
+        BEGIN
+            INSERT OR IGNORE INTO rundb_athlete_stats_dirty VALUES (OLD.id);
+            INSERT OR IGNORE INTO rundb_athlete_stats_dirty VALUES (NEW.id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_runners_athlete_delete
+        AFTER DELETE ON rundb_runners
+        BEGIN
+            INSERT OR IGNORE INTO rundb_athlete_stats_dirty VALUES (OLD.id);
+        END
+        ''',
+        # Backfill: the next refresh builds every row in one set-based pass
+        'INSERT OR IGNORE INTO rundb_athlete_stats_dirty SELECT id FROM rundb_runners',
+    ]),
+    (3, 'rundb_search_items and its trigram index', [
+        # Everything /rundb/search can return, with its name folded by py_fold.
+        # rank_key (popularity, then id) is the item's rowid in the index.
+        '''
+        CREATE TABLE IF NOT EXISTS rundb_search_items (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            ref_id TEXT NOT NULL,
+            label TEXT NOT NULL,
+            folded TEXT NOT NULL,
+            popularity INTEGER NOT NULL,
+            rank_key INTEGER NOT NULL UNIQUE,
+            UNIQUE (kind, ref_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_rundb_search_items_folded ON rundb_search_items (folded, rank_key)',
+        # Indexes char(2), a space and the folded name, so a phrase can be
+        # anchored at the start of the name (the marker) or of a word (a space)
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS rundb_search_fts USING fts5(
+            text,
+            content = '',
+            tokenize = 'trigram'
+        )
+        ''',
+        # Items are only ever deleted and reinserted, never updated
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_search_items_insert
+        AFTER INSERT ON rundb_search_items
+        BEGIN
+            INSERT INTO rundb_search_fts (rowid, text) VALUES (NEW.rank_key, char(2) || ' ' || NEW.folded);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_search_items_delete
+        AFTER DELETE ON rundb_search_items
+        BEGIN
+            INSERT INTO rundb_search_fts (rundb_search_fts, rowid, text)
+            VALUES ('delete', OLD.rank_key, char(2) || ' ' || OLD.folded);
+        END
+        ''',
+        # Clubs and organizers are counted from these
+        'CREATE INDEX IF NOT EXISTS idx_rundb_runners_club ON rundb_runners (club)',
+        'CREATE INDEX IF NOT EXISTS idx_rundb_results_club ON rundb_results (club)',
+        'CREATE INDEX IF NOT EXISTS idx_rundb_events_organizer ON rundb_events (organizer)',
+        # Items whose name or popularity changed; triggers mark them, readers refresh
+        '''
+        CREATE TABLE IF NOT EXISTS rundb_search_dirty (
+            kind TEXT NOT NULL,
+            ref_id TEXT NOT NULL,
+            PRIMARY KEY (kind, ref_id)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_runners_search_insert
+        AFTER INSERT ON rundb_runners
+        BEGIN
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('runner', NEW.id);
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'club', NEW.club WHERE NEW.club IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_runners_search_update
+        AFTER UPDATE OF id, name, club ON rundb_runners
+        BEGIN
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('runner', OLD.id);
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('runner', NEW.id);
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'club', OLD.club WHERE OLD.club IS NOT NULL;
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'club', NEW.club WHERE NEW.club IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_runners_search_delete
+        AFTER DELETE ON rundb_runners
+        BEGIN
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('runner', OLD.id);
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'club', OLD.club WHERE OLD.club IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_events_search_insert
+        AFTER INSERT ON rundb_events
+        BEGIN
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('event', NEW.id);
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'organizer', NEW.organizer WHERE NEW.organizer IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_events_search_update
+        AFTER UPDATE OF id, name, organizer, enrolled_count ON rundb_events
+        BEGIN
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('event', OLD.id);
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('event', NEW.id);
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'organizer', OLD.organizer WHERE OLD.organizer IS NOT NULL;
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'organizer', NEW.organizer WHERE NEW.organizer IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_events_search_delete
+        AFTER DELETE ON rundb_events
+        BEGIN
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('event', OLD.id);
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'organizer', OLD.organizer WHERE OLD.organizer IS NOT NULL;
+        END
+        ''',
+        # Results move runner, event and club popularity
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_results_search_insert
+        AFTER INSERT ON rundb_results
+        BEGIN
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('event', NEW.event_id);
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'runner', NEW.runner_id WHERE NEW.runner_id IS NOT NULL;
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'club', NEW.club WHERE NEW.club IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_results_search_update
+        AFTER UPDATE OF event_id, runner_id, club, finish ON rundb_results
+        BEGIN
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('event', OLD.event_id);
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('event', NEW.event_id);
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'runner', OLD.runner_id WHERE OLD.runner_id IS NOT NULL;
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'runner', NEW.runner_id WHERE NEW.runner_id IS NOT NULL;
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'club', OLD.club WHERE OLD.club IS NOT NULL;
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'club', NEW.club WHERE NEW.club IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_results_search_delete
+        AFTER DELETE ON rundb_results
+        BEGIN
+            INSERT OR IGNORE INTO rundb_search_dirty VALUES ('event', OLD.event_id);
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'runner', OLD.runner_id WHERE OLD.runner_id IS NOT NULL;
+            INSERT OR IGNORE INTO rundb_search_dirty SELECT 'club', OLD.club WHERE OLD.club IS NOT NULL;
+        END
+        ''',
+        # Backfill: the next refresh indexes everything
+        "INSERT OR IGNORE INTO rundb_search_dirty SELECT 'runner', id FROM rundb_runners",
+        "INSERT OR IGNORE INTO rundb_search_dirty SELECT 'event', id FROM rundb_events",
+        "INSERT OR IGNORE INTO rundb_search_dirty SELECT 'club', club FROM rundb_runners WHERE club IS NOT NULL",
+        "INSERT OR IGNORE INTO rundb_search_dirty SELECT 'club', club FROM rundb_results WHERE club IS NOT NULL",
+        "INSERT OR IGNORE INTO rundb_search_dirty SELECT 'organizer', organizer FROM rundb_events WHERE organizer IS NOT NULL",
+    ]),
+    (4, 'normalized, indexed event dates', [
+        # Calendar days of date and signup_end as written (any time or zone
+        # suffix dropped), NULL when not a valid date. Virtual columns: SQLite
+        # computes them, whoever writes the row, and only the indexes store them.
+        "ALTER TABLE rundb_events ADD COLUMN start_day TEXT GENERATED ALWAYS AS (date(substr(date, 1, 10))) VIRTUAL",
+        "ALTER TABLE rundb_events ADD COLUMN signup_end_day TEXT GENERATED ALWAYS AS (date(substr(signup_end, 1, 10))) VIRTUAL",
+        # The calendar's order, alone and behind its equality filters
+        'CREATE INDEX IF NOT EXISTS idx_rundb_events_start_day ON rundb_events (start_day, id)',
+        'CREATE INDEX IF NOT EXISTS idx_rundb_events_country_start_day ON rundb_events (location_country, start_day, id)',
+        'CREATE INDEX IF NOT EXISTS idx_rundb_events_sport_start_day ON rundb_events (sport, start_day, id)',
+        # Also counts an organizer's events for search, as the index it replaces did
+        'CREATE INDEX IF NOT EXISTS idx_rundb_events_organizer_start_day ON rundb_events (organizer, start_day, id)',
+        'DROP INDEX IF EXISTS idx_rundb_events_organizer',
+        'CREATE INDEX IF NOT EXISTS idx_rundb_events_signup_end_day ON rundb_events (signup_end_day)',
+    ]),
+]
+
+# One row per runner: their profile plus aggregates over their results.
+# Popularity is activity plus weighted podiums.
+ATHLETE_STATS_SELECT = '''
+    SELECT id, name, sex, date, club, country, avatar_url,
+           py_lower(name || ' ' || COALESCE(club, '') || ' ' || COALESCE(country, '')),
+           run_count, last_race_date, p1, p2, p3, p1 + p2 + p3,
+           run_count + p1 * 5 + p2 * 3 + p3 * 2
+    FROM (
+        SELECT r.id, r.name, r.sex, r.date, r.club, r.country, r.avatar_url,
+               COUNT(res.id) as run_count,
+               MAX(res.date) as last_race_date,
+               COALESCE(SUM(res.finish = 1), 0) as p1,
+               COALESCE(SUM(res.finish = 2), 0) as p2,
+               COALESCE(SUM(res.finish = 3), 0) as p3
+        FROM rundb_runners r
+        LEFT JOIN rundb_results res ON res.runner_id = r.id
+        WHERE r.id IN (SELECT runner_id FROM rundb_athlete_stats_dirty)
+        GROUP BY r.id
+    )
+'''
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending MIGRATIONS; returns the schema version afterwards."""
+    if conn.in_transaction:
+        conn.commit()
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number, description, statements in MIGRATIONS:
+        if number <= version:
+            continue
+        conn.execute('BEGIN')
+        try:
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = number
+        print(f'🗄️ RunDB schema migrated to v{number}: {description}')
+    return version
 
 def init_db():
     conn = get_conn()
@@ -100,6 +433,60 @@ def init_db():
         )
     ''')
 
+    # Per-race aggregates, so result lists don't aggregate the race per row.
+    # race_key is race_id, or '' for results without a race.
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rundb_race_stats'")
+    race_stats_exists = cur.fetchone() is not None
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS rundb_race_stats (
+            event_id TEXT NOT NULL,
+            race_key TEXT NOT NULL,
+            participants INTEGER NOT NULL,
+            max_finish INTEGER,
+            winner_time_sec INTEGER,
+            median_time_sec INTEGER,
+            dnf_count INTEGER NOT NULL,
+            PRIMARY KEY (event_id, race_key)
+        ) WITHOUT ROWID
+    ''')
+    # Races whose results changed since their stats were computed. The
+    # triggers only mark them, so bulk loads stay linear; readers refresh.
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS rundb_race_stats_dirty (
+            event_id TEXT NOT NULL,
+            race_key TEXT NOT NULL,
+            PRIMARY KEY (event_id, race_key)
+        ) WITHOUT ROWID
+    ''')
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_results_stats_insert
+        AFTER INSERT ON rundb_results
+        BEGIN
+            INSERT OR IGNORE INTO rundb_race_stats_dirty VALUES (NEW.event_id, COALESCE(NEW.race_id, ''));
+        END
+    ''')
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_results_stats_delete
+        AFTER DELETE ON rundb_results
+        BEGIN
+            INSERT OR IGNORE INTO rundb_race_stats_dirty VALUES (OLD.event_id, COALESCE(OLD.race_id, ''));
+        END
+    ''')
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_rundb_results_stats_update
+        AFTER UPDATE OF event_id, race_id, finish, time_sec ON rundb_results
+        BEGIN
+            INSERT OR IGNORE INTO rundb_race_stats_dirty VALUES (OLD.event_id, COALESCE(OLD.race_id, ''));
+            INSERT OR IGNORE INTO rundb_race_stats_dirty VALUES (NEW.event_id, COALESCE(NEW.race_id, ''));
+        END
+    ''')
+    if not race_stats_exists:
+        # One-time backfill for databases created before rundb_race_stats existed
+        cur.execute('''
+            INSERT OR IGNORE INTO rundb_race_stats_dirty
+            SELECT DISTINCT event_id, COALESCE(race_id, '') FROM rundb_results
+        ''')
+
     # Seed if empty
     cur.execute('SELECT COUNT(*) FROM rundb_events')
     if (cur.fetchone() or [0])[0] == 0:
@@ -147,7 +534,167 @@ def init_db():
         ''', results)
 
     conn.commit()
+    migrate(conn)
     conn.close()
+    refresh_derived_tables()
+
+
+def compute_race_stats(cur, event_id: str, race_key: str) -> Optional[tuple]:
+    """Aggregate one race from its results, or None if it has none left."""
+    cur.execute('''
+        SELECT finish, time_sec FROM rundb_results
+        WHERE event_id = ? AND race_id IS ?
+    ''', (event_id, race_key or None))
+    rows = cur.fetchall()
+    if not rows:
+        return None
+    finishes = [finish for finish, _ in rows if finish is not None]
+    times = sorted(time_sec for finish, time_sec in rows if finish is not None and time_sec is not None)
+    return (
+        event_id, race_key, len(rows),
+        max(finishes) if finishes else None,
+        times[0] if times else None,
+        int(round(statistics.median(times))) if times else None,
+        len(rows) - len(finishes),
+    )
+
+
+def refresh_race_stats(conn: sqlite3.Connection):
+    """Recompute the stats of races marked dirty; a single cheap read when none are."""
+    if conn.execute('SELECT 1 FROM rundb_race_stats_dirty LIMIT 1').fetchone() is None:
+        return
+    if conn.in_transaction:
+        conn.commit()
+    cur = conn.cursor()
+    # Serializes refreshers; whoever comes second finds nothing left to do
+    cur.execute('BEGIN IMMEDIATE')
+    try:
+        cur.execute('SELECT event_id, race_key FROM rundb_race_stats_dirty')
+        for event_id, race_key in cur.fetchall():
+            stats = compute_race_stats(cur, event_id, race_key)
+            if stats is None:
+                cur.execute('DELETE FROM rundb_race_stats WHERE event_id = ? AND race_key = ?', (event_id, race_key))
+            else:
+                cur.execute('INSERT OR REPLACE INTO rundb_race_stats VALUES (?, ?, ?, ?, ?, ?, ?)', stats)
+        cur.execute('DELETE FROM rundb_race_stats_dirty')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def refresh_athlete_stats(conn: sqlite3.Connection):
+    """Rebuild the rows of runners marked dirty, in one statement however many there are."""
+    if conn.execute('SELECT 1 FROM rundb_athlete_stats_dirty LIMIT 1').fetchone() is None:
+        return
+    if conn.in_transaction:
+        conn.commit()
+    cur = conn.cursor()
+    cur.execute('BEGIN IMMEDIATE')
+    try:
+        # Deleted runners have no row to rebuild, so clear first and reinsert
+        cur.execute('DELETE FROM rundb_athlete_stats WHERE runner_id IN (SELECT runner_id FROM rundb_athlete_stats_dirty)')
+        cur.execute('INSERT INTO rundb_athlete_stats ' + ATHLETE_STATS_SELECT)
+        cur.execute('DELETE FROM rundb_athlete_stats_dirty')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# Search items per kind, for the marked rows only. Runners share the
+# athletes list's popularity; events count entrants, clubs members and
+# results, organizers events.
+SEARCH_ITEM_SELECTS = [
+    '''
+    SELECT 'runner', r.id, r.name, py_fold(r.name), COALESCE(a.popularity, 0)
+    FROM rundb_runners r
+    LEFT JOIN rundb_athlete_stats a ON a.runner_id = r.id
+    WHERE r.id IN (SELECT ref_id FROM rundb_search_dirty WHERE kind = 'runner')
+    ''',
+    '''
+    SELECT 'event', e.id, e.name, py_fold(e.name),
+           COALESCE(e.enrolled_count, 0) + (SELECT COUNT(*) FROM rundb_results WHERE event_id = e.id)
+    FROM rundb_events e
+    WHERE e.id IN (SELECT ref_id FROM rundb_search_dirty WHERE kind = 'event')
+    ''',
+    '''
+    SELECT 'club', ref_id, ref_id, py_fold(ref_id), members + results
+    FROM (
+        SELECT d.ref_id,
+               (SELECT COUNT(*) FROM rundb_runners WHERE club = d.ref_id) as members,
+               (SELECT COUNT(*) FROM rundb_results WHERE club = d.ref_id) as results
+        FROM rundb_search_dirty d
+        WHERE d.kind = 'club'
+    )
+    WHERE members + results > 0
+    ''',
+    '''
+    SELECT 'organizer', ref_id, ref_id, py_fold(ref_id), events
+    FROM (
+        SELECT d.ref_id, (SELECT COUNT(*) FROM rundb_events WHERE organizer = d.ref_id) as events
+        FROM rundb_search_dirty d
+        WHERE d.kind = 'organizer'
+    )
+    WHERE events > 0
+    ''',
+]
+
+def search_rank_key(popularity: int, item_id: int) -> int:
+    """Index rowid ordering items by popularity, then id: the index returns the most popular match first."""
+    return (min(popularity, 2 ** 31 - 1) << 32) | (item_id & 0xFFFFFFFF)
+
+def refresh_search_index(conn: sqlite3.Connection):
+    """Reindex the search items marked dirty. Runner popularity comes from
+    rundb_athlete_stats, so refresh that first."""
+    if conn.execute('SELECT 1 FROM rundb_search_dirty LIMIT 1').fetchone() is None:
+        return
+    if conn.in_transaction:
+        conn.commit()
+    cur = conn.cursor()
+    cur.execute('BEGIN IMMEDIATE')
+    try:
+        cur.execute('''
+            DELETE FROM rundb_search_items WHERE (kind, ref_id) IN (SELECT kind, ref_id FROM rundb_search_dirty)
+        ''')
+        rows = []
+        for select in SEARCH_ITEM_SELECTS:
+            rows += cur.execute(select).fetchall()
+        # Explicit ids, since the rank key is built from them
+        next_id = (cur.execute('SELECT MAX(id) FROM rundb_search_items').fetchone()[0] or 0) + 1
+        cur.executemany('''
+            INSERT INTO rundb_search_items (id, kind, ref_id, label, folded, popularity, rank_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (next_id + n, *row, search_rank_key(row[4], next_id + n)) for n, row in enumerate(rows)
+        ])
+        cur.execute('DELETE FROM rundb_search_dirty')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def refresh_derived_tables():
+    """Refresh every table the triggers mark: race stats, athlete stats, then
+    search, which reads athlete popularity. Runs at startup and from the
+    background refresher, never in a request."""
+    conn = get_conn()
+    try:
+        refresh_race_stats(conn)
+        refresh_athlete_stats(conn)
+        refresh_search_index(conn)
+    finally:
+        conn.close()
+
+
+async def refresh_derived_tables_forever():
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        try:
+            await asyncio.to_thread(refresh_derived_tables)
+        except Exception as exc:
+            print(f'⚠️ RunDB refresh failed: {exc}')
 
 
 # Pydantic models
@@ -204,6 +751,22 @@ class ResultRow(BaseModel):
     date: str
     participants_total: Optional[int] = None
 
+# Result lists skip per-row model construction: rows map straight to dicts
+# with ResultRow's keys in its field order, so the JSON is unchanged
+RESULT_ROW_FIELDS = tuple(ResultRow.model_fields)
+
+def result_row(r: tuple) -> dict:
+    return dict(zip(RESULT_ROW_FIELDS, r))
+
+class RaceStats(BaseModel):
+    event_id: str
+    race_id: Optional[str] = None
+    participants: int
+    max_finish: Optional[int] = None
+    winner_time_sec: Optional[int] = None
+    median_time_sec: Optional[int] = None
+    dnf_count: int = 0
+
 class Stats(BaseModel):
     runners_count: int
     events_count: int
@@ -243,76 +806,187 @@ app.add_middleware(
     ],
     allow_methods=['*'],
     allow_headers=['*'],
+    expose_headers=['X-Next-Cursor'],
 )
+app.add_middleware(MetricsMiddleware, histogram=REGISTRY.histogram(
+    'rundb_http_request_duration_seconds', 'HTTP request latency', ['method', 'route', 'status']
+))
+
+
+@app.get('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+refresher: Optional[asyncio.Task] = None
 
 
 @app.on_event('startup')
-def on_startup():
-    init_db()
+async def on_startup():
+    global refresher
+    await asyncio.to_thread(init_db)
+    refresher = asyncio.create_task(refresh_derived_tables_forever())
+
+
+@app.on_event('shutdown')
+async def on_shutdown():
+    if refresher is not None:
+        refresher.cancel()
+        try:
+            await refresher
+        except asyncio.CancelledError:
+            pass
+
+
+EVENTS_PAGE_SIZE = int(os.getenv('RUNDB_EVENTS_PAGE_SIZE', '100'))
+EVENTS_MAX_PAGE_SIZE = 1000
+
+# Event's fields bar races, in order
+EVENT_COLUMNS = '''
+    id, name, date, start_time, location_city, location_country, organizer, homepage, sport, level,
+    signup_begin, signup_end, image_url, premium, enrolled_count, distance_km
+'''
+EVENT_FIELDS = tuple(Event.model_fields)
+
+def event_row(r: tuple) -> dict:
+    """Event's JSON for a row of EVENT_COLUMNS, races still empty."""
+    event = dict(zip(EVENT_FIELDS, r))
+    event['premium'] = bool(event['premium'] or 0)
+    event['enrolled_count'] = event['enrolled_count'] or 0
+    event['races'] = []
+    return event
+
+def parse_day(value: str, name: str) -> str:
+    try:
+        return datetime.fromisoformat(value).date().isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f'{name} must be an ISO date')
+
+def encode_event_cursor(position: list) -> str:
+    """Opaque, URL-safe keyset cursor: the segment and sort key of the last row returned."""
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+def decode_event_cursor(cursor: str, segments: int) -> list:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    shape = (int, (str, type(None)), str)
+    if not isinstance(position, list) or len(position) != len(shape) or not all(
+        isinstance(value, kind) for value, kind in zip(position, shape)
+    ) or not 0 <= position[0] < segments:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    return position
 
 
 @app.get('/rundb/events', response_model=List[Event])
-def list_events(upcoming: Optional[bool] = None):
+def list_events(
+    upcoming: Optional[bool] = None,
+    past: Optional[bool] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    country: Optional[str] = None,
+    sport: Optional[str] = None,
+    organizer: Optional[str] = None,
+    limit: int = EVENTS_PAGE_SIZE,
+    cursor: Optional[str] = None,
+):
+    """One page of events; pass X-Next-Cursor as ?cursor= for the next.
+
+    Events come by day, then id; past=true lists events before today, latest
+    first. upcoming=true lists events from today on, led by earlier ones whose
+    signup is still open. Events without a valid date come last and count as
+    upcoming. Filters and the page cut run in SQL on the indexed start_day
+    and signup_end_day columns, and races are read for the page only.
+    """
+    if upcoming and past:
+        raise HTTPException(status_code=400, detail='upcoming and past exclude each other')
+    limit = max(1, min(limit, EVENTS_MAX_PAGE_SIZE))
+    today = datetime.now().date().isoformat()
+
+    where, params = [], []
+    for column, value in (('location_country', country), ('sport', sport), ('organizer', organizer)):
+        if value:
+            where.append(f'{column} = ?')
+            params.append(value)
+    if date_from:
+        where.append('start_day >= ?')
+        params.append(parse_day(date_from, 'date_from'))
+    if date_to:
+        where.append('start_day <= ?')
+        params.append(parse_day(date_to, 'date_to'))
+
+    # The list in segments, each read in its own order: (source, condition,
+    # params, direction), no direction meaning undated events by id
+    if upcoming:
+        segments = [
+            # Few events have open signup; don't walk the past to find them
+            ('rundb_events INDEXED BY idx_rundb_events_signup_end_day', 'start_day < ? AND signup_end_day >= ?',
+             [today, today], 'ASC'),
+            ('rundb_events', 'start_day >= ?', [today], 'ASC'),
+            ('rundb_events', 'start_day IS NULL', [], None),
+        ]
+    elif past:
+        segments = [('rundb_events', 'start_day < ?', [today], 'DESC')]
+    else:
+        segments = [
+            ('rundb_events', 'start_day IS NOT NULL', [], 'ASC'),
+            ('rundb_events', 'start_day IS NULL', [], None),
+        ]
+    segment, day, last_id = decode_event_cursor(cursor, len(segments)) if cursor else (0, None, None)
+
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute('SELECT * FROM rundb_events')
-    rows = cur.fetchall()
-    events: List[Event] = []
-    for row in rows:
-        e = Event(
-            id=row[0], name=row[1], date=row[2], start_time=row[3],
-            location_city=row[4], location_country=row[5], organizer=row[6], homepage=row[7],
-            sport=row[8], level=row[9], signup_begin=row[10], signup_end=row[11], image_url=row[12],
-            premium=bool(row[13] or 0), enrolled_count=row[14] or 0, distance_km=row[15], races=[]
-        )
-        events.append(e)
-    # attach races
-    cur.execute('SELECT id, event_id, name, start_time FROM rundb_event_races')
-    race_rows = cur.fetchall()
-    by_event = {}
-    for r in race_rows:
-        er = EventRace(id=r[0], event_id=r[1], name=r[2], start_time=r[3])
-        by_event.setdefault(er.event_id, []).append(er)
-    for e in events:
-        e.races = by_event.get(e.id, [])
+    rows, next_position = [], None
+    while segment < len(segments):
+        source, condition, values, direction = segments[segment]
+        conditions, args = where + [condition], params + values
+        if last_id is not None and direction:
+            conditions.append(f"(start_day, id) {'>' if direction == 'ASC' else '<'} (?, ?)")
+            args += [day, last_id]
+        elif last_id is not None:
+            conditions.append('id > ?')
+            args.append(last_id)
+        order = f'start_day {direction}, id {direction}' if direction else 'id ASC'
+        wanted = limit - len(rows)
+        cur.execute(f'''
+            SELECT {EVENT_COLUMNS}, start_day
+            FROM {source}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {order}
+            LIMIT ?
+        ''', (*args, wanted + 1))
+        found = cur.fetchall()
+        rows += found[:wanted]
+        if len(found) > wanted:
+            next_position = [segment, rows[-1][-1], rows[-1][0]]
+            break
+        segment, day, last_id = segment + 1, None, None
+
+    events = [event_row(r[:-1]) for r in rows]
+    if events:
+        by_id = {e['id']: e for e in events}
+        cur.execute(f'''
+            SELECT id, event_id, name, start_time FROM rundb_event_races WHERE event_id IN ({', '.join('?' * len(by_id))})
+        ''', tuple(by_id))
+        for r in cur.fetchall():
+            by_id[r[1]]['races'].append(dict(zip(EventRace.model_fields, r)))
     conn.close()
 
-    if upcoming:
-        today = datetime.now().date()
-        def is_up(e: Event):
-            try:
-                d = datetime.fromisoformat(e.date).date()
-                date_ok = d >= today
-            except Exception:
-                date_ok = True
-            signup_ok = False
-            if e.signup_end:
-                try:
-                    se = datetime.fromisoformat(e.signup_end)
-                    signup_ok = se.date() >= today
-                except Exception:
-                    signup_ok = False
-            return date_ok or signup_ok
-        events = [e for e in events if is_up(e)]
-        events.sort(key=lambda x: x.date)
-    return events
+    headers = {'X-Next-Cursor': encode_event_cursor(next_position)} if next_position else {}
+    return FastJSONResponse(events, headers=headers)
 
 
 @app.get('/rundb/events/{event_id}', response_model=Event)
 def event_detail(event_id: str):
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute('SELECT * FROM rundb_events WHERE id = ?', (event_id,))
+    cur.execute(f'SELECT {EVENT_COLUMNS} FROM rundb_events WHERE id = ?', (event_id,))
     row = cur.fetchone()
     if not row:
         conn.close()
         raise HTTPException(status_code=404, detail='Event not found')
-    e = Event(
-        id=row[0], name=row[1], date=row[2], start_time=row[3],
-        location_city=row[4], location_country=row[5], organizer=row[6], homepage=row[7],
-        sport=row[8], level=row[9], signup_begin=row[10], signup_end=row[11], image_url=row[12],
-        premium=bool(row[13] or 0), enrolled_count=row[14] or 0, distance_km=row[15], races=[]
-    )
+    e = Event(**event_row(row))
     cur.execute('SELECT id, event_id, name, start_time FROM rundb_event_races WHERE event_id = ?', (event_id,))
     e.races = [EventRace(id=r[0], event_id=r[1], name=r[2], start_time=r[3]) for r in cur.fetchall()]
     conn.close()
@@ -325,29 +999,30 @@ def event_results(event_id: str):
     cur = conn.cursor()
     cur.execute('''
         SELECT r.id, r.event_id, r.race_id, r.runner_id, r.finish, r.bib_number, r.name, r.nation, r.club, r.class, r.time, r.time_sec, r.behind, r.date,
-               (
-                 SELECT CASE 
-                     WHEN MAX(CASE WHEN rr.finish IS NOT NULL THEN rr.finish END) IS NOT NULL 
-                       THEN MAX(CASE WHEN rr.finish IS NOT NULL THEN rr.finish END)
-                     ELSE COUNT(*)
-                 END
-                 FROM rundb_results rr
-                 WHERE rr.event_id = r.event_id
-                   AND ((rr.race_id IS NULL AND r.race_id IS NULL) OR rr.race_id = r.race_id)
-               ) as participants_total
+               COALESCE(s.max_finish, s.participants) as participants_total
         FROM rundb_results r
+        LEFT JOIN rundb_race_stats s ON s.event_id = r.event_id AND s.race_key = COALESCE(r.race_id, '')
         WHERE r.event_id = ?
         ORDER BY CASE WHEN r.finish IS NULL THEN 99999 ELSE r.finish END ASC, r.time_sec ASC
     ''', (event_id,))
     rows = cur.fetchall()
     conn.close()
-    out: List[ResultRow] = []
-    for r in rows:
-        out.append(ResultRow(
-            id=r[0], event_id=r[1], race_id=r[2], runner_id=r[3], finish=r[4], bib_number=r[5],
-            name=r[6], nation=r[7], club=r[8], class_field=r[9], time=r[10], time_sec=r[11], behind=r[12], date=r[13], participants_total=r[14]
-        ))
-    return out
+    return FastJSONResponse([result_row(r) for r in rows])
+
+
+@app.get('/rundb/events/{event_id}/race-stats', response_model=List[RaceStats])
+def event_race_stats(event_id: str):
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT event_id, NULLIF(race_key, ''), participants, max_finish, winner_time_sec, median_time_sec, dnf_count
+        FROM rundb_race_stats
+        WHERE event_id = ?
+        ORDER BY race_key
+    ''', (event_id,))
+    rows = cur.fetchall()
+    conn.close()
+    return FastJSONResponse([dict(zip(RaceStats.model_fields, r)) for r in rows])
 
 
 @app.get('/rundb/runners', response_model=List[RDRunner])
@@ -392,23 +1067,15 @@ def latest_results(limit: int = 100):
     cur = conn.cursor()
     cur.execute('''
         SELECT r.id, r.event_id, r.race_id, r.runner_id, r.finish, r.bib_number, r.name, r.nation, r.club, r.class, r.time, r.time_sec, r.behind, r.date,
-               (
-                 SELECT COUNT(*) FROM rundb_results rr
-                 WHERE rr.event_id = r.event_id
-                   AND ((rr.race_id IS NULL AND r.race_id IS NULL) OR rr.race_id = r.race_id)
-               ) as participants_total
+               s.participants as participants_total
         FROM rundb_results r
+        LEFT JOIN rundb_race_stats s ON s.event_id = r.event_id AND s.race_key = COALESCE(r.race_id, '')
         ORDER BY r.date DESC, CASE WHEN r.finish IS NULL THEN 99999 ELSE r.finish END ASC
         LIMIT ?
     ''', (limit,))
     rows = cur.fetchall()
     conn.close()
-    return [
-        ResultRow(
-            id=r[0], event_id=r[1], race_id=r[2], runner_id=r[3], finish=r[4], bib_number=r[5],
-            name=r[6], nation=r[7], club=r[8], class_field=r[9], time=r[10], time_sec=r[11], behind=r[12], date=r[13], participants_total=r[14]
-        ) for r in rows
-    ]
+    return FastJSONResponse([result_row(r) for r in rows])
 
 
 @app.get('/rundb/runners/{runner_id}/results', response_model=List[ResultRow])
@@ -417,23 +1084,15 @@ def runner_results(runner_id: str):
     cur = conn.cursor()
     cur.execute('''
         SELECT r.id, r.event_id, r.race_id, r.runner_id, r.finish, r.bib_number, r.name, r.nation, r.club, r.class, r.time, r.time_sec, r.behind, r.date,
-               (
-                 SELECT COUNT(*) FROM rundb_results rr
-                 WHERE rr.event_id = r.event_id
-                   AND ((rr.race_id IS NULL AND r.race_id IS NULL) OR rr.race_id = r.race_id)
-               ) as participants_total
+               s.participants as participants_total
         FROM rundb_results r
+        LEFT JOIN rundb_race_stats s ON s.event_id = r.event_id AND s.race_key = COALESCE(r.race_id, '')
         WHERE r.runner_id = ?
         ORDER BY r.date DESC, CASE WHEN r.finish IS NULL THEN 99999 ELSE r.finish END ASC
     ''', (runner_id,))
     rows = cur.fetchall()
     conn.close()
-    return [
-        ResultRow(
-            id=r[0], event_id=r[1], race_id=r[2], runner_id=r[3], finish=r[4], bib_number=r[5],
-            name=r[6], nation=r[7], club=r[8], class_field=r[9], time=r[10], time_sec=r[11], behind=r[12], date=r[13], participants_total=r[14]
-        ) for r in rows
-    ]
+    return FastJSONResponse([result_row(r) for r in rows])
 
 
 @app.get('/rundb/stats', response_model=Stats)
@@ -450,17 +1109,108 @@ def stats():
     return Stats(runners_count=rc, events_count=ec, results_count=resc)
 
 
+SEARCH_PAGE_SIZE = int(os.getenv('RUNDB_SEARCH_PAGE_SIZE', '10'))
+SEARCH_MAX_PAGE_SIZE = 50
+
+SEARCH_ICONS = {'event': '🏁 ', 'runner': '🏃 ', 'club': '👥 ', 'organizer': '📋 '}
+
+SEARCH_FTS_SOURCE = 'rundb_search_fts f JOIN rundb_search_items i ON i.rank_key = f.rowid'
+
+def encode_search_cursor(position: tuple) -> str:
+    return base64.urlsafe_b64encode(('%d:%d' % position).encode()).decode().rstrip('=')
+
+def decode_search_cursor(cursor: str) -> tuple:
+    try:
+        tier, offset = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split(':')
+        position = (int(tier), int(offset))
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    if min(position) < 0:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    return position
+
+def search_tiers(folded: str) -> List[tuple]:
+    """(source, condition, params, rank column) per match tier, best first.
+
+    The index text is char(2), a space and the folded name, so a phrase
+    starting with char(2) only matches at the start of a name and one
+    starting with a space at the start of a word. Trigrams need three
+    characters, so single letters are only checked with instr.
+    """
+    def phrase(text: str) -> str:
+        return '"%s"' % text.replace('"', '""')
+
+    words = folded.split(' ')
+    word_starts = ' AND '.join(["instr(' ' || i.folded, ?) > 0"] * len(words))
+    word_start_params = [' ' + w for w in words]
+    tiers = [
+        # Exact name
+        ('rundb_search_items i', 'i.folded = ?', [folded], 'i.rank_key'),
+        # Name starts with the query
+        (SEARCH_FTS_SOURCE, 'rundb_search_fts MATCH ? AND i.folded != ?',
+         [phrase('\x02 ' + folded), folded], 'f.rowid'),
+    ]
+    starts = [phrase(' ' + w) for w in words if len(w) >= 2]
+    if starts:
+        # Every word starts a word of the name, in any order
+        tiers.append((SEARCH_FTS_SOURCE, f'rundb_search_fts MATCH ? AND substr(i.folded, 1, ?) != ? AND {word_starts}',
+                      [' AND '.join(starts), len(folded), folded, *word_start_params], 'f.rowid'))
+    long_words = [w for w in words if len(w) >= 3]
+    if long_words:
+        # Longer words appear anywhere; one or two letters still have to
+        # start a word, they match too much otherwise
+        short_starts = ["instr(' ' || i.folded, ?) > 0" for w in words if len(w) < 3]
+        contains = ' AND '.join(['instr(i.folded, ?) > 0'] * len(long_words) + short_starts)
+        match = [phrase(w) for w in long_words] + [phrase(' ' + w) for w in words if len(w) == 2]
+        tiers.append((SEARCH_FTS_SOURCE, f'rundb_search_fts MATCH ? AND {contains} AND NOT ({word_starts})',
+                      [' AND '.join(match), *long_words, *[' ' + w for w in words if len(w) < 3], *word_start_params],
+                      'f.rowid'))
+    return tiers
+
+
 @app.get('/rundb/search', response_model=List[SearchItem])
-def search(q: str):
-    like = f"%{q.strip()}%"
+def search(q: str, limit: int = SEARCH_PAGE_SIZE, cursor: Optional[str] = None):
+    """Typeahead over runners, events, clubs and organizers.
+
+    Names and queries are folded alike, so 'ostensjo' finds 'Østensjø'.
+    Results come in tiers (exact name, name prefix, word prefixes, any
+    substring), each most popular first. Index rowids are rank keys, so a
+    tier reads its matches in that order and stops once the page is full.
+    X-Next-Cursor holds the tier and offset to continue from.
+    """
+    folded = fold(q)
+    if not folded:
+        return FastJSONResponse([])
+    limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+    tier, offset = decode_search_cursor(cursor) if cursor else (0, 0)
+
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute('SELECT id, name FROM rundb_events WHERE name LIKE ?', (like,))
-    evs = [SearchItem(type='event', id=row[0], label='🏁 ' + row[1]) for row in cur.fetchall()]
-    cur.execute('SELECT id, name FROM rundb_runners WHERE name LIKE ?', (like,))
-    runs = [SearchItem(type='runner', id=row[0], label='🏃 ' + row[1]) for row in cur.fetchall()]
+    tiers = search_tiers(folded)
+    rows, next_position = [], None
+    while tier < len(tiers):
+        source, condition, params, rank = tiers[tier]
+        wanted = limit - len(rows)
+        cur.execute(f'''
+            SELECT i.kind, i.ref_id, i.label
+            FROM {source}
+            WHERE {condition}
+            ORDER BY {rank} DESC
+            LIMIT ? OFFSET ?
+        ''', (*params, wanted + 1, offset))
+        found = cur.fetchall()
+        rows += found[:wanted]
+        if len(found) > wanted:
+            next_position = (tier, offset + wanted)
+            break
+        tier, offset = tier + 1, 0
     conn.close()
-    return evs + runs
+
+    headers = {'X-Next-Cursor': encode_search_cursor(next_position)} if next_position else {}
+    # Keys in SearchItem field order, so the JSON is unchanged
+    return FastJSONResponse([
+        {'type': kind, 'id': ref_id, 'label': SEARCH_ICONS.get(kind, '') + label} for kind, ref_id, label in rows
+    ], headers=headers)
 
 
 @app.post('/rundb/runners/{runner_id}/visit')
@@ -481,10 +1231,42 @@ def add_visit(runner_id: str):
     return { 'runner_id': runner_id, 'visits_count': count, 'last_visit': now }
 
 
+ATHLETES_PAGE_SIZE = int(os.getenv('RUNDB_ATHLETES_PAGE_SIZE', '100'))
+ATHLETES_MAX_PAGE_SIZE = 1000
+# Range filters matching at most this many rows are read through their own index
+ATHLETES_RANGE_SCAN_ROWS = int(os.getenv('RUNDB_ATHLETES_RANGE_SCAN_ROWS', '5000'))
+
+# sort -> column ordered descending ahead of name, or None for plain name order
+ATHLETE_SORTS = {'name': None, 'popularity': 'popularity', 'runs': 'run_count'}
+
+def encode_athlete_cursor(position: list) -> str:
+    """Opaque, URL-safe keyset cursor: the sort key of the last row returned."""
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+def decode_athlete_cursor(cursor: str, lead: Optional[str]) -> list:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    shape = (int, str, str) if lead else (str, str)
+    if not isinstance(position, list) or len(position) != len(shape) or not all(
+        isinstance(value, kind) for value, kind in zip(position, shape)
+    ):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    return position
+
+def popularity_star(popularity: int, max_popularity: int) -> int:
+    """1-10 stars relative to the most popular athlete."""
+    if max_popularity <= 0:
+        return 1
+    return max(1, -(-popularity * 10 // max_popularity))
+
+
 @app.get('/rundb/athletes', response_model=List[AthleteSummary])
 def athletes(
     q: Optional[str] = None,
     sex: Optional[str] = None,
+    country: Optional[str] = None,
     min_runs: int = 0,
     date_from: Optional[str] = None,
     podium: Optional[str] = None,  # '1' | '2' | '3' | 'top3'
@@ -495,102 +1277,118 @@ def athletes(
     min_top3: int = 0,
     popularity_min: Optional[int] = None,
     popularity_max: Optional[int] = None,
+    sort: str = 'name',            # 'name' | 'popularity' | 'runs'
+    limit: int = ATHLETES_PAGE_SIZE,
+    cursor: Optional[str] = None,
 ):
+    """One page of athlete summaries; pass X-Next-Cursor as ?cursor= for the next.
+
+    Filters, sort and page cut all run in SQL on rundb_athlete_stats, reading
+    the index of the sort order.
+    """
+    if top == 'popular3':
+        sort, limit = 'popularity', 3
+    if sort not in ATHLETE_SORTS:
+        raise HTTPException(status_code=400, detail='sort must be one of: ' + ', '.join(ATHLETE_SORTS))
+    limit = max(1, min(limit, ATHLETES_MAX_PAGE_SIZE))
+    lead = ATHLETE_SORTS[sort]
+
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute('''
-        SELECT r.id, r.name, r.sex, r.date, r.club, r.country, r.avatar_url,
-               COUNT(res.id) as run_count,
-               MAX(res.date) as last_race_date,
-               SUM(CASE WHEN res.finish = 1 THEN 1 ELSE 0 END) as p1,
-               SUM(CASE WHEN res.finish = 2 THEN 1 ELSE 0 END) as p2,
-               SUM(CASE WHEN res.finish = 3 THEN 1 ELSE 0 END) as p3
-        FROM rundb_runners r
-        LEFT JOIN rundb_results res ON res.runner_id = r.id
-        GROUP BY r.id
-        ORDER BY r.name ASC
-    ''')
-    rows = cur.fetchall()
-    conn.close()
-    out: List[AthleteSummary] = []
-    for r in rows:
-        p1 = int(r[9] or 0)
-        p2 = int(r[10] or 0)
-        p3 = int(r[11] or 0)
-        top3 = p1 + p2 + p3
-        run_count = int(r[7] or 0)
-        # Popularity: base on activity + podiums
-        popularity = run_count + (p1 * 5) + (p2 * 3) + (p3 * 2)
-        out.append(AthleteSummary(
-            id=r[0], name=r[1], sex=r[2], date=r[3], club=r[4], country=r[5], avatar_url=r[6],
-            run_count=run_count, last_race_date=r[8],
-            podium_1=p1, podium_2=p2, podium_3=p3, podium_top3=top3,
-            popularity=popularity,
-            popularity_star=0,
-        ))
-
-    # Compute 1-10 star scale relative to max popularity
-    max_pop = max((a.popularity for a in out), default=0)
-    if max_pop > 0:
-        for a in out:
-            a.popularity_star = max(1, int(math.ceil(a.popularity / max_pop * 10)))
-    else:
-        for a in out:
-            a.popularity_star = 1
+    cur.execute('SELECT MAX(popularity) FROM rundb_athlete_stats')
+    max_popularity = (cur.fetchone() or [0])[0] or 0
 
-    # Apply filters in-process to keep query simple
-    if q:
-        ql = q.strip().lower()
-        out = [a for a in out if (f"{a.name} {a.club or ''} {a.country or ''}").lower().find(ql) >= 0]
+    where, params = [], []
+    # Range filters that have an index: (index, condition, params)
+    ranges = []
+    if q and q.strip():
+        where.append('instr(search_text, ?) > 0')
+        params.append(q.strip().lower())
     if sex:
-        sx = sex.strip().lower()
-        out = [a for a in out if (a.sex or '').lower() == sx]
-    if min_runs and min_runs > 0:
-        out = [a for a in out if (a.run_count or 0) >= min_runs]
+        where.append("lower(COALESCE(sex, '')) = ?")
+        params.append(sex.strip().lower())
+    if country:
+        where.append('country = ?')
+        params.append(country)
+    if min_runs > 0:
+        ranges.append(('idx_rundb_athlete_stats_runs', 'run_count >= ?', [min_runs]))
     if date_from:
-        out = [a for a in out if a.last_race_date and str(a.last_race_date) >= date_from]
-    if podium:
-        if podium == '1':
-            out = [a for a in out if a.podium_1 > 0]
-        elif podium == '2':
-            out = [a for a in out if a.podium_2 > 0]
-        elif podium == '3':
-            out = [a for a in out if a.podium_3 > 0]
-        elif podium == 'top3':
-            out = [a for a in out if a.podium_top3 > 0]
-
-    # Minimum podium thresholds
-    if min_p1 and min_p1 > 0:
-        out = [a for a in out if (a.podium_1 or 0) >= min_p1]
-    if min_p2 and min_p2 > 0:
-        out = [a for a in out if (a.podium_2 or 0) >= min_p2]
-    if min_p3 and min_p3 > 0:
-        out = [a for a in out if (a.podium_3 or 0) >= min_p3]
-    if min_top3 and min_top3 > 0:
-        out = [a for a in out if (a.podium_top3 or 0) >= min_top3]
-
-    # Popularity star filter (1..10)
-    if popularity_min is not None:
-        try:
-            pm = int(popularity_min)
-            out = [a for a in out if a.popularity_star >= pm]
-        except Exception:
-            pass
+        ranges.append(('idx_rundb_athlete_stats_last_race', 'last_race_date >= ?', [date_from]))
+    if podium in ('1', '2', '3', 'top3'):
+        where.append(f'podium_{podium} > 0')
+    for column, minimum in (('podium_1', min_p1), ('podium_2', min_p2), ('podium_3', min_p3)):
+        if minimum > 0:
+            where.append(f'{column} >= ?')
+            params.append(minimum)
+    # Any podium filter implies a minimum number of podiums overall
+    min_podiums = max(min_top3, min_p1, min_p2, min_p3, 1 if podium in ('1', '2', '3', 'top3') else 0)
+    if min_podiums > 0:
+        ranges.append(('idx_rundb_athlete_stats_podiums', 'podium_top3 >= ?', [min_podiums]))
+    # Star bounds as popularity bounds, so they can use the index:
+    # star >= n <=> 10 * popularity > (n - 1) * max, star <= n <=> 10 * popularity <= n * max
+    popularity_range = [('popularity >= ?', (popularity_min - 1) * max_popularity // 10 + 1)] \
+        if popularity_min is not None and popularity_min > 1 else []
     if popularity_max is not None:
-        try:
-            px = int(popularity_max)
-            out = [a for a in out if a.popularity_star <= px]
-        except Exception:
-            pass
+        popularity_range.append(('popularity <= ?', popularity_max * max_popularity // 10 if popularity_max >= 1 else -1))
+    if popularity_range:
+        ranges.append(('idx_rundb_athlete_stats_popularity', ' AND '.join(c for c, _ in popularity_range),
+                       [v for _, v in popularity_range]))
+    for _, condition, values in ranges:
+        where.append(condition)
+        params += values
 
-    if top == 'popular3':
-        out = sorted(out, key=lambda a: a.popularity, reverse=True)[:3]
-    else:
-        # Default sort by name
-        out = sorted(out, key=lambda a: a.name)
+    # Walking the sort order's index only pays off while matches are common.
+    # When a range filter matches few rows, read those through its index and
+    # sort them instead; a capped count over each range finds the narrowest.
+    source = 'rundb_athlete_stats'
+    narrowest = None
+    for index, condition, values in ranges:
+        cur.execute(f'''
+            SELECT COUNT(*) FROM (SELECT 1 FROM rundb_athlete_stats INDEXED BY {index} WHERE {condition} LIMIT ?)
+        ''', (*values, ATHLETES_RANGE_SCAN_ROWS + 1))
+        matches = cur.fetchone()[0]
+        if matches <= ATHLETES_RANGE_SCAN_ROWS and (narrowest is None or matches < narrowest[1]):
+            narrowest = (index, matches)
+    if narrowest is not None:
+        source = f'rundb_athlete_stats INDEXED BY {narrowest[0]}'
 
-    return out
+    if cursor:
+        position = decode_athlete_cursor(cursor, lead)
+        if lead:
+            where.append(f'{lead} <= ? AND ({lead} < ? OR (name, runner_id) > (?, ?))')
+            params += [position[0], *position]
+        else:
+            where.append('(name, runner_id) > (?, ?)')
+            params += position
+    order = f'{lead} DESC, name ASC, runner_id ASC' if lead else 'name ASC, runner_id ASC'
+    paged = top != 'popular3'
+
+    cur.execute(f'''
+        SELECT runner_id, name, sex, date, club, country, avatar_url, run_count, last_race_date,
+               podium_1, podium_2, podium_3, podium_top3, popularity
+        FROM {source}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {order}
+        LIMIT ?
+    ''', (*params, limit + 1 if paged else limit))
+    rows = cur.fetchall()
+    conn.close()
 
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        lead_value = {'popularity': [last[13]], 'run_count': [last[7]]}.get(lead, [])
+        headers['X-Next-Cursor'] = encode_athlete_cursor(lead_value + [last[1], last[0]])
+    # Keys in AthleteSummary field order, so the JSON is unchanged
+    out = [{
+        'id': r[0], 'name': r[1], 'sex': r[2], 'date': r[3], 'club': r[4], 'country': r[5], 'avatar_url': r[6],
+        'run_count': r[7], 'last_race_date': r[8],
+        'podium_1': r[9], 'podium_2': r[10], 'podium_3': r[11], 'podium_top3': r[12],
+        'popularity': r[13],
+        'popularity_star': popularity_star(r[13], max_popularity),
+    } for r in rows]
+    return FastJSONResponse(out, headers=headers)
 
 if __name__ == '__main__':
     import uvicorn
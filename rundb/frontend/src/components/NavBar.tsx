@@ -1,26 +1,12 @@
 import { Link, NavLink, useLocation, useNavigate } from 'react-router-dom'
 import SearchBar from './SearchBar'
-import { useEffect, useState } from 'react'
 import { api, type SearchItem } from '../lib/api'
 
+const searchSuggestions = (q: string) => api.search(q, 8)
+
 export default function NavBar() {
   const nav = useNavigate()
   const loc = useLocation()
-  const [items, setItems] = useState<SearchItem[]>([])
-  useEffect(() => {
-    let mounted = true
-    Promise.all([api.events(), api.runners()])
-      .then(([events, runners]) => {
-        if (!mounted) return
-        const out: SearchItem[] = [
-          ...events.map(e => ({ type: 'event' as const, id: e.id, label: `🏁 ${e.name}` })),
-          ...runners.map(r => ({ type: 'runner' as const, id: r.id, label: `🏃 ${r.name}` })),
-        ]
-        setItems(out)
-      })
-      .catch(() => {})
-    return () => { mounted = false }
-  }, [])
   return (
     <nav className="navbar">
       <Link to="/" className="brand" aria-label="Go home">
@@ -34,13 +20,15 @@ export default function NavBar() {
         <NavLink to="/leaderboards" className={({isActive}) => isActive ? 'active' : ''}>Leaderboards</NavLink>
         <div style={{minWidth: 420, maxWidth: 560}}>
           <SearchBar<SearchItem>
-            data={items}
+            fetch={searchSuggestions}
             display={(it) => it.label}
             onSelect={(it) => {
               if (it.type === 'runner') nav(`/runner/${it.id}`)
               if (it.type === 'event') nav(`/competition/${it.id}`)
+              if (it.type === 'club') nav(`/runners?q=${encodeURIComponent(it.id)}`)
+              if (it.type === 'organizer') nav(`/upcoming?organizer=${encodeURIComponent(it.id)}`)
             }}
-            placeholder="Search athletes and events"
+            placeholder="Search athletes, events, clubs and organizers"
             autoFocus={loc.pathname === '/'}
           />
         </div>
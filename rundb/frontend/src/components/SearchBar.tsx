@@ -1,27 +1,41 @@
 import { useEffect, useMemo, useState } from 'react'
 
 type Props<T> = {
-  data: T[]
+  data?: T[]
+  // Server-side lookup, called once typing pauses; replaces filtering data
+  fetch?: (q: string) => Promise<T[]>
   onSelect: (item: T) => void
   placeholder?: string
   display: (item: T) => string
   autoFocus?: boolean
 }
 
-export default function SearchBar<T>({ data, onSelect, placeholder, display, autoFocus }: Props<T>) {
+export default function SearchBar<T>({ data = [], fetch, onSelect, placeholder, display, autoFocus }: Props<T>) {
   const [q, setQ] = useState('')
   const [open, setOpen] = useState(false)
+  const [fetched, setFetched] = useState<T[]>([])
   const [inputEl, setInputEl] = useState<HTMLInputElement | null>(null)
 
   useEffect(() => {
     setOpen(q.trim().length > 0)
   }, [q])
 
+  useEffect(() => {
+    const query = q.trim()
+    if (!fetch || !query) { setFetched([]); return }
+    let current = true
+    const t = setTimeout(() => {
+      fetch(query).then(items => { if (current) setFetched(items) }).catch(() => {})
+    }, 150)
+    return () => { current = false; clearTimeout(t) }
+  }, [q, fetch])
+
   const results = useMemo(() => {
+    if (fetch) return fetched
     const query = q.trim().toLowerCase()
     if (!query) return [] as T[]
     return data.filter((d) => display(d).toLowerCase().includes(query)).slice(0, 8)
-  }, [q, data, display])
+  }, [q, data, display, fetch, fetched])
 
   useEffect(() => {
     if (autoFocus && inputEl) {
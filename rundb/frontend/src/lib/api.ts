@@ -33,7 +33,38 @@ export type Athlete = Runner & {
   popularity_star?: number
 }
 export type Stats = { runners_count: number; events_count: number; results_count: number }
-export type SearchItem = { type: 'event'|'runner'; id: string; label: string }
+export type SearchItem = { type: 'event'|'runner'|'club'|'organizer'; id: string; label: string }
+
+export type AthleteFilters = {
+  q?: string
+  sex?: 'M'|'F'|''
+  country?: string
+  min_runs?: number
+  date_from?: string
+  podium?: '1'|'2'|'3'|'top3'
+  top?: 'popular3'
+  min_p1?: number
+  min_p2?: number
+  min_p3?: number
+  min_top3?: number
+  popularity_min?: number
+  popularity_max?: number
+  sort?: 'name'|'popularity'|'runs'
+  limit?: number
+  cursor?: string
+}
+export type EventFilters = {
+  upcoming?: boolean
+  past?: boolean
+  date_from?: string
+  date_to?: string
+  country?: string
+  sport?: string
+  organizer?: string
+  limit?: number
+  cursor?: string
+}
+export type Page<T> = { items: T[]; nextCursor: string | null }
 
 async function get<T>(path: string): Promise<T> {
   const res = await fetch(`${API_BASE}${path}`)
@@ -41,45 +72,75 @@ async function get<T>(path: string): Promise<T> {
   return res.json()
 }
 
+// Lists paged by keyset cursor return the next page's cursor in X-Next-Cursor
+async function getPage<T>(path: string): Promise<Page<T>> {
+  const res = await fetch(`${API_BASE}${path}`)
+  if (!res.ok) throw new Error(`HTTP ${res.status}`)
+  return { items: await res.json(), nextCursor: res.headers.get('X-Next-Cursor') }
+}
+
+function athleteParams(p?: AthleteFilters): string {
+  const params = new URLSearchParams()
+  if (p?.q) params.set('q', p.q)
+  if (p?.sex) params.set('sex', p.sex)
+  if (p?.country) params.set('country', p.country)
+  if (typeof p?.min_runs === 'number' && p.min_runs > 0) params.set('min_runs', String(p.min_runs))
+  if (p?.date_from) params.set('date_from', p.date_from)
+  if (p?.podium) params.set('podium', p.podium)
+  if (p?.top) params.set('top', p.top)
+  if (typeof p?.min_p1 === 'number' && p.min_p1 > 0) params.set('min_p1', String(p.min_p1))
+  if (typeof p?.min_p2 === 'number' && p.min_p2 > 0) params.set('min_p2', String(p.min_p2))
+  if (typeof p?.min_p3 === 'number' && p.min_p3 > 0) params.set('min_p3', String(p.min_p3))
+  if (typeof p?.min_top3 === 'number' && p.min_top3 > 0) params.set('min_top3', String(p.min_top3))
+  if (typeof p?.popularity_min === 'number') params.set('popularity_min', String(p.popularity_min))
+  if (typeof p?.popularity_max === 'number') params.set('popularity_max', String(p.popularity_max))
+  if (p?.sort) params.set('sort', p.sort)
+  if (typeof p?.limit === 'number') params.set('limit', String(p.limit))
+  if (p?.cursor) params.set('cursor', p.cursor)
+  const qs = params.toString()
+  return qs ? `?${qs}` : ''
+}
+
+function eventParams(p?: EventFilters): string {
+  const params = new URLSearchParams()
+  if (p?.upcoming) params.set('upcoming', 'true')
+  if (p?.past) params.set('past', 'true')
+  if (p?.date_from) params.set('date_from', p.date_from)
+  if (p?.date_to) params.set('date_to', p.date_to)
+  if (p?.country) params.set('country', p.country)
+  if (p?.sport) params.set('sport', p.sport)
+  if (p?.organizer) params.set('organizer', p.organizer)
+  if (typeof p?.limit === 'number') params.set('limit', String(p.limit))
+  if (p?.cursor) params.set('cursor', p.cursor)
+  const qs = params.toString()
+  return qs ? `?${qs}` : ''
+}
+
+// Every page, for lookups by id across the whole catalogue
+async function allEvents(p?: EventFilters): Promise<Event[]> {
+  const out: Event[] = []
+  let cursor: string | undefined
+  do {
+    const page = await getPage<Event>(`/rundb/events${eventParams({ ...p, limit: 1000, cursor })}`)
+    out.push(...page.items)
+    cursor = page.nextCursor ?? undefined
+  } while (cursor)
+  return out
+}
+
 export const api = {
-  events: (opts?: { upcoming?: boolean }) => get<Event[]>(`/rundb/events${opts?.upcoming ? '?upcoming=true' : ''}`),
+  events: (p?: EventFilters) => get<Event[]>(`/rundb/events${eventParams(p)}`),
+  eventsPage: (p?: EventFilters) => getPage<Event>(`/rundb/events${eventParams(p)}`),
+  allEvents,
   event: (id: string) => get<Event>(`/rundb/events/${id}`),
   eventResults: (id: string) => get<any[]>(`/rundb/events/${id}/results`),
   runners: () => get<Runner[]>(`/rundb/runners`),
   runner: (id: string) => get<Runner>(`/rundb/runners/${id}`),
   runnerResults: (id: string) => get<any[]>(`/rundb/runners/${id}/results`),
   stats: () => get<Stats>(`/rundb/stats`),
-  search: (q: string) => get<SearchItem[]>(`/rundb/search?q=${encodeURIComponent(q)}`),
+  search: (q: string, limit = 10) => get<SearchItem[]>(`/rundb/search?q=${encodeURIComponent(q)}&limit=${limit}`),
   results: (limit = 100) => get<any[]>(`/rundb/results?limit=${limit}`),
   runnerVisit: (id: string) => fetch(`${API_BASE}/rundb/runners/${id}/visit`, { method: 'POST' }).then(r => r.json()),
-  athletes: (p?: {
-    q?: string
-    sex?: 'M'|'F'|''
-    min_runs?: number
-    date_from?: string
-    podium?: '1'|'2'|'3'|'top3'
-    top?: 'popular3'
-    min_p1?: number
-    min_p2?: number
-    min_p3?: number
-    min_top3?: number
-    popularity_min?: number
-    popularity_max?: number
-  }) => {
-    const params = new URLSearchParams()
-    if (p?.q) params.set('q', p.q)
-    if (p?.sex) params.set('sex', p.sex)
-    if (typeof p?.min_runs === 'number' && p.min_runs > 0) params.set('min_runs', String(p.min_runs))
-    if (p?.date_from) params.set('date_from', p.date_from)
-    if (p?.podium) params.set('podium', p.podium)
-    if (p?.top) params.set('top', p.top)
-    if (typeof p?.min_p1 === 'number' && p.min_p1 > 0) params.set('min_p1', String(p.min_p1))
-    if (typeof p?.min_p2 === 'number' && p.min_p2 > 0) params.set('min_p2', String(p.min_p2))
-    if (typeof p?.min_p3 === 'number' && p.min_p3 > 0) params.set('min_p3', String(p.min_p3))
-    if (typeof p?.min_top3 === 'number' && p.min_top3 > 0) params.set('min_top3', String(p.min_top3))
-    if (typeof p?.popularity_min === 'number') params.set('popularity_min', String(p.popularity_min))
-    if (typeof p?.popularity_max === 'number') params.set('popularity_max', String(p.popularity_max))
-    const qs = params.toString()
-    return get<Athlete[]>(`/rundb/athletes${qs ? `?${qs}` : ''}`)
-  },
+  athletes: (p?: AthleteFilters) => get<Athlete[]>(`/rundb/athletes${athleteParams(p)}`),
+  athletesPage: (p?: AthleteFilters) => getPage<Athlete>(`/rundb/athletes${athleteParams(p)}`),
 }
@@ -10,7 +10,7 @@ export default function Competitions() {
   const [tops, setTops] = useState<Record<string, TopRow[]>>({})
   useEffect(() => {
     let mounted = true
-    api.events().then(evs => {
+    api.allEvents().then(evs => {
       if (!mounted) return
       setEvents(evs)
       // fetch top results per event (first 5)
@@ -18,7 +18,7 @@ export default function Home() {
     api.events({ upcoming: true }).then(ev => { if (mounted) setUpcoming(ev) }).catch(()=>{})
     api.athletes({ top: 'popular3' as any, popularity_min: 1 }).then(a => { if (mounted) setPopular(a.slice(0,3)) }).catch(()=>{})
     api.results(50).then(r => { if (mounted) setLatest(r) }).catch(()=>{})
-    api.events().then(all => { if (!mounted) return; const map: Record<string, Event> = {}; all.forEach(e => map[e.id] = e); setEventsById(map) }).catch(()=>{})
+    api.allEvents().then(all => { if (!mounted) return; const map: Record<string, Event> = {}; all.forEach(e => map[e.id] = e); setEventsById(map) }).catch(()=>{})
     return () => { mounted = false }
   }, [])
 
@@ -12,36 +12,34 @@ export default function Leaderboards() {
 
   useEffect(() => {
     let mounted = true
-    const load = () => api.athletes({ sex: sex as any, min_runs: minRuns, top: undefined })
+    // Ranking, country filter and the cut to the top 100 happen server-side
+    const sort = metric === 'most-active' ? 'runs' : metric === 'most-popular' ? 'popularity' : 'name'
+    const load = () => api.athletes({ sex: sex as any, min_runs: minRuns, country, sort, limit: 100 })
       .then(a => { if (mounted) setAthletes(a) })
       .catch(()=>{})
     load()
     return () => { mounted = false }
-  }, [sex, minRuns])
+  }, [sex, minRuns, country, metric])
 
   const countries = useMemo(() => {
     const set = new Set<string>()
     athletes.forEach(a => { if (a.country) set.add(a.country) })
+    if (country) set.add(country)
     return Array.from(set).sort()
-  }, [athletes])
+  }, [athletes, country])
 
   const data = useMemo(() => {
-    let rows = athletes.filter(a => (country ? a.country === country : true))
     if (metric === 'most-active') {
-      return rows
-        .map(a => ({ athlete: a, value: a.run_count || 0, aux: `Runs: ${a.run_count ?? 0}` }))
-        .sort((a,b) => (b.value - a.value))
+      return athletes.map(a => ({ athlete: a, value: a.run_count || 0, aux: `Runs: ${a.run_count ?? 0}` }))
     }
     if (metric === 'most-popular') {
-      return rows
-        .map(a => ({ athlete: a, value: a.popularity || 0, aux: `${'★'.repeat(Math.max(1, a.popularity_star || 1))}` }))
-        .sort((a,b) => (b.value - a.value))
+      return athletes.map(a => ({ athlete: a, value: a.popularity || 0, aux: `${'★'.repeat(Math.max(1, a.popularity_star || 1))}` }))
     }
     // most-viewed
-    return rows
+    return athletes
       .map(a => ({ athlete: a, value: a.visits_count || 0, aux: a.last_visit ? `Last viewed: ${new Date(a.last_visit).toLocaleDateString()}` : '' }))
       .sort((a,b) => (b.value - a.value))
-  }, [athletes, metric, country])
+  }, [athletes, metric])
 
   return (
     <div>
@@ -37,7 +37,7 @@ export default function Results() {
   useEffect(() => {
     let mounted = true
     api.results(100).then(r => { if (mounted) setRows(r) }).catch(()=>{})
-    api.events().then(evs => {
+    api.allEvents().then(evs => {
       if (!mounted) return
       const map: Record<string, Event> = {}
       evs.forEach(e => { map[e.id] = e })
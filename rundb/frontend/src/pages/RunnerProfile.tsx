@@ -20,7 +20,7 @@ export default function RunnerProfile() {
     if (!id) return
     api.runner(id).then(r => { setRunner(r); setVisits((r as any)?.visits_count ?? null) }).catch(()=> setRunner(null))
     api.runnerResults(id).then(setResults).catch(()=>{})
-    api.events().then(evs => {
+    api.allEvents().then(evs => {
       const map: Record<string, APIEvent> = {}
       evs.forEach(e => { map[e.id] = e })
       setEventsById(map)
@@ -1,12 +1,15 @@
-import { useEffect, useMemo, useRef, useState } from 'react'
-import { Link, useNavigate } from 'react-router-dom'
+import { useEffect, useRef, useState } from 'react'
+import { Link, useNavigate, useSearchParams } from 'react-router-dom'
 import Avatar from '../components/Avatar'
 import { api, type Athlete } from '../lib/api'
 
+const PAGE_SIZE = 60
+
 export default function Runners() {
   const navigate = useNavigate()
+  const [searchParams] = useSearchParams()
   const [athletes, setAthletes] = useState<Athlete[]>([])
-  const [q, setQ] = useState('')
+  const [q, setQ] = useState(() => searchParams.get('q') ?? '')
   const [sex, setSex] = useState('')
   const [minRuns, setMinRuns] = useState<number>(0)
   const [dateFrom, setDateFrom] = useState('')
@@ -16,28 +19,43 @@ export default function Runners() {
   const [minTop3, setMinTop3] = useState<number>(0)
   const [podiumOpen, setPodiumOpen] = useState<boolean>(false)
   const [popMin, setPopMin] = useState<number>(1)
+  const [top3, setTop3] = useState<Athlete[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState<boolean>(false)
   const searchRef = useRef<HTMLInputElement>(null)
 
+  const filters = { q, sex: sex as any, min_runs: minRuns, date_from: dateFrom, min_p1: minP1, min_p2: minP2, min_p3: minP3, min_top3: minTop3, popularity_min: popMin }
+
   useEffect(() => {
     let mounted = true
-    const load = () => api.athletes({ q, sex: sex as any, min_runs: minRuns, date_from: dateFrom, min_p1: minP1, min_p2: minP2, min_p3: minP3, min_top3: minTop3, popularity_min: popMin })
-      .then(a => { if (mounted) setAthletes(a) })
-      .catch(()=>{})
+    const load = () => {
+      api.athletesPage({ ...filters, limit: PAGE_SIZE })
+        .then(p => { if (mounted) { setAthletes(p.items); setNextCursor(p.nextCursor) } })
+        .catch(()=>{})
+      api.athletes({ ...filters, top: 'popular3' })
+        .then(a => { if (mounted) setTop3(a) })
+        .catch(()=>{})
+    }
 
     // Debounce search text lightly
     const t = setTimeout(load, q ? 180 : 0)
     return () => { mounted = false; clearTimeout(t) }
   }, [q, sex, minRuns, dateFrom, minP1, minP2, minP3, minTop3, popMin])
 
+  const loadMore = () => {
+    if (!nextCursor || loadingMore) return
+    setLoadingMore(true)
+    api.athletesPage({ ...filters, limit: PAGE_SIZE, cursor: nextCursor })
+      .then(p => { setAthletes(prev => [...prev, ...p.items]); setNextCursor(p.nextCursor) })
+      .catch(()=>{})
+      .finally(() => setLoadingMore(false))
+  }
+
   useEffect(() => {
     // Autofocus search when opening page
     searchRef.current?.focus()
   }, [])
 
-  const top3 = useMemo(() => {
-    return [...athletes].sort((a,b) => (b.popularity || 0) - (a.popularity || 0)).slice(0,3)
-  }, [athletes])
-
   return (
     <div>
       <h2>Athletes</h2>
@@ -196,6 +214,11 @@ export default function Runners() {
           </div>
         ))}
       </div>
+      {nextCursor && (
+        <div className="row" style={{justifyContent:'center', marginTop:16}}>
+          <button className="btn ghost" onClick={loadMore} disabled={loadingMore}>{loadingMore ? 'Loading…' : 'Load more'}</button>
+        </div>
+      )}
     </div>
   )
 }
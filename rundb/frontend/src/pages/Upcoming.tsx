@@ -1,30 +1,59 @@
 import { useEffect, useMemo, useState } from 'react'
-import { Link } from 'react-router-dom'
-import { api, type Event } from '../lib/api'
+import { Link, useSearchParams } from 'react-router-dom'
+import { api, type Event, type EventFilters } from '../lib/api'
 import { formatDateNODayMonth, formatDateDMSlash } from '../lib/format'
 
+const PAGE_SIZE = 60
+
 export default function Upcoming() {
+  const [searchParams] = useSearchParams()
+  const organizer = searchParams.get('organizer') ?? ''
   const [events, setEvents] = useState<Event[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState<boolean>(false)
+  const [types, setTypes] = useState<string[]>([])
   const [type, setType] = useState<string>('')
   const [distBucket, setDistBucket] = useState<string>('')
   const [premiumOnly, setPremiumOnly] = useState<boolean>(false)
   const [q, setQ] = useState<string>('')
   const [month, setMonth] = useState<string>(() => {
+    // Arriving from an organizer in search: all months
+    if (searchParams.get('organizer')) return ''
     const d = new Date();
     const mm = String(d.getMonth()+1).padStart(2,'0')
     return `${d.getFullYear()}-${mm}`
   })
+
+  // Month, type and organizer filter on the server; the rest filter loaded pages
+  const filters: EventFilters = { upcoming: true, sport: type, organizer, limit: PAGE_SIZE }
+  if (/^\d{4}-\d{2}$/.test(month)) {
+    const [y, m] = month.split('-').map(Number)
+    filters.date_from = `${month}-01`
+    filters.date_to = `${month}-${String(new Date(y, m, 0).getDate()).padStart(2,'0')}`
+  }
+
+  const addTypes = (evs: Event[]) => setTypes(prev => {
+    const ts = new Set(prev)
+    evs.forEach(e => { if (e.sport) ts.add(e.sport) })
+    return Array.from(ts).sort()
+  })
+
   useEffect(() => {
     let mounted = true
-    api.events({ upcoming: true }).then(evs => { if (mounted) setEvents(evs) }).catch(()=>{})
+    api.eventsPage(filters)
+      .then(p => { if (mounted) { setEvents(p.items); setNextCursor(p.nextCursor); addTypes(p.items) } })
+      .catch(()=>{})
     return () => { mounted = false }
-  }, [])
+  }, [month, type, organizer])
 
-  const types = useMemo(() => {
-    const ts = new Set<string>()
-    events.forEach(e => { if (e.sport) ts.add(e.sport) })
-    return Array.from(ts).sort()
-  }, [events])
+  const loadMore = () => {
+    if (!nextCursor || loadingMore) return
+    setLoadingMore(true)
+    api.eventsPage({ ...filters, cursor: nextCursor })
+      .then(p => { setEvents(prev => [...prev, ...p.items]); setNextCursor(p.nextCursor); addTypes(p.items) })
+      .catch(()=>{})
+      .finally(() => setLoadingMore(false))
+  }
 
   function bucketForKm(km?: number | null): string {
     if (typeof km !== 'number') return ''
@@ -51,26 +80,19 @@ export default function Upcoming() {
   }
 
   const filtered = useMemo(() => {
-    return events
-      .filter(e => {
-        if (type && (e.sport || '') !== type) return false
-        if (premiumOnly && !e.premium) return false
-        if (distBucket) {
-          const b = bucketForKm(e.distance_km)
-          if (b !== distBucket) return false
-        }
-        if (q) {
-          const hay = `${e.name} ${e.location_city ?? ''} ${e.location_country ?? ''}`.toLowerCase()
-          if (!hay.includes(q.toLowerCase())) return false
-        }
-        if (month && /^\d{4}-\d{2}$/.test(month)) {
-          const ym = `${String(e.date).slice(0,4)}-${String(e.date).slice(5,7)}`
-          if (ym !== month) return false
-        }
-        return true
-      })
-      .sort((a,b) => String(a.date).localeCompare(String(b.date)))
-  }, [events, type, premiumOnly, distBucket, q, month])
+    return events.filter(e => {
+      if (premiumOnly && !e.premium) return false
+      if (distBucket) {
+        const b = bucketForKm(e.distance_km)
+        if (b !== distBucket) return false
+      }
+      if (q) {
+        const hay = `${e.name} ${e.location_city ?? ''} ${e.location_country ?? ''} ${e.organizer ?? ''}`.toLowerCase()
+        if (!hay.includes(q.toLowerCase())) return false
+      }
+      return true
+    })
+  }, [events, premiumOnly, distBucket, q])
   return (
     <div>
       <h2>Upcoming events</h2>
@@ -147,6 +169,11 @@ export default function Upcoming() {
           </div>
         ))}
       </div>
+      {nextCursor && (
+        <div className="row" style={{justifyContent:'center', marginTop:16}}>
+          <button className="btn ghost" onClick={loadMore} disabled={loadingMore}>{loadingMore ? 'Loading…' : 'Load more'}</button>
+        </div>
+      )}
     </div>
   )
 }
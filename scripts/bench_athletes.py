@@ -0,0 +1,222 @@
+"""/rundb/athletes: whole-table GROUP BY + Python filters vs rundb_athlete_stats.
+
+Builds a RunDB database in a temporary directory (--runners, --results),
+then for a set of filter combinations compares what the endpoint used to do
+(aggregate every runner, build every summary, filter and sort in Python)
+with the endpoint as it is now (one indexed query on the summary table per
+page). Following X-Next-Cursor through every page must give exactly the old
+list. It then edits runners and results and checks the summaries follow.
+
+Stars are compared with exact integer rounding; the old code rounded
+``popularity / max * 10`` in floating point, which could give one star too
+many when the ratio was a whole number. Those rows are counted separately.
+
+    python scripts/bench_athletes.py --runners 100000 --results 400000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from rundb.backend import main as rundb  # noqa: E402
+
+CASES = [
+    ("all, by name", {}),
+    ("q=berg", {"q": "berg"}),
+    ("q=østen (non-ASCII)", {"q": "ØSTEN"}),
+    ("sex=F, min_runs=5", {"sex": "f", "min_runs": 5}),
+    ("podium=top3, date_from", {"podium": "top3", "date_from": "2020-01-01"}),
+    ("min_p1=2, min_top3=3", {"min_p1": 2, "min_top3": 3}),
+    ("popularity 2-9 stars", {"popularity_min": 2, "popularity_max": 9}),
+    ("min_runs=1, by runs", {"min_runs": 1, "sort": "runs"}),
+    ("top=popular3", {"top": "popular3", "popularity_min": 1}),
+]
+
+
+def old_athletes(path, q=None, sex=None, min_runs=0, date_from=None, podium=None, top=None,
+                 min_p1=0, min_p2=0, min_p3=0, min_top3=0, popularity_min=None, popularity_max=None, sort=None):
+    """The endpoint before rundb_athlete_stats, star rounding aside."""
+    conn = sqlite3.connect(path)
+    rows = conn.execute('''
+        SELECT r.id, r.name, r.sex, r.date, r.club, r.country, r.avatar_url,
+               COUNT(res.id) as run_count,
+               MAX(res.date) as last_race_date,
+               SUM(CASE WHEN res.finish = 1 THEN 1 ELSE 0 END) as p1,
+               SUM(CASE WHEN res.finish = 2 THEN 1 ELSE 0 END) as p2,
+               SUM(CASE WHEN res.finish = 3 THEN 1 ELSE 0 END) as p3
+        FROM rundb_runners r
+        LEFT JOIN rundb_results res ON res.runner_id = r.id
+        GROUP BY r.id
+        ORDER BY r.name ASC
+    ''').fetchall()
+    conn.close()
+    out = []
+    for r in rows:
+        p1, p2, p3 = int(r[9] or 0), int(r[10] or 0), int(r[11] or 0)
+        run_count = int(r[7] or 0)
+        out.append({
+            'id': r[0], 'name': r[1], 'sex': r[2], 'date': r[3], 'club': r[4], 'country': r[5], 'avatar_url': r[6],
+            'run_count': run_count, 'last_race_date': r[8],
+            'podium_1': p1, 'podium_2': p2, 'podium_3': p3, 'podium_top3': p1 + p2 + p3,
+            'popularity': run_count + p1 * 5 + p2 * 3 + p3 * 2,
+            'popularity_star': 0,
+        })
+    max_pop = max((a['popularity'] for a in out), default=0)
+    float_stars = 0
+    for a in out:
+        a['popularity_star'] = rundb.popularity_star(a['popularity'], max_pop)
+        if max_pop > 0 and max(1, int(math.ceil(a['popularity'] / max_pop * 10))) != a['popularity_star']:
+            float_stars += 1
+    if q:
+        ql = q.strip().lower()
+        out = [a for a in out if f"{a['name']} {a['club'] or ''} {a['country'] or ''}".lower().find(ql) >= 0]
+    if sex:
+        out = [a for a in out if (a['sex'] or '').lower() == sex.strip().lower()]
+    if min_runs > 0:
+        out = [a for a in out if a['run_count'] >= min_runs]
+    if date_from:
+        out = [a for a in out if a['last_race_date'] and str(a['last_race_date']) >= date_from]
+    if podium:
+        out = [a for a in out if a[f'podium_{podium}'] > 0]
+    for key, minimum in (('podium_1', min_p1), ('podium_2', min_p2), ('podium_3', min_p3), ('podium_top3', min_top3)):
+        if minimum > 0:
+            out = [a for a in out if a[key] >= minimum]
+    if popularity_min is not None:
+        out = [a for a in out if a['popularity_star'] >= popularity_min]
+    if popularity_max is not None:
+        out = [a for a in out if a['popularity_star'] <= popularity_max]
+    out = sorted(out, key=lambda a: a['name'])
+    if top == 'popular3':
+        out = sorted(out, key=lambda a: a['popularity'], reverse=True)[:3]
+    elif sort == 'runs':
+        # The old endpoint had no sort parameter; same tie-break as popular3
+        out = sorted(out, key=lambda a: a['run_count'], reverse=True)
+    return out, float_stars
+
+
+def fill(path: str, runners: int, results: int, seed: int):
+    rng = random.Random(seed)
+    first = ["Anna", "Ola", "Kari", "Per", "Sofia", "Jonas", "Eva", "Mikael", "Ingrid", "Lars"]
+    last = ["Berg", "Hansen", "Larsen", "Nilsen", "Johansen", "Østensjø", "Dahl", "Lie", "Moen", "Haugen"]
+    conn = sqlite3.connect(path)
+    conn.executemany('''
+        INSERT INTO rundb_runners (id, name, sex, date, club, country) VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        (f"run-{i}", f"{rng.choice(first)} {rng.choice(last)}", rng.choice("FM") if i % 20 else None,
+         f"19{rng.randint(50, 99)}-01-01", f"{rng.choice(last)} IL" if i % 7 else None, rng.choice(["NOR", "SWE"]))
+        for i in range(runners)
+    ])
+    conn.executemany('''
+        INSERT INTO rundb_results (id, event_id, race_id, runner_id, finish, time_sec, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (f"res-{i}", f"evt-{i % 3000}", None, f"run-{int(rng.paretovariate(1.2)) % runners}" if i % 9 else None,
+         None if i % 31 == 0 else rng.randint(1, 60), 1500 + i % 900, f"{2010 + i % 15}-{1 + i % 12:02d}-01")
+        for i in range(results)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def all_pages(client, params: dict, page_size: int):
+    """Every row for params, following X-Next-Cursor; returns (rows, pages)."""
+    rows, pages, cursor = [], 0, None
+    while True:
+        query = {**params, **({"cursor": cursor} if cursor else {})}
+        if "top" not in params:
+            query["limit"] = page_size
+        response = client.get("/rundb/athletes", params=query)
+        response.raise_for_status()
+        rows += response.json()
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return rows, pages
+
+
+def median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runners", type=int, default=100000)
+    parser.add_argument("--results", type=int, default=400000)
+    parser.add_argument("--page-size", type=int, default=1000, help="page size when following cursors")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rundb-athletes-")
+    rundb.DB_PATH = os.path.join(workdir, "rundb.db")
+    rundb.init_db()
+    fill(rundb.DB_PATH, args.runners, args.results, args.seed)
+
+    started = time.perf_counter()
+    conn = rundb.get_conn()
+    rundb.refresh_athlete_stats(conn)
+    conn.close()
+    report = {
+        "runners": args.runners + 3,
+        "results": args.results + 8,
+        "initial_refresh_seconds": round(time.perf_counter() - started, 3),
+        "cases": [],
+    }
+
+    ok = True
+    with TestClient(rundb.app) as client:
+        for name, params in CASES:
+            expected, float_stars = old_athletes(rundb.DB_PATH, **params)
+            actual, pages = all_pages(client, params, args.page_size)
+            identical = actual == expected
+            ok = ok and identical
+            report["cases"].append({
+                "case": name, "rows": len(expected), "pages": pages, "identical": identical,
+                "old_full_list_ms": median_ms(lambda: old_athletes(rundb.DB_PATH, **params), max(1, args.repeat // 2)),
+                "first_page_ms": median_ms(lambda: client.get("/rundb/athletes", params=params), args.repeat),
+            })
+        report["old_float_star_rows"] = float_stars
+
+        # Edits after the backfill: triggers mark runners, the background refresher rebuilds them
+        conn = sqlite3.connect(rundb.DB_PATH)
+        conn.execute("UPDATE rundb_results SET finish = 1 WHERE id IN ('res-1', 'res-2', 'res-3')")
+        conn.execute("UPDATE rundb_results SET runner_id = 'run-5' WHERE id = 'res-4'")
+        conn.execute("DELETE FROM rundb_results WHERE runner_id = 'run-7'")
+        conn.execute("DELETE FROM rundb_runners WHERE id = 'run-8'")
+        conn.execute("UPDATE rundb_runners SET name = 'Åse Ødegård', club = 'Ærøy IL' WHERE id = 'run-9'")
+        conn.execute("INSERT INTO rundb_runners (id, name, sex) VALUES ('run-new', 'Nina Ny', 'F')")
+        conn.execute('''
+            INSERT INTO rundb_results (id, event_id, runner_id, finish, date) VALUES ('res-new', 'evt-1', 'run-new', 2, '2030-01-01')
+        ''')
+        conn.commit()
+        conn.close()
+        rundb.refresh_derived_tables()
+        checks = []
+        for params in ({}, {"q": "ærøy"}, {"date_from": "2030-01-01"}, {"top": "popular3"}):
+            checks.append(all_pages(client, params, args.page_size)[0] == old_athletes(rundb.DB_PATH, **params)[0])
+        report["maintained_after_edits"] = all(checks)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    return 0 if ok and report["maintained_after_edits"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
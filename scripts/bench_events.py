@@ -0,0 +1,205 @@
+"""/rundb/events: load-everything + Python date parsing vs SQL on start_day.
+
+Builds a RunDB database in a temporary directory (--events, two races each),
+then compares what the endpoint used to do (read every event and race, build
+models, parse date and signup_end per row, filter and sort in Python) with
+the endpoint as it is now (one indexed query per page, races for that page
+only). Following X-Next-Cursor through every page must give exactly the old
+list, filtered the same way where the old endpoint had no such filter.
+
+Order is the one intended difference: rows come by calendar day, then id
+(the old upcoming list sorted by the raw date string and kept table order
+within a day, the old full list had no order), and undated events come last.
+The old lists are sorted that way before comparing.
+
+    python scripts/bench_events.py --events 50000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from rundb.backend import main as rundb  # noqa: E402
+
+TODAY = date.today()
+CASES = [
+    ("all", {}),
+    ("upcoming", {"upcoming": "true"}),
+    ("past", {"past": "true"}),
+    ("upcoming, sport=Trail", {"upcoming": "true", "sport": "Trail"}),
+    ("upcoming, country=SWE", {"upcoming": "true", "country": "SWE"}),
+    ("one month", {"date_from": (TODAY + timedelta(days=30)).isoformat(),
+                   "date_to": (TODAY + timedelta(days=60)).isoformat()}),
+    ("past, country=FIN, sport=Road", {"past": "true", "country": "FIN", "sport": "Road"}),
+    ("organizer", {"organizer": "Organizer 7"}),
+]
+
+
+def old_events(path: str, upcoming=None) -> list:
+    """The endpoint before start_day, models and all."""
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    # Explicit columns: SELECT * would also depend on start_day staying hidden
+    cur.execute(f'SELECT {rundb.EVENT_COLUMNS} FROM rundb_events')
+    events = []
+    for row in cur.fetchall():
+        events.append(rundb.Event(
+            id=row[0], name=row[1], date=row[2], start_time=row[3],
+            location_city=row[4], location_country=row[5], organizer=row[6], homepage=row[7],
+            sport=row[8], level=row[9], signup_begin=row[10], signup_end=row[11], image_url=row[12],
+            premium=bool(row[13] or 0), enrolled_count=row[14] or 0, distance_km=row[15], races=[]
+        ))
+    cur.execute('SELECT id, event_id, name, start_time FROM rundb_event_races')
+    by_event = {}
+    for r in cur.fetchall():
+        er = rundb.EventRace(id=r[0], event_id=r[1], name=r[2], start_time=r[3])
+        by_event.setdefault(er.event_id, []).append(er)
+    for e in events:
+        e.races = by_event.get(e.id, [])
+    conn.close()
+    if upcoming:
+        today = datetime.now().date()
+
+        def is_up(e):
+            try:
+                date_ok = datetime.fromisoformat(e.date).date() >= today
+            except Exception:
+                date_ok = True
+            signup_ok = False
+            if e.signup_end:
+                try:
+                    signup_ok = datetime.fromisoformat(e.signup_end).date() >= today
+                except Exception:
+                    signup_ok = False
+            return date_ok or signup_ok
+        events = [e for e in events if is_up(e)]
+        events.sort(key=lambda x: x.date)
+    return [e.model_dump() for e in events]
+
+
+def day(event: dict):
+    try:
+        return datetime.fromisoformat(event['date']).date().isoformat()
+    except ValueError:
+        return None
+
+
+def expected(path: str, params: dict) -> list:
+    """The old list, filtered and ordered the way the new endpoint defines."""
+    events = old_events(path, upcoming=params.get('upcoming') == 'true')
+    today = TODAY.isoformat()
+    keep = [e for e in events if (not params.get('past') or (day(e) is not None and day(e) < today))
+            and all(e[field] == params[key] for key, field in (('country', 'location_country'), ('sport', 'sport'),
+                                                             ('organizer', 'organizer')) if key in params)
+            and ('date_from' not in params or (day(e) or '') >= params['date_from'])
+            and ('date_to' not in params or (day(e) is not None and day(e) <= params['date_to']))]
+    if params.get('past'):
+        return sorted(keep, key=lambda e: (day(e), e['id']), reverse=True)
+    # Open signup on an earlier day leads the upcoming list; undated events trail every list
+    return sorted(keep, key=lambda e: (day(e) is None, day(e) or '', e['id']))
+
+
+def fill(path: str, events: int, seed: int):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(events):
+        start = TODAY + timedelta(days=rng.randint(-3650, 365))
+        when = start.isoformat() if i % 3 else f"{start.isoformat()}T{rng.randint(6, 20):02d}:00:00"
+        if i % 997 == 0:
+            when = "TBA"
+        signup_end = (start + timedelta(days=rng.choice([-7, -1, 400]))).isoformat() if i % 5 == 0 else None
+        rows.append((f"evt-{i}", f"Event {i}", when, rng.choice(["NOR", "SWE", "FIN"]), f"Organizer {i % 50}",
+                     rng.choice(["Road", "Trail", "Terrengløp"]), signup_end, rng.randint(0, 500)))
+    conn = sqlite3.connect(path)
+    conn.executemany('''
+        INSERT INTO rundb_events (id, name, date, location_country, organizer, sport, signup_end, enrolled_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.executemany("INSERT INTO rundb_event_races (id, event_id, name) VALUES (?, ?, ?)", [
+        (f"race-{i}-{k}", f"evt-{i}", f"Race {k}") for i in range(events) for k in range(2)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def all_pages(client, params: dict, page_size: int):
+    """Every row for params, following X-Next-Cursor; returns (rows, pages)."""
+    rows, pages, cursor = [], 0, None
+    while True:
+        response = client.get("/rundb/events", params={**params, "limit": page_size, **({"cursor": cursor} if cursor else {})})
+        response.raise_for_status()
+        rows += response.json()
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return rows, pages
+
+
+def median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--page-size", type=int, default=1000, help="page size when following cursors")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rundb-events-")
+    rundb.DB_PATH = os.path.join(workdir, "rundb.db")
+    rundb.init_db()
+    fill(rundb.DB_PATH, args.events, args.seed)
+    report = {"events": args.events + 2, "cases": []}
+
+    ok = True
+    with TestClient(rundb.app) as client:
+        for name, params in CASES:
+            want = expected(rundb.DB_PATH, params)
+            actual, pages = all_pages(client, params, args.page_size)
+            identical = actual == want
+            ok = ok and identical
+            report["cases"].append({
+                "case": name, "rows": len(want), "pages": pages, "identical": identical,
+                "old_ms": median_ms(lambda: old_events(rundb.DB_PATH, upcoming=params.get("upcoming") == "true"),
+                                    max(1, args.repeat // 2)),
+                "first_page_ms": median_ms(lambda: client.get("/rundb/events", params=params), args.repeat),
+            })
+
+        # Rows written after the migration get their days from SQLite too
+        conn = sqlite3.connect(rundb.DB_PATH)
+        conn.execute("UPDATE rundb_events SET date = ? WHERE id = 'evt-1'", ((TODAY + timedelta(days=1)).isoformat(),))
+        conn.execute("UPDATE rundb_events SET signup_end = ?, date = '2001-01-01' WHERE id = 'evt-2'",
+                     ((TODAY + timedelta(days=3)).isoformat() + "T12:00:00",))
+        conn.execute("INSERT INTO rundb_events (id, name, date) VALUES ('evt-new', 'New', ?)", (TODAY.isoformat(),))
+        conn.commit()
+        conn.close()
+        upcoming = [e["id"] for e in all_pages(client, {"upcoming": "true"}, args.page_size)[0]]
+        report["maintained_after_edits"] = upcoming[0] == "evt-2" and {"evt-1", "evt-new"} <= set(upcoming) and \
+            upcoming == [e["id"] for e in expected(rundb.DB_PATH, {"upcoming": "true"})]
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    return 0 if ok and report["maintained_after_edits"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
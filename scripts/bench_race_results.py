@@ -0,0 +1,184 @@
+"""Race result pages: correlated participants_total subquery vs rundb_race_stats.
+
+Builds a RunDB database in a temporary directory with one large race
+(--finishers results, some DNFs) plus smaller races, then for the three
+result endpoints compares the query they used to run (a COUNT/MAX subquery
+on rundb_results for every returned row) with the endpoint as it is now
+(a join against the precomputed per-race stats). It checks both return the
+same rows, then edits and deletes results and checks the stats follow.
+
+    python scripts/bench_race_results.py --finishers 5000
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from rundb.backend import main as rundb  # noqa: E402
+
+RESULT_COLUMNS = '''r.id, r.event_id, r.race_id, r.runner_id, r.finish, r.bib_number, r.name, r.nation, r.club,
+               r.class, r.time, r.time_sec, r.behind, r.date'''
+
+OLD_EVENT_RESULTS = f'''
+    SELECT {RESULT_COLUMNS},
+           (
+             SELECT CASE
+                 WHEN MAX(CASE WHEN rr.finish IS NOT NULL THEN rr.finish END) IS NOT NULL
+                   THEN MAX(CASE WHEN rr.finish IS NOT NULL THEN rr.finish END)
+                 ELSE COUNT(*)
+             END
+             FROM rundb_results rr
+             WHERE rr.event_id = r.event_id
+               AND ((rr.race_id IS NULL AND r.race_id IS NULL) OR rr.race_id = r.race_id)
+           ) as participants_total
+    FROM rundb_results r
+    WHERE r.event_id = ?
+    ORDER BY CASE WHEN r.finish IS NULL THEN 99999 ELSE r.finish END ASC, r.time_sec ASC
+'''
+
+OLD_COUNT = '''
+           (
+             SELECT COUNT(*) FROM rundb_results rr
+             WHERE rr.event_id = r.event_id
+               AND ((rr.race_id IS NULL AND r.race_id IS NULL) OR rr.race_id = r.race_id)
+           ) as participants_total'''
+
+OLD_LATEST_RESULTS = f'''
+    SELECT {RESULT_COLUMNS},{OLD_COUNT}
+    FROM rundb_results r
+    ORDER BY r.date DESC, CASE WHEN r.finish IS NULL THEN 99999 ELSE r.finish END ASC
+    LIMIT ?
+'''
+
+OLD_RUNNER_RESULTS = f'''
+    SELECT {RESULT_COLUMNS},{OLD_COUNT}
+    FROM rundb_results r
+    WHERE r.runner_id = ?
+    ORDER BY r.date DESC, CASE WHEN r.finish IS NULL THEN 99999 ELSE r.finish END ASC
+'''
+
+
+def fill(path: str, finishers: int, small_races: int):
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO rundb_events (id, name, date) VALUES ('evt-big', 'Big city marathon', '2025-10-01')")
+    conn.execute("INSERT INTO rundb_event_races (id, event_id, name) VALUES ('race-big', 'evt-big', 'Marathon')")
+    conn.executemany("INSERT INTO rundb_runners (id, name, country) VALUES (?, ?, 'NOR')", [
+        (f"br{i}", f"Runner {i}") for i in range(finishers)
+    ])
+    rows = []
+    for i in range(finishers):
+        dnf = i % 50 == 49
+        rows.append((f"big{i}", "evt-big", "race-big", f"br{i}", None if dnf else i + 1, str(i), f"Runner {i}",
+                     None if dnf else 8000 + i * 3, "2025-10-01"))
+    # Small races, half of them without a race_id
+    for race in range(small_races):
+        event_id = f"evt-s{race}"
+        conn.execute("INSERT INTO rundb_events (id, name, date) VALUES (?, ?, '2025-06-01')", (event_id, f"Small {race}"))
+        for i in range(20):
+            rows.append((f"s{race}-{i}", event_id, f"race-s{race}" if race % 2 else None, f"br{(race * 20 + i) % finishers}",
+                         i + 1, str(i), f"Runner {i}", 1200 + i * 10, "2025-06-01"))
+    started = time.perf_counter()
+    conn.executemany('''
+        INSERT INTO rundb_results (id, event_id, race_id, runner_id, finish, bib_number, name, time_sec, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+    return len(rows), time.perf_counter() - started
+
+
+def median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def old_rows(sql: str, params: tuple) -> list:
+    conn = sqlite3.connect(rundb.DB_PATH)
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+    return [rundb.result_row(r) for r in rows]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--finishers", type=int, default=5000)
+    parser.add_argument("--small-races", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rundb-race-stats-")
+    rundb.DB_PATH = os.path.join(workdir, "rundb.db")
+    rundb.init_db()
+    inserted, insert_seconds = fill(rundb.DB_PATH, args.finishers, args.small_races)
+
+    started = time.perf_counter()
+    refresh_conn = rundb.get_conn()
+    rundb.refresh_race_stats(refresh_conn)
+    refresh_conn.close()
+    refresh_seconds = time.perf_counter() - started
+
+    cases = [
+        ("GET /rundb/events/{id}/results (big race)", OLD_EVENT_RESULTS, ("evt-big",),
+         lambda: rundb.event_results("evt-big")),
+        ("GET /rundb/results?limit=1000", OLD_LATEST_RESULTS, (1000,), lambda: rundb.latest_results(1000)),
+        ("GET /rundb/runners/{id}/results", OLD_RUNNER_RESULTS, ("br7",), lambda: rundb.runner_results("br7")),
+    ]
+    report = {
+        "results": inserted,
+        "insert_seconds": round(insert_seconds, 3),
+        "initial_refresh_seconds": round(refresh_seconds, 3),
+        "endpoints": [],
+    }
+    for name, sql, params, endpoint in cases:
+        identical = old_rows(sql, params) == json.loads(endpoint().body)
+        old_ms = median_ms(lambda: old_rows(sql, params), max(1, args.repeat // 5) if "big" in name else args.repeat)
+        new_ms = median_ms(endpoint, args.repeat)
+        report["endpoints"].append({
+            "endpoint": name, "identical": identical, "subquery_ms": old_ms, "race_stats_ms": new_ms,
+            "speedup": round(old_ms / new_ms, 1) if new_ms else None,
+        })
+
+    # Edits after the initial refresh: the triggers mark races, the background refresher recomputes them
+    conn = sqlite3.connect(rundb.DB_PATH)
+    conn.execute("UPDATE rundb_results SET finish = NULL, time_sec = NULL WHERE id = 'big0'")
+    conn.execute("DELETE FROM rundb_results WHERE event_id = 'evt-s0'")
+    conn.execute("UPDATE rundb_results SET race_id = 'race-big', event_id = 'evt-big' WHERE id = 's1-0'")
+    conn.commit()
+    conn.close()
+    rundb.refresh_derived_tables()
+    checks = []
+    for event_id in ("evt-big", "evt-s0", "evt-s1"):
+        expected = {}
+        conn = sqlite3.connect(rundb.DB_PATH)
+        for race_key, in conn.execute(
+            "SELECT DISTINCT COALESCE(race_id, '') FROM rundb_results WHERE event_id = ?", (event_id,)
+        ):
+            expected[race_key] = rundb.compute_race_stats(conn.cursor(), event_id, race_key)
+        conn.close()
+        actual = {(s["race_id"] or ""): s for s in json.loads(rundb.event_race_stats(event_id).body)}
+        checks.append(set(actual) == set(expected) and all(
+            (s["participants"], s["max_finish"], s["winner_time_sec"], s["median_time_sec"], s["dnf_count"])
+            == expected[key][2:] for key, s in actual.items()
+        ))
+    report["maintained_after_edits"] = all(checks)
+    report["big_race_stats"] = json.loads(rundb.event_race_stats("evt-big").body)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    return 0 if report["maintained_after_edits"] and all(e["identical"] for e in report["endpoints"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
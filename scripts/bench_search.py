@@ -0,0 +1,214 @@
+"""/rundb/search: two LIKE '%q%' scans vs the folded trigram index.
+
+Builds a RunDB database in a temporary directory (--runners, --events,
+--results), then for a set of typeahead queries compares what the endpoint
+used to do (scan every event and runner name, return every match) with the
+first page of the endpoint as it is now. Following X-Next-Cursor through
+every page must return exactly the items a plain Python scan over the folded
+names finds, each once, tier by tier and most popular first within a tier.
+It then renames, deletes and adds rows and checks the index follows.
+
+The old search is not diacritic-aware, so its row counts are only there to
+show what it missed; "ostensjo" should find "Østensjø" now.
+
+    python scripts/bench_search.py --runners 100000 --events 20000 --results 400000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from rundb.backend import main as rundb  # noqa: E402
+
+QUERIES = ["a", "an", "ber", "Berg", "ostensjo", "lopet", "BÆR", "anna berg", "berg anna", "østensjø il",
+           "sentrumlopet 2003", "ola h", "nordmarka 20", "zzz"]
+SURNAMES = ["Berg", "Hansen", "Larsen", "Nilsen", "Johansen", "Østensjø", "Dahl", "Lie", "Moen", "Haugen"]
+PLACES = ["Østensjø", "Holmenkollen", "Bærum", "Sentrum", "Nordmarka", "Sognsvann", "Tromsø"]
+
+
+def old_search(path: str, q: str) -> list:
+    """The endpoint before the search index."""
+    like = f"%{q.strip()}%"
+    conn = sqlite3.connect(path)
+    evs = [('event', row[0]) for row in conn.execute('SELECT id, name FROM rundb_events WHERE name LIKE ?', (like,))]
+    runs = [('runner', row[0]) for row in conn.execute('SELECT id, name FROM rundb_runners WHERE name LIKE ?', (like,))]
+    conn.close()
+    return evs + runs
+
+
+def fill(path: str, runners: int, events: int, results: int, seed: int):
+    rng = random.Random(seed)
+    first = ["Anna", "Ola", "Kari", "Per", "Sofia", "Jonas", "Eva", "Mikael", "Ingrid", "Lars"]
+    conn = sqlite3.connect(path)
+    conn.executemany('INSERT INTO rundb_runners (id, name, sex, club, country) VALUES (?, ?, ?, ?, ?)', [
+        (f"run-{i}", f"{rng.choice(first)} {rng.choice(SURNAMES)}", rng.choice("FM"),
+         f"{rng.choice(SURNAMES + PLACES)} IL" if i % 7 else None, "NOR")
+        for i in range(runners)
+    ])
+    conn.executemany('INSERT INTO rundb_events (id, name, date, organizer, enrolled_count) VALUES (?, ?, ?, ?, ?)', [
+        (f"evt-{i}", f"{rng.choice(PLACES)}løpet {2000 + i % 26}", f"{2000 + i % 26}-06-01",
+         f"{rng.choice(PLACES)} IL", rng.randint(0, 500))
+        for i in range(events)
+    ])
+    conn.executemany('''
+        INSERT INTO rundb_results (id, event_id, runner_id, club, finish, date) VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        (f"res-{i}", f"evt-{i % events}", f"run-{int(rng.paretovariate(1.2)) % runners}",
+         f"{rng.choice(SURNAMES)} IL" if i % 5 == 0 else None, rng.randint(1, 60), "2020-06-01")
+        for i in range(results)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def searchable(path: str) -> dict:
+    """(kind, ref_id) -> name for everything the index should hold."""
+    conn = sqlite3.connect(path)
+    items = {('runner', i): n for i, n in conn.execute('SELECT id, name FROM rundb_runners')}
+    items.update({('event', i): n for i, n in conn.execute('SELECT id, name FROM rundb_events')})
+    for (club,) in conn.execute('''
+        SELECT club FROM rundb_runners WHERE club IS NOT NULL UNION SELECT club FROM rundb_results WHERE club IS NOT NULL
+    '''):
+        items[('club', club)] = club
+    for (organizer,) in conn.execute('SELECT DISTINCT organizer FROM rundb_events WHERE organizer IS NOT NULL'):
+        items[('organizer', organizer)] = organizer
+    conn.close()
+    return items
+
+
+def tier(folded_name: str, q: str):
+    """Which tier of search(q) a name lands in, or None; mirrors search_tiers."""
+    words = q.split(' ')
+    padded = ' ' + folded_name
+    if folded_name == q:
+        return 0
+    if folded_name.startswith(q):
+        return 1
+    all_start = all(' ' + w in padded for w in words)
+    if any(len(w) >= 2 for w in words) and all_start:
+        return 2
+    long_words = [w for w in words if len(w) >= 3]
+    if long_words and not all_start and all(w in folded_name if len(w) >= 3 else ' ' + w in padded for w in words):
+        return 3
+    return None
+
+
+def all_pages(client, q: str, limit: int) -> list:
+    rows, cursor = [], None
+    while True:
+        response = client.get("/rundb/search", params={"q": q, "limit": limit, **({"cursor": cursor} if cursor else {})})
+        response.raise_for_status()
+        rows += [(item["type"], item["id"]) for item in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return rows
+
+
+def matches_scan(client, path: str, q: str, limit: int) -> bool:
+    """All pages of search(q) against a scan of every name, order included."""
+    names = searchable(path)
+    folded = rundb.fold(q)
+    expected = {key: tier(rundb.fold(name), folded) for key, name in names.items()}
+    expected = {key: t for key, t in expected.items() if t is not None}
+    rows = all_pages(client, q, limit)
+    if len(rows) != len(set(rows)) or set(rows) != set(expected):
+        return False
+    conn = sqlite3.connect(path)
+    popularity = {(k, r): p for k, r, p in conn.execute('SELECT kind, ref_id, popularity FROM rundb_search_items')}
+    conn.close()
+    ranks = [(expected[key], -popularity[key]) for key in rows]
+    return ranks == sorted(ranks)
+
+
+def median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runners", type=int, default=100000)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--results", type=int, default=400000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rundb-search-")
+    rundb.DB_PATH = os.path.join(workdir, "rundb.db")
+    rundb.init_db()
+    fill(rundb.DB_PATH, args.runners, args.events, args.results, args.seed)
+
+    started = time.perf_counter()
+    conn = rundb.get_conn()
+    rundb.refresh_athlete_stats(conn)
+    rundb.refresh_search_index(conn)
+    items = conn.execute('SELECT COUNT(*) FROM rundb_search_items').fetchone()[0]
+    conn.close()
+    report = {"items": items, "initial_refresh_seconds": round(time.perf_counter() - started, 3), "cases": []}
+
+    ok = True
+    with TestClient(rundb.app) as client:
+        for q in QUERIES:
+            first_page = client.get("/rundb/search", params={"q": q, "limit": args.limit}).json()
+            report["cases"].append({
+                "q": q,
+                "old_rows": len(old_search(rundb.DB_PATH, q)),
+                "old_ms": median_ms(lambda: old_search(rundb.DB_PATH, q), args.repeat),
+                "first_page_ms": median_ms(lambda: client.get("/rundb/search", params={"q": q, "limit": args.limit}),
+                                           args.repeat),
+                "top": [item["label"] for item in first_page[:3]],
+            })
+        # Following cursors to the end is slow for broad queries; check the selective ones
+        for q in ("ostensjo", "lopet 2003", "berg anna", "østensjø il", "ola h", "nordmarka 20"):
+            same = matches_scan(client, rundb.DB_PATH, q, 50)
+            ok = ok and same
+            report.setdefault("matches_scan", {})[q] = same
+        labels = [item["label"] for item in client.get("/rundb/search", params={"q": "ostensjo", "limit": 50}).json()]
+        report["folding"] = any("Østensjø" in label for label in labels) and any(
+            "løpet" in item["label"] for item in client.get("/rundb/search", params={"q": "lopet"}).json())
+        ok = ok and report["folding"]
+
+        # Edits after the backfill: triggers mark items, the background refresher reindexes them
+        deleted_name = searchable(rundb.DB_PATH)[("event", "evt-3")]
+        conn = sqlite3.connect(rundb.DB_PATH)
+        conn.execute("UPDATE rundb_runners SET name = 'Åse Ødegård', club = 'Ærøy IL' WHERE id = 'run-1'")
+        conn.execute("UPDATE rundb_events SET name = 'Ødegårdstafetten' WHERE id = 'evt-2'")
+        conn.execute("DELETE FROM rundb_events WHERE id = 'evt-3'")
+        conn.execute("INSERT INTO rundb_runners (id, name) VALUES ('run-new', 'Ødegård Ny')")
+        conn.executemany("INSERT INTO rundb_results (id, event_id, runner_id, finish, date) VALUES (?, 'evt-2', 'run-new', 1, '2030-01-01')",
+                         [(f"res-new-{i}",) for i in range(500)])
+        conn.commit()
+        conn.close()
+        rundb.refresh_derived_tables()
+        top = [(item["type"], item["id"]) for item in client.get("/rundb/search", params={"q": "odegard"}).json()]
+        checks = [
+            top[:1] == [("runner", "run-new")],
+            ("club", "Ærøy IL") in all_pages(client, "aeroy", 50),
+            ("event", "evt-3") not in all_pages(client, deleted_name, 50),
+        ] + [matches_scan(client, rundb.DB_PATH, q, 50) for q in ("odegard", "aeroy il", "ostensjo")]
+        report["maintained_after_edits"] = all(checks)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if ok and report["maintained_after_edits"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
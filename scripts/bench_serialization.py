@@ -0,0 +1,222 @@
+"""Serialization benchmark for the list endpoints.
+
+Fills fresh chat and RunDB databases in a temporary directory, then for each
+list endpoint times (a) the model path these endpoints used to take (build a
+Pydantic model per row, validate against the response model if any, run
+``jsonable_encoder`` and render a JSONResponse) against (b) the fast path
+they take now (rows to dicts, one FastJSONResponse render), on the same
+rows. It checks that both produce identical bytes and also reports the full
+request latency through the app.
+
+    python scripts/bench_serialization.py --rows 5000 --repeat 20
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, ROOT)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+import serialization  # noqa: E402
+
+
+def best_ms(fn: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def fill_chat(path: str, rows: int):
+    conn = sqlite3.connect(path)
+    start = datetime(2025, 1, 1)
+    conn.executemany("INSERT INTO users (id, username, is_online, last_seen) VALUES (?, ?, 0, ?)", [
+        (f"u{i}", f"user{i}", (start + timedelta(minutes=i)).isoformat()) for i in range(rows)
+    ])
+    conn.executemany("INSERT OR IGNORE INTO channels (id, name, description, created_by) VALUES (?, ?, ?, 'system')", [
+        (f"bench-{i}", f"Bench {i}", "Benchmark channel") for i in range(200)
+    ])
+    conn.executemany('''
+        INSERT INTO messages (id, text, sender_id, sender_username, channel_id, timestamp, message_type, seq)
+        VALUES (?, ?, ?, ?, 'bench-0', ?, 'text', ?)
+    ''', [
+        (f"m{i}", f"message number {i} with some text ✓", f"u{i % 50}", f"user{i % 50}",
+         (start + timedelta(seconds=i)).isoformat(), i + 1) for i in range(rows)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def fill_rundb(path: str, rows: int):
+    conn = sqlite3.connect(path)
+    runners = rows // 10
+    conn.executemany("INSERT INTO rundb_runners (id, name, sex, date, club, country) VALUES (?, ?, ?, ?, ?, 'NOR')", [
+        (f"br{i}", f"Runner {i}", "FM"[i % 2], "1990-01-01", f"Club {i % 40}") for i in range(runners)
+    ])
+    conn.execute("INSERT INTO rundb_events (id, name, date) VALUES ('evt-bench', 'Bench event', '2025-06-01')")
+    conn.executemany('''
+        INSERT INTO rundb_results (id, event_id, race_id, runner_id, finish, bib_number, name, nation, club, class,
+                                   time, time_sec, behind, date)
+        VALUES (?, 'evt-bench', NULL, ?, ?, ?, ?, 'NOR', ?, 'M Senior', ?, ?, NULL, ?)
+    ''', [
+        (f"bres{i}", f"br{i % runners}", i % 300 + 1, str(i), f"Runner {i % runners}", f"Club {i % 40}",
+         f"{30 + i % 20}:00", 1800 + i % 1200, f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}")
+        for i in range(rows)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def compare(name: str, model_path: Callable[[], bytes], fast_path: Callable[[], bytes],
+            client: TestClient, url: str, repeat: int) -> dict:
+    model_bytes, fast_bytes = model_path(), fast_path()
+    response = client.get(url)
+    return {
+        "endpoint": name,
+        "rows": len(json.loads(fast_bytes)),
+        "identical": model_bytes == fast_bytes == response.content,
+        "model_path_ms": best_ms(model_path, repeat),
+        "fast_path_ms": best_ms(fast_path, repeat),
+        "request_ms": best_ms(lambda: client.get(url), repeat),
+    }
+
+
+def render_models(models: List, adapter: TypeAdapter = None) -> bytes:
+    if adapter is not None:
+        models = adapter.validate_python(models)
+    return JSONResponse(jsonable_encoder(models)).body
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="chat-serialization-")
+    os.chdir(workdir)
+    import main as chat  # noqa: E402  (creates chat_app.db in the working directory)
+    from rundb.backend import main as rundb  # noqa: E402
+
+    rundb.DB_PATH = os.path.join(workdir, "rundb.db")
+    rundb.init_db()
+    fill_chat(chat.DATABASE_URL, args.rows)
+    fill_rundb(rundb.DB_PATH, args.rows)
+
+    report = {"encoder": "orjson" if serialization.orjson is not None else "json", "rows": args.rows, "endpoints": []}
+    conn = sqlite3.connect(chat.DATABASE_URL)
+    with TestClient(chat.app) as client:
+        user_rows = conn.execute("SELECT id, username, last_seen FROM users").fetchall()
+        channel_rows = conn.execute('''
+            SELECT c.id, c.name, c.description, c.created_by, c.created_at, c.is_private,
+                   COALESCE(s.message_count, 0), s.last_message_at, COALESCE(s.last_seq, 0)
+            FROM channels c LEFT JOIN channel_stats s ON s.channel_id = c.id
+        ''').fetchall()
+        page = chat.MAX_MESSAGE_PAGE_SIZE
+        message_rows = conn.execute('''
+            SELECT id, text, sender_id, sender_username, channel_id, timestamp, message_type, seq
+            FROM messages WHERE channel_id = 'bench-0' AND seq < ? ORDER BY seq DESC LIMIT ?
+        ''', (args.rows - chat.recent_messages.per_channel, page)).fetchall()[::-1]
+        # Below the recent-message window, so requests reach SQLite
+        before = chat.encode_message_cursor(args.rows - chat.recent_messages.per_channel)
+
+        def users_model():
+            return render_models([chat.User(
+                id=r[0], username=r[1], is_online=chat.presence.is_online(r[0]),
+                last_seen=chat.presence.last_seen(r[0]) or datetime.fromisoformat(r[2]),
+            ) for r in user_rows])
+
+        def users_fast():
+            return serialization.dumps([{
+                "id": r[0], "username": r[1], "is_online": chat.presence.is_online(r[0]),
+                "last_seen": serialization.iso_timestamp(chat.presence.last_seen(r[0]) or r[2]),
+            } for r in user_rows])
+
+        def channels_model():
+            return render_models([chat.Channel(
+                id=r[0], name=r[1], description=r[2], created_by=r[3], created_at=datetime.fromisoformat(r[4]),
+                is_private=bool(r[5]), member_count=len(chat.manager.get_subscribers(r[0])), message_count=r[6],
+                last_message_at=datetime.fromisoformat(r[7]) if r[7] else None, last_seq=r[8],
+            ) for r in channel_rows])
+
+        def channels_fast():
+            return serialization.dumps([{
+                "id": r[0], "name": r[1], "description": r[2], "created_by": r[3],
+                "created_at": serialization.iso_timestamp(r[4]), "is_private": bool(r[5]),
+                "member_count": len(chat.manager.get_subscribers(r[0])), "message_count": r[6],
+                "last_message_at": serialization.iso_timestamp(r[7]) if r[7] else None, "last_seq": r[8],
+            } for r in channel_rows])
+
+        def messages_model():
+            return render_models([chat.Message(
+                id=r[0], text=r[1], sender_id=r[2], sender_username=r[3], channel_id=r[4],
+                timestamp=datetime.fromisoformat(r[5]), message_type=r[6], seq=r[7],
+            ) for r in message_rows])
+
+        def messages_fast():
+            return serialization.dumps([chat.row_to_message(r) for r in message_rows])
+
+        report["endpoints"].append(compare("GET /api/users", users_model, users_fast, client, "/api/users", args.repeat))
+        report["endpoints"].append(compare("GET /api/channels", channels_model, channels_fast, client,
+                                           "/api/channels", args.repeat))
+        report["endpoints"].append(compare("GET /api/channels/{id}/messages (SQLite page)", messages_model,
+                                           messages_fast, client,
+                                           f"/api/channels/bench-0/messages?limit={page}&before={before}",
+                                           args.repeat))
+    conn.close()
+
+    result_adapter = TypeAdapter(List[rundb.ResultRow])
+    with TestClient(rundb.app) as client:
+        for name, url, fetch in (
+            ("GET /rundb/events/{id}/results", "/rundb/events/evt-bench/results",
+             lambda: rundb.event_results("evt-bench")),
+            ("GET /rundb/results", "/rundb/results?limit=1000", lambda: rundb.latest_results(1000)),
+        ):
+            rows = [tuple(r.values()) for r in json.loads(fetch().body)]
+
+            def results_model(rows=rows):
+                return render_models([rundb.ResultRow(
+                    id=r[0], event_id=r[1], race_id=r[2], runner_id=r[3], finish=r[4], bib_number=r[5],
+                    name=r[6], nation=r[7], club=r[8], class_field=r[9], time=r[10], time_sec=r[11],
+                    behind=r[12], date=r[13], participants_total=r[14],
+                ) for r in rows], result_adapter)
+
+            def results_fast(rows=rows):
+                return serialization.dumps([rundb.result_row(r) for r in rows])
+
+            report["endpoints"].append(compare(name, results_model, results_fast, client, url, args.repeat))
+
+        athlete_adapter = TypeAdapter(List[rundb.AthleteSummary])
+        athletes = json.loads(rundb.athletes().body)
+        report["endpoints"].append(compare(
+            "GET /rundb/athletes",
+            lambda: render_models([rundb.AthleteSummary(**a) for a in athletes], athlete_adapter),
+            lambda: serialization.dumps([dict(a) for a in athletes]),
+            client, "/rundb/athletes", args.repeat,
+        ))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    for entry in report["endpoints"]:
+        entry["speedup"] = round(entry["model_path_ms"] / entry["fast_path_ms"], 1) if entry["fast_path_ms"] else None
+    print(json.dumps(report, indent=2))
+    return 0 if all(e["identical"] for e in report["endpoints"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
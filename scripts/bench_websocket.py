@@ -0,0 +1,346 @@
+"""WebSocket load benchmark for the chat server.
+
+Starts the backend with uvicorn against a fresh database in a temporary
+directory (or targets --url), connects --clients simulated users spread over
+--channels channels, and drives Poisson message and typing traffic at the
+given aggregate rates. Prints one JSON document with ingest throughput,
+end-to-end fan-out and ack latency percentiles, and the server's CPU and
+RSS, so runs on different commits can be diffed.
+
+    python scripts/bench_websocket.py --clients 2000 --channels 100 \\
+        --message-rate 500 --typing-rate 200 --duration 30 --output bench.json
+
+Server settings (CHAT_*, WS_*) are taken from the environment. Latencies are
+measured with this process's clock: each message carries its send time in
+its text and a client_msg_id that the server echoes in the ack.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import websockets
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BACKEND_DIR = os.path.join(ROOT, "backend")
+BENCH_PREFIX = "bench:"
+
+
+class Stats:
+    def __init__(self):
+        self.measure_start = float("inf")
+        self.measure_end = float("inf")
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.delivered = 0
+        self.typing_sent = 0
+        self.typing_received = 0
+        self.closed = {}
+        self.fanout_ms: List[float] = []
+        self.ack_ms: List[float] = []
+
+    def measuring(self, sent_at: float) -> bool:
+        return self.measure_start <= sent_at < self.measure_end
+
+
+class BenchClient:
+    def __init__(self, index: int, channel_id: str, base_url: str, stats: Stats):
+        self.user_id = f"bench-{index}"
+        self.channel_id = channel_id
+        self.url = f"{base_url}/ws/{self.user_id}?channels={channel_id}"
+        self.stats = stats
+        self.ws = None
+        self.counter = 0
+        self.pending: Dict[str, float] = {}
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.url, max_queue=None, open_timeout=60)
+
+    async def receive(self):
+        stats = self.stats
+        try:
+            async for raw in self.ws:
+                now = time.perf_counter()
+                frame = json.loads(raw)
+                kind = frame.get("type")
+                if kind == "new_message":
+                    text = frame["message"]["text"]
+                    if text.startswith(BENCH_PREFIX):
+                        sent_at = float(text.split(":", 2)[1])
+                        if stats.measuring(sent_at):
+                            stats.delivered += 1
+                            stats.fanout_ms.append((now - sent_at) * 1000)
+                elif kind == "rate_limited":
+                    sent_at = self.pending.pop(frame.get("client_msg_id"), None)
+                    if sent_at is not None and stats.measuring(sent_at):
+                        stats.rate_limited += 1
+                elif kind in ("message_sent", "message_error"):
+                    sent_at = self.pending.pop(frame.get("client_msg_id"), None)
+                    if sent_at is not None and stats.measuring(sent_at):
+                        if kind == "message_sent":
+                            stats.acked += 1
+                            stats.ack_ms.append((now - sent_at) * 1000)
+                        else:
+                            stats.errors += 1
+                elif kind in ("user_typing", "user_stopped_typing", "typing_state"):
+                    stats.typing_received += 1
+        except websockets.ConnectionClosed as exc:
+            code = getattr(exc.rcvd, "code", None) if getattr(exc, "rcvd", None) else None
+            stats.closed[str(code)] = stats.closed.get(str(code), 0) + 1
+
+    async def send_message(self):
+        self.counter += 1
+        client_msg_id = f"{self.user_id}-{self.counter}"
+        sent_at = time.perf_counter()
+        self.pending[client_msg_id] = sent_at
+        if self.stats.measuring(sent_at):
+            self.stats.sent += 1
+        await self.ws.send(json.dumps({
+            "type": "message",
+            "text": f"{BENCH_PREFIX}{sent_at!r}:{'x' * 32}",
+            "channel_id": self.channel_id,
+            "sender_username": self.user_id,
+            "client_msg_id": client_msg_id,
+        }))
+
+    async def send_typing(self):
+        if self.stats.measuring(time.perf_counter()):
+            self.stats.typing_sent += 1
+        await self.ws.send(json.dumps({"type": "typing", "channel_id": self.channel_id, "username": self.user_id}))
+
+
+async def drive(clients: List[BenchClient], rate: float, action: str, until: float):
+    """Poisson arrivals at ``rate`` per second, each from a random client."""
+    if rate <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    next_at = loop.time()
+    while next_at < until:
+        next_at += random.expovariate(rate)
+        delay = next_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        client = random.choice(clients)
+        try:
+            await getattr(client, action)()
+        except websockets.ConnectionClosed:
+            pass
+
+
+def percentiles(samples: List[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": at(0.50),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def process_cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime are fields 14 and 15 of the full line
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def process_rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def http_json(url: str) -> Optional[dict]:
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return json.loads(response.read())
+    except OSError:
+        return None
+
+
+def start_server(port: int, workdir: str) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--ws-max-queue", "1024"],
+        cwd=workdir, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        if http_json(f"http://127.0.0.1:{port}/api/health"):
+            return server
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("server did not become healthy within 30s")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, base_url: str, server_pid: Optional[int]) -> dict:
+    stats = Stats()
+    channels = [f"bench-{i}" for i in range(args.channels)]
+    clients = [BenchClient(i, channels[i % len(channels)], base_url, stats) for i in range(args.clients)]
+    http_base = base_url.replace("ws", "http", 1)
+
+    rss_idle = process_rss_bytes(server_pid) if server_pid else None
+    connect_started = time.perf_counter()
+    for start in range(0, len(clients), args.connect_batch):
+        await asyncio.gather(*(c.connect() for c in clients[start:start + args.connect_batch]))
+    connect_seconds = time.perf_counter() - connect_started
+    receivers = [asyncio.create_task(c.receive()) for c in clients]
+    rss_connected = process_rss_bytes(server_pid) if server_pid else None
+
+    now = time.perf_counter()
+    stats.measure_start = now + args.warmup
+    stats.measure_end = stats.measure_start + args.duration
+    until = asyncio.get_running_loop().time() + args.warmup + args.duration
+    await asyncio.sleep(0)  # Let receivers start before traffic does
+
+    cpu_start = None
+    drivers = asyncio.gather(
+        drive(clients, args.message_rate, "send_message", until),
+        drive(clients, args.typing_rate, "send_typing", until),
+    )
+    await asyncio.sleep(args.warmup)
+    if server_pid:
+        cpu_start = process_cpu_seconds(server_pid)
+    await drivers
+    cpu_seconds = process_cpu_seconds(server_pid) - cpu_start if server_pid else None
+    rss_loaded = process_rss_bytes(server_pid) if server_pid else None
+
+    # Let in-flight deliveries and acks land before tearing down
+    await asyncio.sleep(args.drain)
+    server_stats = http_json(f"{http_base}/api/ws/stats")
+    db_stats = http_json(f"{http_base}/api/db/stats")
+    for c in clients:
+        await c.ws.close()
+    await asyncio.gather(*receivers, return_exceptions=True)
+
+    per_channel = args.clients / args.channels
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "clients": args.clients,
+            "channels": args.channels,
+            "message_rate": args.message_rate,
+            "typing_rate": args.typing_rate,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "server_env": {k: v for k, v in os.environ.items() if k.startswith(("CHAT_", "WS_"))},
+        },
+        "connect_seconds": round(connect_seconds, 3),
+        "messages": {
+            "sent": stats.sent,
+            "acked": stats.acked,
+            "errors": stats.errors,
+            "rate_limited": stats.rate_limited,
+            "ingest_per_second": round(stats.acked / args.duration, 2),
+            "expected_deliveries": round(stats.sent * (per_channel - 1)),
+            "delivered": stats.delivered,
+            "deliveries_per_second": round(stats.delivered / args.duration, 2),
+        },
+        "typing": {"sent": stats.typing_sent, "received": stats.typing_received},
+        "fanout_latency_ms": percentiles(stats.fanout_ms),
+        "ack_latency_ms": percentiles(stats.ack_ms),
+        "connections_closed_by_server": stats.closed,
+        "server": {
+            "pid": server_pid,
+            "cpu_seconds": round(cpu_seconds, 3) if cpu_seconds is not None else None,
+            "cpu_utilization": round(cpu_seconds / args.duration, 3) if cpu_seconds is not None else None,
+            "rss_idle_bytes": rss_idle,
+            "rss_connected_bytes": rss_connected,
+            "rss_loaded_bytes": rss_loaded,
+            "rss_per_connection_bytes": (
+                round((rss_connected - rss_idle) / args.clients) if server_pid else None
+            ),
+            "ws_stats": {k: v for k, v in (server_stats or {}).items() if k not in ("channels", "per_connection")},
+            "db_stats": db_stats,
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--message-rate", type=float, default=200, help="messages per second, all clients")
+    parser.add_argument("--typing-rate", type=float, default=100, help="typing frames per second, all clients")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of traffic before measuring")
+    parser.add_argument("--drain", type=float, default=2, help="seconds to wait for late frames")
+    parser.add_argument("--connect-batch", type=int, default=200)
+    parser.add_argument("--url", help="benchmark a running server, e.g. ws://127.0.0.1:8000")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    # Every client socket is a file descriptor here and on the server
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    server = workdir = None
+    try:
+        if args.url:
+            base_url, server_pid = args.url.rstrip("/"), None
+        else:
+            workdir = tempfile.mkdtemp(prefix="chat-bench-")
+            port = free_port()
+            server = start_server(port, workdir)
+            base_url, server_pid = f"ws://127.0.0.1:{port}", server.pid
+        report = asyncio.run(run(args, base_url, server_pid))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Two-worker check for message archival.
+
+Runs two MessageArchives ("worker A" and "worker B") on one SQLite database
+in a temporary directory, with RedisBrokers connected through the in-memory
+Redis stand-in of check_broker_fanout.py. Exactly one of them may hold the
+archiver lease and archive; the other must see the new segments and read the
+archived messages back. When the leader stops, the lease must be free for the
+other worker.
+
+    python scripts/check_archive_workers.py --messages 5000
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from archive import MessageArchive, create_archive_tables  # noqa: E402
+from broker import RedisBroker  # noqa: E402
+from check_broker_fanout import FakeRedis  # noqa: E402
+
+
+def fill(path: str, messages: int):
+    """Just the tables the archiver reads, with messages a year old."""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE messages (
+            id TEXT PRIMARY KEY, text TEXT NOT NULL, sender_id TEXT NOT NULL, sender_username TEXT NOT NULL,
+            channel_id TEXT NOT NULL, timestamp TIMESTAMP, message_type TEXT DEFAULT 'text', seq INTEGER
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_messages_channel_seq ON messages (channel_id, seq)')
+    conn.execute('CREATE TABLE channel_stats (channel_id TEXT PRIMARY KEY)')
+    create_archive_tables(conn.cursor())
+    start = datetime.now() - timedelta(days=365)
+    conn.executemany("INSERT INTO channel_stats VALUES (?)", [("general",), ("tech",)])
+    conn.executemany("INSERT INTO messages VALUES (?, ?, 'u', 'User', ?, ?, 'text', ?)", [
+        (f"{channel_id}-{i}", f"message {i}", channel_id, (start + timedelta(seconds=i)).isoformat(), i + 1)
+        for channel_id in ("general", "tech") for i in range(messages // 2)
+    ])
+    conn.commit()
+    conn.close()
+
+
+async def run(workdir: str, messages: int) -> list:
+    path = os.path.join(workdir, "chat.db")
+    fill(path, messages)
+    redis = FakeRedis()
+    workers = []
+    for _ in range(2):
+        broker = RedisBroker(client=redis)
+        archive = MessageArchive(path, broker, directory=os.path.join(workdir, "archive"), after_days=30,
+                                 interval=3600, segment_messages=1000)
+        await broker.start()
+        await archive.start()
+        workers.append((broker, archive))
+    await asyncio.sleep(0.5)
+
+    failures = []
+    leaders = [archive for _, archive in workers if archive.leader]
+    if len(leaders) != 1:
+        failures.append(f"expected one archiver, got {len(leaders)}")
+        return failures
+    leader = leaders[0]
+    follower = next(archive for _, archive in workers if archive is not leader)
+    if leader.messages_archived != messages or follower.messages_archived:
+        failures.append(f"archived: leader {leader.messages_archived}, follower {follower.messages_archived}")
+    for channel_id in ("general", "tech"):
+        if follower.archived_upto(channel_id) != messages // 2:
+            failures.append(f"follower sees {channel_id} archived up to {follower.archived_upto(channel_id)}")
+        newest = follower.read_before(channel_id, None, 3)
+        if [m["id"] for m in newest] != [f"{channel_id}-{i}" for i in range(messages // 2 - 1, messages // 2 - 4, -1)]:
+            failures.append(f"follower read {[m['id'] for m in newest]} from {channel_id}")
+
+    for broker, archive in workers:
+        if archive is leader:
+            await archive.stop()
+            await broker.stop()
+    if not await asyncio.to_thread(follower._acquire_lease):
+        failures.append("the lease was not released when the archiver stopped")
+    for broker, archive in workers:
+        if archive is follower:
+            await archive.stop()
+            await broker.stop()
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="chat-archive-")
+    try:
+        failures = asyncio.run(run(workdir, args.messages))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        return 1
+    print("OK: one archiver, segments visible on both workers")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
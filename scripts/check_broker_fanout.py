@@ -0,0 +1,182 @@
+"""Cross-worker fan-out check for the chat broker.
+
+Runs two ConnectionManagers ("worker A" and "worker B") in one process, each
+with its own RedisBroker, connected through an in-memory stand-in for Redis
+pub/sub. A message broadcast on worker A must reach a client subscribed on
+worker B, each worker's presence registry must see both users, and worker
+A must count worker B's subscriber in the channel's members. After a
+malformed envelope and a dropped Redis connection, worker B must resubscribe
+and receive worker A's next message. While Redis refuses publishes, a
+worker's own subscribers must still get its messages. A worker's pending
+presence writes must follow the user's state across both workers.
+
+    python scripts/check_broker_fanout.py
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import broker as broker_module  # noqa: E402
+from broker import RedisBroker  # noqa: E402
+from connections import ConnectionManager  # noqa: E402
+from presence import PresenceRegistry  # noqa: E402
+
+
+class FakePubSub:
+    def __init__(self, hub: "FakeRedis"):
+        self.hub = hub
+        self.channels = set()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        self.channels.update(channels)
+        self.hub.subscribers.append(self)
+
+    async def unsubscribe(self, *channels):
+        self.channels.clear()
+
+    async def close(self):
+        self.hub.subscribers.remove(self)
+
+    async def listen(self):
+        while True:
+            message = await self.queue.get()
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis for RedisBroker, shared by both workers."""
+
+    def __init__(self):
+        self.subscribers = []
+        self.down = False
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    async def publish(self, channel, data):
+        if self.down:
+            raise ConnectionError("redis down in stand-in")
+        for pubsub in self.subscribers:
+            if channel in pubsub.channels:
+                pubsub.queue.put_nowait({"type": "message", "channel": channel.encode(), "data": data})
+
+    def drop_connections(self):
+        for pubsub in list(self.subscribers):
+            pubsub.queue.put_nowait(ConnectionError("connection reset by stand-in"))
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.received = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        self.received.append(json.loads(message))
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+
+async def main() -> int:
+    redis = FakeRedis()
+    worker_a = ConnectionManager(RedisBroker(client=redis))
+    worker_b = ConnectionManager(RedisBroker(client=redis))
+    # Usernames are registered up front, so the registries never query SQLite
+    presence_a = PresenceRegistry(None, worker_a.broker)
+    presence_b = PresenceRegistry(None, worker_b.broker)
+    presence_a.seen("alice", "alice")
+    presence_b.seen("bob", "bob")
+    await worker_a.broker.start()
+    await worker_b.broker.start()
+
+    alice, bob = FakeWebSocket(), FakeWebSocket()
+    await worker_a.connect(alice, "alice")
+    await presence_a.connected("alice")
+    await worker_b.connect(bob, "bob")
+    await presence_b.connected("bob")
+    worker_b.subscribe("bob", "general")
+
+    frame = json.dumps({"type": "new_message", "message": {"text": "hello from A", "channel_id": "general"}})
+    await worker_a.broadcast_to_channel(frame, "general", exclude_user="alice")
+    await worker_a.broadcast_to_channel(json.dumps({"type": "new_message", "message": {}}), "tech")
+    await asyncio.sleep(0.05)
+
+    failures = []
+    if [m.get("message", {}).get("text") for m in bob.received] != ["hello from A"]:
+        failures.append(f"bob on worker B expected one message from worker A, got {bob.received}")
+    if alice.received:
+        failures.append(f"alice should not receive her own broadcast, got {alice.received}")
+    if presence_a.online_user_ids() != {"alice", "bob"} or presence_b.online_user_ids() != {"alice", "bob"}:
+        failures.append(f"presence mismatch: A={presence_a.online_user_ids()} B={presence_b.online_user_ids()}")
+
+    # Member counts cover both workers, and the channel list's version follows them
+    version = worker_a.subscription_version
+    await worker_b.sync_members()
+    await asyncio.sleep(0.05)
+    if worker_a.member_count("general") != 1 or worker_a.subscription_version == version:
+        failures.append(f"worker A counts {worker_a.member_count('general')} members of general, "
+                        f"version {version} -> {worker_a.subscription_version}")
+
+    # A malformed envelope is skipped; a dropped connection is resubscribed
+    broker_module.REDIS_RECONNECT_MIN_SECONDS = 0.01
+    await redis.publish(worker_b.broker.prefix + "fanout", b"not json")
+    redis.drop_connections()
+    await asyncio.sleep(0.1)
+    await worker_a.broadcast_to_channel(json.dumps({"type": "new_message", "message": {"text": "after reconnect"}}),
+                                        "general", exclude_user="alice")
+    await asyncio.sleep(0.05)
+    if [m.get("message", {}).get("text") for m in bob.received][-1:] != ["after reconnect"]:
+        failures.append(f"bob missed worker A's message after the reconnect, got {bob.received}")
+    if worker_b.broker.reconnects != 1 or worker_b.broker.malformed != 1:
+        failures.append(f"worker B: {worker_b.broker.reconnects} reconnects, {worker_b.broker.malformed} malformed")
+
+    # A failed Redis publish still reaches this worker's own subscribers
+    redis.down = True
+    try:
+        await worker_b.broadcast_to_channel(json.dumps({"type": "new_message", "message": {"text": "redis down"}}),
+                                            "general")
+    except Exception as exc:
+        failures.append(f"publish raised while Redis was down: {exc!r}")
+    redis.down = False
+    await asyncio.sleep(0.05)
+    if [m.get("message", {}).get("text") for m in bob.received][-1:] != ["redis down"]:
+        failures.append(f"bob missed a local message while Redis was down, got {bob.received}")
+    if worker_b.broker.publish_failures != 1:
+        failures.append(f"worker B counted {worker_b.broker.publish_failures} publish failures")
+
+    worker_b.disconnect("bob")
+    await presence_b.disconnected("bob")
+    await asyncio.sleep(0.05)
+    if presence_a.online_user_ids() != {"alice"}:
+        failures.append(f"bob still online on worker A after disconnect: {presence_a.online_user_ids()}")
+    if [u["username"] for u in presence_a.online_users()] != ["alice"]:
+        failures.append(f"worker A online list wrong: {presence_a.online_users()}")
+
+    # Closing a second socket on worker B must not queue alice as offline there
+    await presence_b.connected("alice")
+    await presence_b.disconnected("alice")
+    if presence_b._dirty.get("alice", (None,))[0] is not True:
+        failures.append(f"worker B would flush alice as {presence_b._dirty.get('alice')} while she is on worker A")
+    await presence_a.disconnected("alice")
+    await asyncio.sleep(0.05)
+    if presence_b._dirty.get("alice", (None,))[0] is not False:
+        failures.append(f"worker B would flush alice as {presence_b._dirty.get('alice')} after she left worker A")
+
+    await worker_a.broker.stop()
+    await worker_b.broker.stop()
+    for failure in failures:
+        print("FAIL:", failure)
+    print("OK: cross-worker fan-out and presence" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,289 @@
+"""EXPLAIN QUERY PLAN regression check for every RunDB endpoint.
+
+Builds a synthetic RunDB database in a temporary directory (--runners,
+--events, --results), calls every route of the app through a TestClient
+while recording each statement the endpoint actually runs (parameters
+bound), and explains each one. A plan that scans a table fails the check
+unless the scan is listed for that route in ALLOWED_SCANS, with its reason:
+
+- a table name, for endpoints that return or aggregate a whole table by
+  design;
+- ``table USING INDEX idx`` (or ``table VIRTUAL TABLE`` for a full-text
+  MATCH), for a walk in index order that the statement's LIMIT stops after
+  the page. Such an entry only covers LIMITed statements, and only that
+  index: a new ORDER BY or a lost WHERE term shows up as a new walk.
+
+An entry for ``route?param`` replaces the route's entry for requests that
+pass that parameter, for filters that no index can serve.
+
+Shrink that list as endpoints get filtered or paginated in SQL; never grow
+it to make a regression pass.
+
+Routes with no entry in ROUTE_CALLS fail too, so new endpoints have to be
+added here. The background refresh of the trigger-maintained tables is
+checked the same way, under BACKGROUND_CALLS.
+
+    python scripts/check_query_plans.py --runners 20000 --results 100000
+"""
+import argparse
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from typing import Dict, List, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from fastapi.routing import APIRoute  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from rundb.backend import main as rundb  # noqa: E402
+
+# (method, route) -> request paths exercising it against the synthetic data
+ROUTE_CALLS: Dict[Tuple[str, str], List[str]] = {
+    ("GET", "/metrics"): ["/metrics"],
+    ("GET", "/rundb/events"): [
+        "/rundb/events", "/rundb/events?upcoming=true", "/rundb/events?past=true&country=NOR",
+        "/rundb/events?upcoming=true&sport=Terrengl%C3%B8p", "/rundb/events?date_from=2010-01-01&date_to=2010-12-31",
+        "/rundb/events?organizer=Berg&limit=5", "/rundb/events?cursor=WzAsICIyMDEwLTAxLTAxIiwgImV2dC03Il0",
+        "/rundb/events?upcoming=true&cursor=WzIsIG51bGwsICJldnQtNyJd",
+    ],
+    ("GET", "/rundb/events/{event_id}"): ["/rundb/events/evt-7"],
+    ("GET", "/rundb/events/{event_id}/results"): ["/rundb/events/evt-7/results"],
+    ("GET", "/rundb/events/{event_id}/race-stats"): ["/rundb/events/evt-7/race-stats"],
+    ("GET", "/rundb/runners"): ["/rundb/runners"],
+    ("GET", "/rundb/runners/{runner_id}"): ["/rundb/runners/run-42"],
+    ("GET", "/rundb/results"): ["/rundb/results", "/rundb/results?limit=500"],
+    ("GET", "/rundb/runners/{runner_id}/results"): ["/rundb/runners/run-42/results"],
+    ("GET", "/rundb/stats"): ["/rundb/stats"],
+    ("GET", "/rundb/search"): [
+        "/rundb/search?q=berg", "/rundb/search?q=a", "/rundb/search?q=ostensjo%20lopet", "/rundb/search?q=anna%20b&limit=50",
+        "/rundb/search?q=berg&cursor=MjoxMA",
+    ],
+    ("POST", "/rundb/runners/{runner_id}/visit"): ["/rundb/runners/run-42/visit", "/rundb/runners/run-42/visit"],
+    ("GET", "/rundb/athletes"): [
+        "/rundb/athletes", "/rundb/athletes?q=berg&sex=F&min_runs=2&podium=top3", "/rundb/athletes?q=zz",
+        "/rundb/athletes?top=popular3",
+        "/rundb/athletes?sort=runs&min_runs=1&date_from=2020-01-01", "/rundb/athletes?popularity_min=3&popularity_max=8",
+    ],
+}
+
+# Work done outside requests, checked like a route: name -> function
+BACKGROUND_CALLS = {
+    "refresh_derived_tables": rundb.refresh_derived_tables,
+}
+
+# Whole-table reads and LIMITed index walks that are part of what the route returns, with why
+ALLOWED_SCANS: Dict[str, Dict[str, str]] = {
+    "/rundb/runners": {"rundb_runners": "returns every runner, unpaginated"},
+    "/rundb/results": {
+        "rundb_results USING INDEX idx_rundb_results_latest": "newest results first, one page",
+    },
+    "/rundb/athletes": {
+        "rundb_athlete_stats USING INDEX idx_rundb_athlete_stats_name":
+            "default name order; filters are checked on the rows walked until the page is full",
+        "rundb_athlete_stats USING INDEX idx_rundb_athlete_stats_popularity": "top=popularN, most visited first",
+    },
+    # Not a bounded walk: a rare or unmatched substring reads every row before the page fills
+    "/rundb/athletes?q": {
+        "rundb_athlete_stats": "q is a substring of name, club and country (instr on search_text), "
+                               "which no index serves; the search trigram index holds folded names only",
+    },
+    "/rundb/search": {
+        "rundb_search_fts VIRTUAL TABLE": "trigram MATCH, read in rank order until the page is full",
+    },
+    "/rundb/stats": {
+        "rundb_runners": "whole-table count",
+        "rundb_events": "whole-table count",
+        "rundb_results": "whole-table count",
+    },
+}
+
+# Tables any route may scan
+GLOBAL_ALLOWED_SCANS = {
+    # Probed with LIMIT 1, and drained whole when they have rows
+    "rundb_race_stats_dirty",
+    "rundb_athlete_stats_dirty",
+    "rundb_search_dirty",
+    # FTS5 reads its few configuration rows when it opens the index
+    "main.rundb_search_fts_config",
+}
+
+_TABLE_REFS = re.compile(
+    r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:ON|WHERE|LEFT|INNER|JOIN|GROUP|ORDER|LIMIT|USING|SET|VALUES)\b)(\w+))?",
+    re.IGNORECASE,
+)
+_SCAN = re.compile(r"^SCAN (\S+)(.*)$")
+_SCAN_INDEX = re.compile(r"\bUSING (?:COVERING )?INDEX (\w+)")
+
+
+def fill(path: str, runners: int, events: int, results: int, seed: int):
+    rng = random.Random(seed)
+    first = ["Anna", "Ola", "Kari", "Per", "Sofia", "Jonas", "Eva", "Mikael", "Ingrid", "Lars"]
+    last = ["Berg", "Hansen", "Larsen", "Nilsen", "Johansen", "Østensjø", "Dahl", "Lie", "Moen", "Haugen"]
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO rundb_runners (id, name, sex, date, club, country) VALUES (?, ?, ?, ?, ?, 'NOR')", [
+        (f"run-{i}", f"{rng.choice(first)} {rng.choice(last)}", rng.choice("FM"), f"19{rng.randint(50, 99)}-01-01",
+         f"Club {i % 300}") for i in range(runners)
+    ])
+    conn.executemany('''
+        INSERT INTO rundb_events (id, name, date, location_city, location_country, organizer, sport, signup_end)
+        VALUES (?, ?, ?, ?, 'NOR', ?, 'Terrengløp', ?)
+    ''', [
+        (f"evt-{i}", f"{rng.choice(last)}løpet {2000 + i % 26}", f"{2000 + i % 27}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+         rng.choice(last), rng.choice(last), f"{2020 + i % 10}-01-01" if i % 10 == 0 else None) for i in range(events)
+    ])
+    conn.executemany("INSERT INTO rundb_event_races (id, event_id, name) VALUES (?, ?, ?)", [
+        (f"race-{i}-{k}", f"evt-{i}", f"Race {k}") for i in range(events) for k in range(2)
+    ])
+    rows = []
+    for i in range(results):
+        event = i % events
+        place = i // events + 1
+        rows.append((f"res-{i}", f"evt-{event}", f"race-{event}-{place % 2}", f"run-{rng.randrange(runners)}",
+                     None if place % 40 == 0 else place, f"Runner {i}", 1500 + place * 7,
+                     f"{2000 + event % 27}-{1 + event % 12:02d}-{1 + event % 28:02d}"))
+    conn.executemany('''
+        INSERT INTO rundb_results (id, event_id, race_id, runner_id, finish, name, time_sec, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+
+def aliases(sql: str) -> Dict[str, str]:
+    names = {}
+    for table, alias in _TABLE_REFS.findall(sql):
+        names[table] = table
+        if alias:
+            names[alias] = table
+    return names
+
+
+def allowed_scans(path: str, url: str) -> Dict[str, str]:
+    """ALLOWED_SCANS for one request: a ``route?param`` entry wins over the route's."""
+    params = sorted(parse_qs(urlsplit(url).query, keep_blank_values=True))
+    for param in params:
+        if f"{path}?{param}" in ALLOWED_SCANS:
+            return ALLOWED_SCANS[f"{path}?{param}"]
+    return ALLOWED_SCANS.get(path, {})
+
+
+def check_statement(conn: sqlite3.Connection, sql: str, allowed: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    """(problems, notes) for one statement's plan."""
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    names = aliases(sql)
+    limited = re.search(r"\bLIMIT\b", sql, re.IGNORECASE) is not None
+    problems, notes = [], []
+    for detail in plan:
+        match = _SCAN.match(detail)
+        if match is None:
+            continue
+        name, rest = match.groups()
+        if name.startswith("(") or name == "CONSTANT":
+            continue
+        table = names.get(name, name)
+        index = _SCAN_INDEX.search(rest)
+        walk = f"{table} USING INDEX {index.group(1)}" if index else \
+            f"{table} VIRTUAL TABLE" if "VIRTUAL TABLE" in rest else None
+        if table in GLOBAL_ALLOWED_SCANS:
+            continue
+        elif walk in allowed and limited:
+            notes.append(f"bounded walk of {walk} ({allowed[walk]})")
+        elif walk in allowed:
+            problems.append(f"{detail}  [{walk} is only allowed under a LIMIT]")
+        elif table in allowed:
+            notes.append(f"allowed scan of {table} ({allowed[table]})")
+        else:
+            problems.append(f"{detail}  [{walk or table}]")
+    return problems, notes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runners", type=int, default=20000)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--results", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rundb-plans-")
+    rundb.DB_PATH = os.path.join(workdir, "rundb.db")
+    rundb.init_db()
+    fill(rundb.DB_PATH, args.runners, args.events, args.results, args.seed)
+
+    statements: List[str] = []
+    get_conn = rundb.get_conn
+
+    def traced_conn():
+        conn = get_conn()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    failures = 0
+    rundb.get_conn = traced_conn
+    # Background refreshes run only when this check calls them
+    rundb.REFRESH_INTERVAL = 3600
+    try:
+        with TestClient(rundb.app) as client:
+            routes = {(method, route.path) for route in rundb.app.routes if isinstance(route, APIRoute)
+                      for method in route.methods}
+            for method, path in sorted(routes - set(ROUTE_CALLS)):
+                print(f"FAIL {method} {path}: no entry in ROUTE_CALLS")
+                failures += 1
+            explain = get_conn()
+            # Startup refreshed the derived tables; leave some stale so the refresh does real work
+            explain.execute("UPDATE rundb_results SET finish = finish WHERE id IN ('res-1', 'res-2')")
+            explain.execute("UPDATE rundb_runners SET name = name || ' Jr' WHERE id = 'run-3'")
+            explain.commit()
+            calls = list(ROUTE_CALLS.items()) + [(("TASK", name), [name]) for name in BACKGROUND_CALLS]
+            for (method, path), urls in calls:
+                seen: Set[str] = set()
+                route_problems, route_notes = [], []
+                for url in urls:
+                    statements.clear()
+                    if method == "TASK":
+                        BACKGROUND_CALLS[url]()
+                    else:
+                        response = client.request(method, url)
+                        if response.status_code >= 400:
+                            route_problems.append(f"{url} answered {response.status_code}")
+                    for sql in statements:
+                        sql = sql.strip()
+                        if sql.startswith("--") or not re.match(r"(SELECT|INSERT|UPDATE|DELETE|WITH)\b", sql, re.I):
+                            continue
+                        shape = re.sub(r"'[^']*'|\b\d+\b", "?", sql)
+                        if shape in seen:
+                            continue
+                        seen.add(shape)
+                        problems, notes = check_statement(explain, sql, allowed_scans(path, url))
+                        route_problems += [f"{p}\n      in: {' '.join(sql.split())[:160]}" for p in problems]
+                        route_notes += notes
+                        if args.verbose:
+                            print(f"  {' '.join(sql.split())[:120]}")
+                            for row in explain.execute("EXPLAIN QUERY PLAN " + sql):
+                                print(f"      {row[3]}")
+                status = "FAIL" if route_problems else "ok"
+                print(f"{status:4} {method} {path}  ({len(seen)} statements)")
+                for note in sorted(set(route_notes)):
+                    print(f"      {note}")
+                for problem in route_problems:
+                    print(f"    ✗ {problem}")
+                failures += bool(route_problems)
+            explain.close()
+    finally:
+        rundb.get_conn = get_conn
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{failures} route(s) failed" if failures else "\nNo unexpected table scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
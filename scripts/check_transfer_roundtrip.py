@@ -0,0 +1,107 @@
+"""Export/import round-trip check for chat history.
+
+Starts the backend app on a fresh database in a temporary directory and
+imports a generated NDJSON file through POST /api/import. Exporting must give
+back exactly that file, and importing it again must skip every line, both
+while the messages are hot and after they have been moved to archive
+segments. Importing it with ?channel_id= must copy every message into that
+channel once, leaving the originals in place.
+
+    python scripts/check_transfer_roundtrip.py --messages 20000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+sys.path.insert(0, BACKEND)
+
+
+def generate(messages: int) -> bytes:
+    """Messages of two channels, old enough to archive, in export format."""
+    start = datetime.now() - timedelta(days=365)
+    lines = []
+    for channel_id in ("general", "tech"):
+        for i in range(messages // 2):
+            lines.append(json.dumps({
+                "id": f"{channel_id}-{i}", "text": f"message {i} in {channel_id} ✓", "sender_id": f"user-{i % 7}",
+                "sender_username": f"User {i % 7}", "channel_id": channel_id,
+                "timestamp": (start + timedelta(seconds=i)).isoformat(), "message_type": "text", "seq": i + 1,
+            }, ensure_ascii=False, separators=(",", ":")))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="chat-transfer-")
+    cwd = os.getcwd()
+    # The app keeps its database and archive next to the working directory
+    os.chdir(workdir)
+    try:
+        from fastapi.testclient import TestClient
+
+        import main as chat
+
+        source = generate(args.messages)
+        failures = []
+
+        def check(name: str, condition: bool, detail=""):
+            if not condition:
+                failures.append(f"{name}: {detail}")
+
+        with TestClient(chat.app) as client:
+            def import_body(**params) -> dict:
+                response = client.post("/api/import", content=source, params=params)
+                response.raise_for_status()
+                return response.json()
+
+            def export(channel_id=None) -> bytes:
+                response = client.get(f"/api/channels/{channel_id}/export" if channel_id else "/api/export")
+                if response.status_code == 404:
+                    return b""
+                response.raise_for_status()
+                return response.content
+
+            first = import_body()
+            check("import", first["imported"] == args.messages, first)
+            check("export after import", export() == source)
+            again = import_body()
+            check("re-import of hot messages", again["imported"] == 0, again)
+
+            archived = client.portal.call(chat.archive.run_once)
+            check("archive", archived == args.messages, f"{archived} archived")
+            check("export after archiving", export() == source)
+            again = import_body()
+            check("re-import of archived messages", again["imported"] == 0, again)
+            check("export after re-import", export() == source)
+
+            copied = import_body(channel_id="copy")
+            check("import into another channel", copied["imported"] == args.messages, copied)
+            again = import_body(channel_id="copy")
+            check("re-import into another channel", again["imported"] == 0, again)
+            copy = [json.loads(line) for line in export("copy").splitlines()]
+            originals = [json.loads(line) for line in source.splitlines()]
+            check("copied texts", [m["text"] for m in copy] == [m["text"] for m in originals])
+            check("copied ids", not {m["id"] for m in copy} & {m["id"] for m in originals})
+            check("originals kept", export("general") + export("tech") == source)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        return 1
+    print(f"OK: {args.messages} messages round-tripped, hot and archived")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
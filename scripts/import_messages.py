@@ -0,0 +1,59 @@
+"""Bulk-load NDJSON chat history straight into the SQLite database.
+
+Reads the file in batches of --batch-size lines and writes each batch in one
+transaction, like POST /api/import. Use it with the server stopped (seeding,
+migrations, restores); a running server should be sent the file through the
+endpoint instead so its recent-message cache stays correct.
+
+    python scripts/import_messages.py messages.ndjson --db backend/chat_app.db
+    curl -s localhost:8000/api/export | python scripts/import_messages.py - --db copy.db
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from transfer import IMPORT_BATCH_SIZE, ImportLineError, MessageImporter  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="NDJSON file, or - for stdin")
+    parser.add_argument("--db", default="chat_app.db", help="SQLite database (created by the server's first start)")
+    parser.add_argument("--channel", help="import every message into this channel")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"{args.db} does not exist; start the server once to create it", file=sys.stderr)
+        return 1
+    importer = MessageImporter(args.db, args.channel)
+    importer.open()
+    started = time.perf_counter()
+    source = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    try:
+        batch = []
+        for line in source:
+            batch.append(line)
+            if len(batch) >= args.batch_size:
+                importer.import_batch(batch)
+                batch = []
+        importer.import_batch(batch)
+    except ImportLineError as error:
+        print(f"{error}; {importer.imported} messages before it were imported", file=sys.stderr)
+        return 1
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        importer.close()
+    elapsed = time.perf_counter() - started
+    print(json.dumps({**importer.stats(), "seconds": round(elapsed, 2),
+                      "messages_per_second": round(importer.imported / elapsed) if elapsed else None}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
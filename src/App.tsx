@@ -40,6 +40,7 @@ interface Message {
   channel_id: string;
   timestamp: string;
   message_type: string;
+  seq?: number;
 }
 
 interface Channel {
@@ -50,6 +51,9 @@ interface Channel {
   created_at: string;
   is_private: boolean;
   member_count: number;
+  message_count: number;
+  last_message_at: string | null;
+  last_seq: number;
 }
 
 interface User {
@@ -78,11 +82,41 @@ function App() {
   const [isProcessing, setIsProcessing] = useState(false);
   const [connectionStatus, setConnectionStatus] = useState<'connected' | 'connecting' | 'disconnected'>('disconnected');
   const [sidebarOpen, setSidebarOpen] = useState(false);
+  const [unreadCounts, setUnreadCounts] = useState<Record<string, number>>({});
 
   
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const typingTimeoutRef = useRef<ReturnType<typeof setTimeout>>();
+  const lastTypingSentRef = useRef(0);
   const currentChannelRef = useRef<string>(currentChannel);
+  const currentUserRef = useRef<User | null>(currentUser);
+  // Highest message seq seen per channel, sent back on reconnect to resync
+  const lastSeqRef = useRef<Record<string, number>>({});
+
+  // Read positions not yet reported; sent as one batched `read` frame
+  const pendingReadsRef = useRef<Record<string, number>>({});
+  const readTimerRef = useRef<ReturnType<typeof setTimeout>>();
+  const wsRef = useRef<WebSocket | null>(null);
+
+  const markRead = (channelId: string, seq?: number) => {
+    if (seq === undefined || seq <= (pendingReadsRef.current[channelId] ?? 0)) return;
+    pendingReadsRef.current[channelId] = seq;
+    setUnreadCounts(prev => ({ ...prev, [channelId]: 0 }));
+    if (readTimerRef.current) return;
+    readTimerRef.current = setTimeout(() => {
+      readTimerRef.current = undefined;
+      const websocket = wsRef.current;
+      if (websocket && websocket.readyState === WebSocket.OPEN) {
+        websocket.send(JSON.stringify({ type: "read", channels: pendingReadsRef.current }));
+      }
+    }, 1000);
+  };
+
+  const noteSeq = (channelId: string, seq?: number) => {
+    if (seq !== undefined && seq > (lastSeqRef.current[channelId] ?? 0)) {
+      lastSeqRef.current[channelId] = seq;
+    }
+  };
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -97,13 +131,26 @@ function App() {
     currentChannelRef.current = currentChannel;
   }, [currentChannel]);
 
+  useEffect(() => {
+    currentUserRef.current = currentUser;
+  }, [currentUser]);
+
   // Fetch initial data
   useEffect(() => {
     if (isConnected) {
       fetchChannels();
+      fetchUnreadCounts();
     }
   }, [isConnected]);
 
+  // Only the open channel is subscribed, so other badges are refreshed by polling
+  useEffect(() => {
+    if (!isConnected || !currentUser) return;
+    const interval = setInterval(fetchUnreadCounts, 15000);
+    return () => clearInterval(interval);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [isConnected, currentUser]);
+
   // Load messages for the default/current channel once connected
   useEffect(() => {
     if (isConnected && currentChannel && currentChannel !== 'home') {
@@ -116,7 +163,27 @@ function App() {
     websocket.onopen = () => {
       console.log('WebSocket connected');
       setWs(websocket);
+      wsRef.current = websocket;
       setConnectionStatus('connected');
+      // Only subscribed channels receive fan-out from the server
+      const channelId = currentChannelRef.current;
+      if (channelId !== 'home') {
+        websocket.send(JSON.stringify({ type: 'subscribe', channel_id: channelId }));
+        // After a reconnect, ask only for what was missed while disconnected
+        if (lastSeqRef.current[channelId] !== undefined) {
+          websocket.send(JSON.stringify({
+            type: 'resync',
+            channels: { [channelId]: lastSeqRef.current[channelId] }
+          }));
+        }
+      }
+      // Keeps our last_seen fresh in the server's presence registry
+      const heartbeat = setInterval(() => {
+        if (websocket.readyState === WebSocket.OPEN) {
+          websocket.send(JSON.stringify({ type: 'heartbeat' }));
+        }
+      }, 30000);
+      websocket.addEventListener('close', () => clearInterval(heartbeat));
     };
 
     websocket.onmessage = (event) => {
@@ -124,9 +191,36 @@ function App() {
       console.log('WebSocket message received:', data);
       
       if (data.type === 'new_message') {
+        noteSeq(data.message.channel_id, data.message.seq);
+        if (data.message.channel_id === currentChannelRef.current) {
+          markRead(data.message.channel_id, data.message.seq);
+        }
         // Only add message if it's not from the current user (to avoid duplicates)
         if (data.message.sender_id !== currentUser?.id) {
-          setMessages(prev => [...prev, data.message]);
+          setMessages(prev => prev.some(m => m.id === data.message.id) ? prev : [...prev, data.message]);
+        }
+      } else if (data.type === 'message_sent') {
+        noteSeq(data.channel_id, data.seq);
+      } else if (data.type === 'rate_limited') {
+        // Sending too fast: the message was dropped, so withdraw its optimistic copy
+        setMessages(prev => prev.filter(m => m.id !== data.client_msg_id));
+        console.warn(`Rate limited (${data.limit}); retry in ${data.retry_after}s`);
+      } else if (data.type === 'resync') {
+        // Messages missed while disconnected, in seq order
+        if (data.channel_id === currentChannelRef.current) {
+          setMessages(prev => {
+            const known = new Set(prev.map(m => m.id));
+            return [...prev, ...data.messages.filter((m: Message) => !known.has(m.id))];
+          });
+        }
+        data.messages.forEach((m: Message) => noteSeq(data.channel_id, m.seq));
+        if (data.channel_id === currentChannelRef.current) {
+          markRead(data.channel_id, lastSeqRef.current[data.channel_id]);
+        }
+      } else if (data.type === 'resync_required') {
+        // Too much was missed to replay; reload the channel instead
+        if (data.channel_id === currentChannelRef.current) {
+          loadChannelMessages(data.channel_id);
         }
       } else if (data.type === 'user_typing') {
         // Only show typing indicators for the active channel
@@ -137,9 +231,21 @@ function App() {
             }
             return prev;
           });
+          // The server sends user_stopped_typing; this is only a fallback
           setTimeout(() => {
             setTypingUsers(prev => prev.filter(u => u !== data.username));
-          }, 3000);
+          }, 10000);
+        }
+      } else if (data.type === 'user_stopped_typing') {
+        setTypingUsers(prev => prev.filter(u => u !== data.username));
+      } else if (data.type === 'typing_state') {
+        // Aggregated mode: one frame lists everyone typing in the channel
+        if (data.channel_id === currentChannelRef.current) {
+          setTypingUsers(
+            data.users
+              .filter((u: { user_id: string }) => u.user_id !== currentUser?.id)
+              .map((u: { username: string }) => u.username)
+          );
         }
       }
     };
@@ -165,6 +271,23 @@ function App() {
     };
   };
 
+  const fetchUnreadCounts = async () => {
+    const userId = currentUserRef.current?.id;
+    if (!userId) return;
+    try {
+      const response = await fetch(`/api/users/${userId}/unread`);
+      const data: { channel_id: string; unread: number }[] = await response.json();
+      const counts: Record<string, number> = {};
+      data.forEach(c => {
+        // The open channel is read as messages arrive
+        counts[c.channel_id] = c.channel_id === currentChannelRef.current ? 0 : c.unread;
+      });
+      setUnreadCounts(counts);
+    } catch (error) {
+      console.error('Error fetching unread counts:', error);
+    }
+  };
+
   const fetchChannels = async () => {
     try {
       const response = await fetch('/api/channels');
@@ -211,13 +334,6 @@ function App() {
   const handleSendMessage = () => {
     if (!inputText.trim() || !ws || currentChannel === "home") return;
 
-    const messageData = {
-      type: "message",
-      text: inputText.trim(),
-      channel_id: currentChannel,
-      sender_username: currentUser?.username || "Unknown"
-    };
-
     // Create the message object for immediate display
     const newMessage: Message = {
       id: Date.now().toString(),
@@ -229,6 +345,15 @@ function App() {
       message_type: "text"
     };
 
+    // Acks and rate_limited replies echo client_msg_id back
+    const messageData = {
+      type: "message",
+      text: inputText.trim(),
+      channel_id: currentChannel,
+      sender_username: currentUser?.username || "Unknown",
+      client_msg_id: newMessage.id
+    };
+
     // Add message to local state immediately (optimistic update)
     setMessages(prev => [...prev, newMessage]);
     
@@ -242,8 +367,10 @@ function App() {
   const handleTyping = () => {
     if (!ws || currentChannel === "home") return;
     
-    if (!isTyping) {
+    // Re-send periodically while typing so the server's typing state doesn't expire
+    if (!isTyping || Date.now() - lastTypingSentRef.current > 2000) {
       setIsTyping(true);
+      lastTypingSentRef.current = Date.now();
       ws.send(JSON.stringify({
         type: "typing",
         channel_id: currentChannel,
@@ -278,6 +405,9 @@ function App() {
       if (response.ok) {
         const data = await response.json();
         setMessages(data);
+        lastSeqRef.current[channelId] = 0;
+        data.forEach((m: Message) => noteSeq(channelId, m.seq));
+        markRead(channelId, lastSeqRef.current[channelId]);
       } else {
         setMessages([]);
       }
@@ -292,6 +422,14 @@ function App() {
     if (currentChannel === channelId || isProcessing) return;
     
     setIsProcessing(true);
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      if (currentChannel !== "home") {
+        ws.send(JSON.stringify({ type: "unsubscribe", channel_id: currentChannel }));
+      }
+      if (channelId !== "home") {
+        ws.send(JSON.stringify({ type: "subscribe", channel_id: channelId }));
+      }
+    }
     setCurrentChannel(channelId);
     loadChannelMessages(channelId);
     
@@ -498,6 +636,11 @@ function App() {
                     {channel.is_private && <Lock className="w-3 h-3 text-gray-500" />}
                   </div>
                   <div className="flex items-center space-x-2">
+                    {(unreadCounts[channel.id] ?? 0) > 0 && (
+                      <span className="min-w-[1.25rem] px-1.5 py-0.5 rounded-full bg-pink-500 text-white text-xs font-semibold text-center">
+                        {unreadCounts[channel.id] > 99 ? "99+" : unreadCounts[channel.id]}
+                      </span>
+                    )}
                     {channel.member_count > 0 && (
                       <span className="text-xs text-gray-400">{channel.member_count}</span>
                     )}
@@ -588,6 +731,11 @@ function App() {
                         {channel.is_private && <Lock className="w-3 h-3 text-gray-500" />}
                       </div>
                       <div className="flex items-center space-x-2">
+                        {(unreadCounts[channel.id] ?? 0) > 0 && (
+                          <span className="min-w-[1.25rem] px-1.5 py-0.5 rounded-full bg-pink-500 text-white text-xs font-semibold text-center">
+                            {unreadCounts[channel.id] > 99 ? "99+" : unreadCounts[channel.id]}
+                          </span>
+                        )}
                         {channel.member_count > 0 && (
                           <span className="text-xs text-gray-400">{channel.member_count}</span>
                         )}